@@ -0,0 +1,140 @@
+"""
+Time alignment between video frames and CASU log samples.
+
+At the start of an experiment, the CASUs flash their diagnostic LED (see
+function `flash_casu` in module `domset_binary.util.video_sync`) and the
+video recording starts.  The time of the first flash, as recorded in the
+LED actuator channel of the CASU logs, is the time of the first video frame.
+
+The synchronisation time is computed once per run and stored in the run
+manifest (see module run_index).  If the flash pattern is not found in the
+log of a CASU, the timestamp of a fixed row of its LED actuator channel is
+used, as in the original analysis scripts.
+"""
+
+import numpy
+
+import domset_binary.util.video_sync
+
+import log_cache
+import run_index
+import util.math
+
+MANIFEST_KEY = 'video_sync'
+
+# maximum difference in seconds between the expected and measured period of the flashes
+FLASH_PERIOD_TOLERANCE = 0.5
+
+def find_flash_time (led_actuator):
+    """
+    Find the synchronisation flashes in the LED actuator channel of a CASU log.
+
+    :param led_actuator: LED actuator data, each row has a timestamp and the red, green and blue components
+    :return: the time of the first flash, or None if the flash pattern was not found
+    """
+    number_flashes = domset_binary.util.video_sync.NUMBER_FLASHES
+    if len (led_actuator) < number_flashes:
+        return None
+    red = (led_actuator [:, 1] > 0) & (led_actuator [:, 2] == 0) & (led_actuator [:, 3] == 0)
+    onsets = numpy.nonzero (red & ~numpy.concatenate (([False], red [:-1]))) [0]
+    if len (onsets) < number_flashes:
+        return None
+    period = 2 * domset_binary.util.video_sync.FLASH_LENGTH
+    regular = numpy.abs (numpy.diff (led_actuator [onsets, 0]) - period) <= FLASH_PERIOD_TOLERANCE
+    # a flash sequence starts at an onset followed by number_flashes - 1 regular periods
+    sequences = numpy.convolve (regular.astype (int), numpy.ones (number_flashes - 1, dtype = int), 'valid')
+    starts = numpy.nonzero (sequences == number_flashes - 1) [0]
+    if len (starts) == 0:
+        return None
+    return led_actuator [onsets [starts [0]], 0]
+
+class Aligner (object):
+    """
+    Maps between video frame indexes and CASU log timestamps.
+
+    The time of frame i is zero_time + i / frames_per_second, where zero_time is the mean of the synchronisation
+    times of the given CASU logs.
+    """
+
+    def __init__ (self, casu_logs, frames_per_second, legacy_index = 0):
+        """
+        :param casu_logs: the CASU logs of the run, they must be stored in the same run folder
+        :param frames_per_second: the video frame rate
+        :param legacy_index: the row of the LED actuator channel used if the flash pattern is not found
+        """
+        self.frames_per_second = float (frames_per_second)
+        self.sync_times = dict ([
+            (a_casu_log.number, sync_time (a_casu_log, legacy_index))
+            for a_casu_log in casu_logs
+        ])
+        self.zero_time = numpy.mean (self.sync_times.values ())
+
+    def frame_times (self, frame_indexes):
+        """
+        Return the timestamps of the given video frames.
+        """
+        return self.zero_time + numpy.asarray (frame_indexes) / self.frames_per_second
+
+    def frame_indexes (self, times):
+        """
+        Return the indexes of the video frames nearest to the given timestamps.
+        """
+        return numpy.round ((numpy.asarray (times) - self.zero_time) * self.frames_per_second).astype (int)
+
+    def log_to_frames (self, times, values, frame_indexes, interpolate = False):
+        """
+        Resample log data on the given video frames.
+
+        :param times: the timestamps of the log data, in increasing order
+        :param values: the log data, with one value or row per timestamp
+        :param interpolate: if True the data is linearly interpolated, otherwise the nearest sample is used
+        """
+        return resample (times, values, self.frame_times (frame_indexes), interpolate)
+
+    def frames_to_log (self, frame_values, times):
+        """
+        Resample video data on the given log timestamps.  Timestamps outside the video use the first or last frame.
+
+        :param frame_values: the video data, with one value or row per frame
+        """
+        indexes = numpy.clip (self.frame_indexes (times), 0, len (frame_values) - 1)
+        return numpy.asarray (frame_values) [indexes]
+
+def resample (times, values, new_times, interpolate = False):
+    """
+    Resample data given at the sorted timestamps times on timestamps new_times.
+    """
+    times = numpy.asarray (times)
+    values = numpy.asarray (values)
+    if not interpolate:
+        return values [util.math.find_nearest_indexes (times, new_times)]
+    if values.ndim == 1:
+        return numpy.interp (new_times, times, values)
+    return numpy.column_stack ([
+        numpy.interp (new_times, times, values [:, column])
+        for column in range (values.shape [1])
+    ])
+
+def sync_time (a_casu_log, legacy_index = 0):
+    """
+    Return the synchronisation time of the given CASU log.  The result is cached in the run manifest until the log changes.
+    """
+    index = run_index.get (a_casu_log.base_path)
+    cache = index.get_value (MANIFEST_KEY, {})
+    stamp = log_cache.source_stamp (a_casu_log.filename)
+    entry = cache.get (a_casu_log.number)
+    if entry is not None and entry ['source'] == stamp and (entry ['detected'] or entry ['legacy_index'] == legacy_index):
+        return entry ['time']
+    result = find_flash_time (a_casu_log.led_actuator)
+    detected = result is not None
+    if not detected:
+        print ('[W] synchronisation flashes not found in log of casu {}, using LED actuator row {}'.format (a_casu_log.number, legacy_index))
+        result = a_casu_log.led_actuator [legacy_index, 0]
+    cache [a_casu_log.number] = {
+        'time' : float (result),
+        'detected' : detected,
+        'legacy_index' : legacy_index,
+        'source' : stamp,
+    }
+    index.set_value (MANIFEST_KEY, cache)
+    return float (result)
@@ -28,15 +28,19 @@ import matplotlib
 import numpy
 import os.path
 import shutil
-import subprocess
 import tempfile
 import yaml
 
 matplotlib.use ('Agg')
 
+import aligner
+import background_model
+import bee_features
 import casu_log
 import domset_binary.prologue.infrared_test_manager
-import util.math
+import log_loader
+import render_queue
+import util.mask_stack
 import util.video
 
 def main ():
@@ -57,34 +61,23 @@ def main ():
                  config_data = config_data,
                  experiment_folder = experiment_folder,
                  working_folder = frames_folder,
+                 method = args.background_method,
             )
-            split_bees_video (
+            compute_bees_data (
                 config_data = config_data,
                 experiment_folder = experiment_folder,
-                bees_frames_folder = frames_folder,
-            )
-            prepare_masks (
-                config_data = config_data,
-                experiment_folder = experiment_folder,
-                working_folder = frames_folder)
-            for df in args.delta_frame:
-                for sct in args.same_colour_threshold:
-                    for dv in args.delta_velocity:
-                        compute_bees_data (
-                            config_data = config_data,
-                            experiment_folder = experiment_folder,
-                            working_folder = frames_folder,
-                            delta_frame = df,
-                            same_colour_threshold = sct,
-                            delta_velocity = dv,
-                            debug = True
-                            )
+                working_folder = frames_folder,
+                list_delta_frame = args.delta_frame,
+                list_same_colour_threshold = args.same_colour_threshold,
+                debug = True
+                )
         if args.plot_video_casu_log_data:
             plot_video_casu_log_data (
                 config_data = config_data,
                 experiment_folder = experiment_folder,
                 list_same_colour_threshold = args.same_colour_threshold,
-                list_delta_frame = args.delta_frame)
+                list_delta_frame = args.delta_frame,
+                workers = args.workers)
         shutil.rmtree (frames_folder)
         os.mkdir (frames_folder)
 
@@ -104,30 +97,15 @@ def split_background_video (config_data, experiment_folder, working_folder):
         debug = False
     )
 
-def create_average_background_image (config_data, experiment_folder, working_folder):
+def create_average_background_image (config_data, experiment_folder, working_folder, method = background_model.MEAN):
     number_frames = domset_binary.prologue.infrared_test_manager.BACKGROUND_VIDEO_LENGTH * config_data ['video']['frames_per_second']
-    size = (
-        util.video.CAMERA_RESOLUTION_Y - config_data ['video']['crop_bottom'] - config_data ['video']['crop_top'],
-        util.video.CAMERA_RESOLUTION_X - config_data ['video']['crop_left'] - config_data ['video']['crop_right'],
-        3)
-    background_image = numpy.zeros (size, dtype = numpy.uint16)
-    for index in range (1, 1 + number_frames):
-        current_image = cv2.imread (os.path.join (
-            os.path.join (experiment_folder, 'background.frames'),
-            #working_folder,
-            'background-{:03d}.png'.format (index)))
-        background_image = cv2.add (
-            background_image,
-            current_image,
-            dtype = cv2.CV_32F,
-            )
-    background_image = cv2.addWeighted (
-        src1 = background_image,
-        alpha = 1.0 / number_frames,
-        src2 = numpy.zeros (size, dtype = numpy.uint8),
-        beta = 0,
-        gamma = 0,
-        dtype = cv2.CV_8U)
+    size = util.video.recorded_frame_size (config_data ['video'])
+    background_image = background_model.compute_background (
+        os.path.join (experiment_folder, 'background.avi'),
+        size,
+        number_frames = number_frames,
+        frames_per_second = config_data ['video']['frames_per_second'],
+        method = method)
     cv2.imwrite (
         os.path.join (
             os.path.join (experiment_folder, 'background.frames'),
@@ -139,98 +117,41 @@ def create_average_background_image (config_data, experiment_folder, working_fol
             'background.png'),
         background_image)
 
-def split_bees_video (config_data, experiment_folder, bees_frames_folder):
-    print ('Splitting video with bees of experiment {}...'.format (experiment_folder))
-    number_frames = 60 * config_data ['parameters']['experiment_duration'] * config_data ['video']['frames_per_second']
-    util.video.split_video (
-        video_filename = os.path.join (experiment_folder, 'video.avi'),
-        number_frames = number_frames,
-        frames_per_second = config_data ['video']['frames_per_second'],
-        output_template = os.path.join (
-            bees_frames_folder,
-            'frames-%04d.png',
-            #'frames-%0{:d}d.png'.format (1 + int (math.ceil (math.log (number_frames, 10))))
-        ),
-        debug = False
-    )
-
-def prepare_masks (config_data, experiment_folder, working_folder):
-    number_ROIs = 2 * len (config_data ['arenas'])
+def mask_filenames (config_data, experiment_folder):
+    """
+    Return the filenames of the ring masks of the CASUs sorted by CASU number.
+    """
     list_casus = [
         a_casu
         for an_arena in config_data ['arenas']
         for a_casu in an_arena.itervalues ()]
     list_casus.sort ()
-    for index, a_casu in enumerate (list_casus):
-        os.symlink (
-            os.path.join (
-                os.path.join (
-                    os.getcwd (),
-                    experiment_folder),
-                'background.frames/Ring-Mask-{}.png'.format (a_casu)),
-            os.path.join (
-                working_folder,
-                'Mask-{}.png'.format (index + 1)))
+    return [
+        os.path.join (experiment_folder, 'background.frames/Ring-Mask-{}.png'.format (a_casu))
+        for a_casu in list_casus]
 
-def compute_bees_data (config_data, experiment_folder, working_folder, delta_frame, same_colour_threshold, delta_velocity, debug = False):
-    # create the CSV file read by assisi-batch-video-processing that contains the video to process
-    csv_filename = os.path.join (working_folder, 'data.csv')
-    with open (csv_filename, 'w') as fdw:
-        writer = csv.writer (
-            fdw,
-            delimiter = ',',
-            quoting = csv.QUOTE_NONNUMERIC,
-            lineterminator = '\n')
-        writer.writerow ([
-            'folder',
-            'x1',
-            'y1',
-            'x2',
-            'y2',
-            'use',
-            ])
-        writer.writerow ([
-            working_folder,
-            0, 0, 0, 0,
-            1,
-            ])
-        fdw.close ()
+def compute_bees_data (config_data, experiment_folder, working_folder, list_delta_frame, list_same_colour_threshold, debug = False):
+    """
+    Compute the bee features for all combinations of the given delta frames and same colour thresholds in a single pass over the video.
+    """
     number_frames = 60 * config_data ['parameters']['experiment_duration'] * config_data ['video']['frames_per_second']
-    command = [
-        '/home/pedro/cloud/Dropbox/xSearch/ASSISIbf/software/build-assisi-batch-video-processing-Desktop-Debug/assisi-batch-video-processing',
-        '--number-frames', '{:d}'.format (number_frames),
-        '--csv-file', csv_filename,
-        '--number-ROIs', '{:d}'.format (2 * len (config_data ['arenas'])),
-        '--delta-frame', '{:d}'.format (delta_frame),
-        '--same-colour-threshold', '{:d}'.format (same_colour_threshold),
-        '--delta-velocity', '{:d}'.format (delta_velocity),
-        '--frame-file-type', 'png',
-        '--check-ROIs',
-        '--features-number-bees-AND-bee-speed',
-    ]
     if debug:
-        print ('Full command is:')
-        print (' '.join (command))
-        print
-    process = subprocess.Popen (command)
-    process.wait ()
-    # move the CSV files to the experiment folder
-    for csv_file in [
-            'features-pixel-count-difference_SCT={}_DF={}_histogram-equalization.csv'.format (same_colour_threshold, delta_frame),
-            'histograms-frames_masked-ROIs_bee-speed_histogram-equalisation-normal_DF={}.csv'.format (delta_frame),
-            'histograms-frames_masked-ROIs_number-bees_histogram-equalisation-normal.csv'
-            ]:
-        print ('Moving file {} form {} to {}...'.format (csv_file, working_folder, experiment_folder))
-        os.rename (
-            os.path.join (
-                working_folder,
-                csv_file),
-            os.path.join (
-                experiment_folder,
-                csv_file))
+        print ('Computing bee features of experiment {} with SCT={} DF={}...'.format (experiment_folder, list_same_colour_threshold, list_delta_frame))
+    background = cv2.imread (os.path.join (working_folder, 'background.png'))
+    masks = util.mask_stack.read_masks (mask_filenames (config_data, experiment_folder))
+    frames = util.video.read_frames (
+        os.path.join (experiment_folder, 'video.avi'),
+        background.shape [:2],
+        number_frames = number_frames,
+        frames_per_second = config_data ['video']['frames_per_second'])
+    features, number_bees_histograms, bee_speed_histograms = bee_features.compute_features_sweep (
+        frames, background, masks, list_same_colour_threshold, list_delta_frame)
+    bee_features.write_features_sweep (
+        experiment_folder,
+        features, number_bees_histograms, bee_speed_histograms)
 
-def plot_video_casu_log_data (config_data, experiment_folder, list_same_colour_threshold, list_delta_frame):
-    casu_logs = read_casu_logs (config_data, experiment_folder)
+def plot_video_casu_log_data (config_data, experiment_folder, list_same_colour_threshold, list_delta_frame, workers = log_loader.DEFAULT_WORKERS):
+    casu_logs = read_casu_logs (config_data, experiment_folder, workers)
     for a_casu_log in casu_logs.values ():
         a_casu_log.compute_activity (
             start_index = 0,
@@ -240,11 +161,12 @@ def plot_video_casu_log_data (config_data, experiment_folder, list_same_colour_t
             )
     casu_numbers = casu_logs.keys ()
     casu_numbers.sort ()
-    for same_colour_threshold in list_same_colour_threshold:
-        for delta_frame in list_delta_frame:
-            process_video_data_FOR_video_casu_log_data_plot (config_data, experiment_folder, casu_logs, casu_numbers, same_colour_threshold, delta_frame)
+    with render_queue.RenderQueue (workers) as queue:
+        for same_colour_threshold in list_same_colour_threshold:
+            for delta_frame in list_delta_frame:
+                process_video_data_FOR_video_casu_log_data_plot (config_data, experiment_folder, casu_logs, casu_numbers, same_colour_threshold, delta_frame, queue)
 
-def process_video_data_FOR_video_casu_log_data_plot (config_data, experiment_folder, casu_logs, casu_numbers, same_colour_threshold, delta_frame):
+def process_video_data_FOR_video_casu_log_data_plot (config_data, experiment_folder, casu_logs, casu_numbers, same_colour_threshold, delta_frame, queue):
     video_data = read_video_data (experiment_folder, same_colour_threshold = same_colour_threshold, delta_frame = delta_frame)
     video_data_column = dict ([
         (a_casu, index)
@@ -252,7 +174,8 @@ def process_video_data_FOR_video_casu_log_data_plot (config_data, experiment_fol
     for an_arena in config_data ['arenas']:
         casu_A = an_arena ['A']
         casu_B = an_arena ['B']
-        create_plot_video_casu_log_data (
+        queue.submit (
+            create_plot_video_casu_log_data,
             config_data = config_data,
             experiment_folder = experiment_folder,
             same_colour_threshold = same_colour_threshold,
@@ -265,23 +188,19 @@ def process_video_data_FOR_video_casu_log_data_plot (config_data, experiment_fol
             video_data_B = video_data [:, 2 * video_data_column [casu_B]],
             )
 
-def read_casu_logs (config_data, experiment_folder):
+def read_casu_logs (config_data, experiment_folder, workers = log_loader.DEFAULT_WORKERS):
     list_casu_numbers = [
         a_casu_number
         for an_arena in config_data ['arenas']
         for a_casu_number in an_arena.itervalues ()
     ]
-    result = {
-        a_casu_number : casu_log.CASU_Log (
-            a_casu_number,
-            os.path.join (
-                experiment_folder,
-                'data_infrared-test/beearena/'
-            )
-        )
-        for a_casu_number in list_casu_numbers
-    }
-    return result
+    return log_loader.load_casu_logs (
+        list_casu_numbers,
+        os.path.join (
+            experiment_folder,
+            'data_infrared-test/beearena/'
+        ),
+        workers)
 
 def read_video_data (experiment_folder, same_colour_threshold, delta_frame):
     _filename = os.path.join (
@@ -301,11 +220,9 @@ def read_video_data (experiment_folder, same_colour_threshold, delta_frame):
 
 def create_plot_video_casu_log_data (config_data, experiment_folder, same_colour_threshold, delta_frame, casu_A, casu_B, casu_log_A, casu_log_B, video_data_A, video_data_B, output_path = '.'):
     print ('Creating plots for data in folder {}, parameters SCT={} DF={}, and CASUs {} and {}'.format (experiment_folder, same_colour_threshold, delta_frame, casu_A, casu_B))
-    zero_time = numpy.mean ([
-        a_casu_log.led_actuator [0, 0]
-        for a_casu_log in [casu_log_A, casu_log_B]
-    ])
+    video_aligner = aligner.Aligner ([casu_log_A, casu_log_B], config_data ['video']['frames_per_second'], legacy_index = 0)
     experiment_duration = 60 * config_data ['parameters']['experiment_duration']
+    frames_per_second = int (config_data ['video']['frames_per_second'])
     # initialise plot
     figure_width, figure_height = 14, 9
     figure = matplotlib.pyplot.figure (figsize = (figure_width, figure_height))
@@ -325,14 +242,9 @@ def create_plot_video_casu_log_data (config_data, experiment_folder, same_colour
         sharey = 'row',
     )
     for index, (a_casu_log, a_video_data) in enumerate (zip ([casu_log_A, casu_log_B], [video_data_A, video_data_B])):
-        times_xs = [
-            zero_time + second
-            for second in range (experiment_duration)]
-        indexes = [
-            util.math.find_nearest_index (a_casu_log.infrared_raw [:, 0], a_time)
-            for a_time in times_xs]
-        xs = a_casu_log.moving_average_hits [indexes]
-        ys = a_video_data [0::int (config_data ['video']['frames_per_second'])]
+        frame_indexes = numpy.arange (0, min (len (a_video_data), experiment_duration * frames_per_second), frames_per_second)
+        xs = video_aligner.log_to_frames (a_casu_log.activity_times, a_casu_log.moving_average_hits, frame_indexes)
+        ys = a_video_data [frame_indexes]
         axes [index].scatter (
             xs, ys
             )
@@ -357,6 +269,7 @@ def create_plot_video_casu_log_data (config_data, experiment_folder, same_colour
                 same_colour_threshold,
                 delta_frame,
                 casu_A, casu_B)))
+    matplotlib.pyplot.close (figure)
 
 def process_arguments ():
     parser = argparse.ArgumentParser (
@@ -386,6 +299,12 @@ def process_arguments ():
         action = 'store_true',
         help = 'process videos with bees'
     )
+    parser.add_argument (
+        '--background-method',
+        choices = background_model.METHODS,
+        default = background_model.MEAN,
+        help = 'how the background image is computed from the frames of the background video.  Default is {}.'.format (background_model.MEAN)
+    )
     parser.add_argument (
         '--plot-video-casu-log-data',
         action = 'store_true',
@@ -412,7 +331,14 @@ def process_arguments ():
         metavar = 'N',
         action = 'append',
         type = int,
-        help = 'Delta velocity used when computing bee acceleration'
+        help = 'Delta velocity used when computing bee acceleration.  Bee acceleration is no longer computed, this option is ignored.'
+    )
+    parser.add_argument (
+        '--workers',
+        metavar = 'N',
+        type = int,
+        default = log_loader.DEFAULT_WORKERS,
+        help = 'Number of processes used to read CASU logs and to render plots.  Default value is the number of CPUs ({}).'.format (log_loader.DEFAULT_WORKERS)
     )
     return parser.parse_args ()
 
@@ -23,242 +23,248 @@ import argparse
 import csv
 import cv2
 import datetime
+import multiprocessing
 import numpy
 import os.path
 import pygraphviz
-import shutil
-import subprocess
-import tempfile
+import sys
 import yaml
 
 import assisipy
 
+import aligner
+import background_model
+import bee_features
 import casu_domset_log
 import casu_log
+import log_loader
+import run_index
+import stages
+import util.mask_stack
 import util.video
 
 BACKGROUND_VIDEO_FILENAME = 'background-video.avi'
+AVERAGE_BACKGROUND_FILENAME = 'avg-background.png'
+PLOT_FILENAME = 'interspecies-domset.png'
+FINAL_STATE_FILENAME = 'final-state_SCT={}_DF={}.csv'
+FINAL_STATE_SUMMARY_FILENAME = 'interspecies-domset_final-state_{}.csv'
+
+# number of frames at the end of the video used to compute the final number of bees of each CASU
+NUMBER_BEES_SLIDING_WINDOW = 100
+
+DEFAULT_TEMPERATURE_THRESHOLD = 34
+DEFAULT_NUMBER_BEES_THRESHOLD = 3000
+
+# analysis stages that write files, the CASU logs are read only when a stage that uses them runs
+STAGES = ['background', 'features', 'plot', 'final-state']
 
 def main ():
     args = process_arguments ()
-    working_folder = tempfile.mkdtemp (prefix = 'interspecies-experiment_')
-    for run_number in args.run:
-        process_experiment (
-            graph_name = args.graph,
-            run_number = run_number,
-            base_path = args.base_path,
-            working_folder = working_folder,
-            delta_frame = args.delta_frame,
-            same_colour_threshold = args.same_colour_threshold,
-            temperature_threshold = args.temperature_threshold,
-            number_bees_threshold = args.number_bees_threshold,
-        )
-    print ('Press ENTER to remove working folder [{}]'.format (working_folder))
-    raw_input ('> ')
-    shutil.rmtree (working_folder)
-
-def process_experiment (graph_name, run_number, working_folder, delta_frame, same_colour_threshold, temperature_threshold, number_bees_threshold, base_path = '.'):
-    experiment_path = os.path.join (base_path, 'run-{:03d}'.format (run_number))
-    frames_path = os.path.join (experiment_path, 'frames')
-    if not os.path.exists (frames_path):
-        os.makedirs (frames_path)
-    args = process_arguments ()
+    list_arguments = [
+        {
+            'graph_name' : args.graph,
+            'run_number' : run_number,
+            'base_path' : args.base_path,
+            'delta_frame' : args.delta_frame,
+            'same_colour_threshold' : args.same_colour_threshold,
+            # worker processes of a pool cannot create a pool to read logs
+            'workers' : args.workers if args.jobs <= 1 else 1,
+            'force' : args.force_stage,
+            'skip' : args.skip_stage,
+        }
+        for run_number in args.run
+    ]
+    if args.jobs <= 1 or len (list_arguments) <= 1:
+        results = [_process_experiment (arguments) for arguments in list_arguments]
+    else:
+        pool = multiprocessing.Pool (min (args.jobs, len (list_arguments)))
+        try:
+            results = pool.map (_process_experiment, list_arguments, chunksize = 1)
+        finally:
+            pool.close ()
+            pool.join ()
+    for run_number, code in zip (args.run, results):
+        if code != 0:
+            print ('[E] processing of run {} failed'.format (run_number))
+            sys.exit (code)
+    create_final_state_graphs (
+        graph_name = args.graph,
+        list_run_numbers = args.run,
+        base_path = args.base_path,
+        same_colour_threshold = args.same_colour_threshold,
+        delta_frame = args.delta_frame,
+        list_temperature_threshold = args.temperature_threshold if args.temperature_threshold is not None else [DEFAULT_TEMPERATURE_THRESHOLD],
+        list_number_bees_threshold = args.number_bees_threshold if args.number_bees_threshold is not None else [DEFAULT_NUMBER_BEES_THRESHOLD],
+    )
+
+def _process_experiment (arguments):
+    """
+    Worker function.  Process a run and return an exit code, as a worker process must not exit.
+    """
+    try:
+        process_experiment (**arguments)
+    except SystemExit as error:
+        return error.code
+    sys.stdout.flush ()
+    return 0
+
+def process_experiment (graph_name, run_number, delta_frame, same_colour_threshold, base_path = '.', workers = log_loader.DEFAULT_WORKERS, force = None, skip = None):
+    """
+    Run the analysis stages of a run that are not up to date, see module stages.
+    """
+    experiment_path = run_folder (base_path, run_number)
+    config_data = read_config (experiment_path, graph_name)
+    with open (os.path.join (experiment_path, 'cfgs/arenas.config'), 'r') as fdr:
+        arena_data = yaml.safe_load (fdr)
+    list_casu_numbers = config_data ['controllers']['domset']['casus']
+    index = run_index.get (experiment_path)
+    pipeline = stages.Pipeline (experiment_path)
+    pipeline.add (stages.Stage (
+        name = 'background',
+        function = create_average_background_image,
+        arguments = {
+            'config_data' : config_data,
+            'experiment_path' : experiment_path,
+        },
+        inputs = [os.path.join (experiment_path, BACKGROUND_VIDEO_FILENAME)],
+        outputs = [os.path.join (experiment_path, AVERAGE_BACKGROUND_FILENAME)],
+        code = [background_model, util.video],
+    ))
+    pipeline.add (stages.Stage (
+        name = 'features',
+        function = compute_bees_data,
+        arguments = {
+            'arena_data' : arena_data,
+            'config_data' : config_data,
+            'experiment_folder' : experiment_path,
+            'delta_frame' : delta_frame,
+            'same_colour_threshold' : same_colour_threshold,
+            'debug' : True,
+        },
+        inputs = [os.path.join (experiment_path, 'video.avi')] + mask_filenames (arena_data, experiment_path),
+        outputs = [
+            os.path.join (experiment_path, bee_features.features_filename (same_colour_threshold, delta_frame)),
+            os.path.join (experiment_path, bee_features.NUMBER_BEES_HISTOGRAMS_FILENAME),
+            os.path.join (experiment_path, bee_features.BEE_SPEED_HISTOGRAMS_FILENAME.format (delta_frame)),
+        ],
+        depends = ['background'],
+        code = [mask_filenames, bee_features, util.mask_stack, util.video],
+    ))
+    pipeline.add (stages.Stage (
+        name = 'logs',
+        function = read_logs,
+        arguments = {
+            'config_data' : config_data,
+            'experiment_folder' : experiment_path,
+        },
+        inputs = [
+            a_filename
+            for a_casu_number in list_casu_numbers
+            for a_filename in index.casu_logs (a_casu_number) + index.domset_logs (a_casu_number)
+        ],
+        options = {'workers' : workers},
+        code = [log_loader, casu_log, casu_domset_log],
+    ))
+    pipeline.add (stages.Stage (
+        name = 'plot',
+        function = create_plot,
+        arguments = {
+            'config_data' : config_data,
+            'experiment_folder' : experiment_path,
+            'same_colour_threshold' : same_colour_threshold,
+            'delta_frame' : delta_frame,
+            'logs' : stages.Result ('logs'),
+        },
+        outputs = [os.path.join (experiment_path, PLOT_FILENAME)],
+        depends = ['features'],
+        code = [read_video_data, video_data_columns, create_figure, aligner, casu_log, casu_domset_log],
+    ))
+    pipeline.add (stages.Stage (
+        name = 'final-state',
+        function = compute_final_state,
+        arguments = {
+            'config_data' : config_data,
+            'experiment_path' : experiment_path,
+            'same_colour_threshold' : same_colour_threshold,
+            'delta_frame' : delta_frame,
+            'logs' : stages.Result ('logs'),
+        },
+        outputs = [final_state_filename (experiment_path, same_colour_threshold, delta_frame)],
+        depends = ['features'],
+        code = [read_video_data, video_data_columns, final_state_filename],
+    ))
+    pipeline.run (force = force, skip = skip)
+
+def run_folder (base_path, run_number):
+    return os.path.join (base_path, 'run-{:03d}'.format (run_number))
+
+def read_config (experiment_path, graph_name):
     config_filename = os.path.join (
         experiment_path,
         'cfgs/{}.config'.format (graph_name)
         )
     with open (config_filename, 'r') as fd:
-        config_data = yaml.safe_load (fd)
-    with open (os.path.join (experiment_path, 'cfgs/arenas.config'), 'r') as fdr:
-        arena_data = yaml.safe_load (fdr)
-    # background video
-    if False:
-        split_background_video (config_data, experiment_path)
-        create_average_background_image (config_data, experiment_path, working_folder)
-    # bee video
-    if False:
-        prepare_masks (arena_data, experiment_path, working_folder)
-        split_bees_video (config_data, experiment_path, working_folder)
-        compute_bees_data (
-            arena_data = arena_data,
-            config_data = config_data,
-            experiment_folder = experiment_path,
-            working_folder = working_folder,
-            delta_frame = delta_frame,
-            same_colour_threshold = same_colour_threshold,
-            debug = True
-            )
-    # read data for plots
-    dict_casu_logs = read_casu_logs (config_data, experiment_path)
-    dict_casu_domset_logs = read_casu_domset_logs (config_data, experiment_path)
-    video_data = read_video_data (experiment_path, same_colour_threshold, delta_frame)
-    list_casu_numbers = [a_casu for a_casu in config_data ['controllers']['domset']['casus']]
-    list_casu_numbers.sort ()
-    video_data_column = dict ([
-        (a_casu, index)
-        for index, a_casu in enumerate (list_casu_numbers)])
-    #create_plot (config_data, experiment_path, same_colour_threshold, delta_frame, dict_casu_logs, dict_casu_domset_logs, video_data, video_data_column)
-    create_final_state_graph (
-        graph_name, run_number, config_data, experiment_path, same_colour_threshold, delta_frame,
-        temperature_threshold,
-        number_bees_threshold,
-        dict_casu_logs,
-        #dict_casu_domset_logs,
-        video_data,
-        video_data_column
-    )
-    
-def split_background_video (config_data, experiment_path):
-    number_frames = config_data ['video']['frames_per_second'] * 2
-    code = util.video.split_video (
-        os.path.join (experiment_path, BACKGROUND_VIDEO_FILENAME),
-        number_frames,
-        config_data ['video']['frames_per_second'],
-        os.path.join (experiment_path, 'frames/background-%3d.png'),
-        debug = True
-    )
-    if code != 0:
-        print ('[E] There was a problem splitting the background video!')
-        sys.exit (code)
+        return yaml.safe_load (fd)
 
-def create_average_background_image (config_data, experiment_path, working_folder):
+def create_average_background_image (config_data, experiment_path, method = background_model.MEAN):
     number_frames = config_data ['video']['frames_per_second'] * 2
-    size = (
-        util.video.CAMERA_RESOLUTION_Y - config_data ['video']['crop_bottom'] - config_data ['video']['crop_top'],
-        util.video.CAMERA_RESOLUTION_X - config_data ['video']['crop_left'] - config_data ['video']['crop_right'],
-        3)
-    background_image = numpy.zeros (size, dtype = numpy.uint16)
-    for index in range (1, 1 + number_frames):
-        current_image = cv2.imread (os.path.join (
-            os.path.join (experiment_path, 'frames'),
-            'background-{:03d}.png'.format (index)))
-        background_image = cv2.add (
-            background_image,
-            current_image,
-            dtype = cv2.CV_32F,
-            )
-    background_image = cv2.addWeighted (
-        src1 = background_image,
-        alpha = 1.0 / number_frames,
-        src2 = numpy.zeros (size, dtype = numpy.uint8),
-        beta = 0,
-        gamma = 0,
-        dtype = cv2.CV_8U)
+    size = util.video.recorded_frame_size (config_data ['video'])
+    background_image = background_model.compute_background (
+        os.path.join (experiment_path, BACKGROUND_VIDEO_FILENAME),
+        size,
+        number_frames = number_frames,
+        frames_per_second = config_data ['video']['frames_per_second'],
+        method = method)
     cv2.imwrite (
         os.path.join (
             experiment_path,
-            'avg-background.png'),
-        background_image)
-    cv2.imwrite (
-        os.path.join (
-            working_folder,
-            'background.png'),
+            AVERAGE_BACKGROUND_FILENAME),
         background_image)
 
-def prepare_masks (arena_data, experiment_folder, working_folder):
-    number_ROIs = 2 * len (arena_data ['arenas'])
+def mask_filenames (arena_data, experiment_folder):
+    """
+    Return the filenames of the stadium ring masks, two per arena, with arenas and CASUs sorted.
+    """
     list_arenas = []
     for an_arena in arena_data ['arenas']:
         casus = [a_casu for a_casu in an_arena.itervalues ()]
         casus.sort ()
         list_arenas.append (casus)
     list_arenas.sort ()
-    print (list_arenas)
-    for index_arena, casus in enumerate (list_arenas):
-        for index_casu, a_casu in enumerate (casus):
-            os.symlink (
-                os.path.join (
-                    os.path.join (
-                        os.getcwd (),
-                        experiment_folder),
-                    'masks/Stadium-Ring-{}-{}.png'.format (index_arena + 1, a_casu)),
-                os.path.join (
-                    working_folder,
-                    'Mask-{}.png'.format (2 * index_arena + index_casu + 1)))
-
-def split_bees_video (config_data, experiment_folder, working_folder):
-    print ('Splitting video with bees of experiment {}...'.format (experiment_folder))
-    number_frames = 60 * config_data ['experiment_duration'] * config_data ['video']['frames_per_second']
-    util.video.split_video (
-        video_filename = os.path.join (experiment_folder, 'video.avi'),
-        number_frames = number_frames,
-        frames_per_second = config_data ['video']['frames_per_second'],
-        output_template = os.path.join (
-            working_folder,
-            'frames-%04d.png',
-        ),
-        debug = False
-    )
+    return [
+        os.path.join (experiment_folder, 'masks/Stadium-Ring-{}-{}.png'.format (index_arena + 1, a_casu))
+        for index_arena, casus in enumerate (list_arenas)
+        for a_casu in casus]
 
-def compute_bees_data (arena_data, config_data, experiment_folder, working_folder, delta_frame, same_colour_threshold, delta_velocity = 2, debug = False):
-    # create the CSV file read by assisi-batch-video-processing that contains the video to process
-    csv_filename = os.path.join (working_folder, 'data.csv')
-    with open (csv_filename, 'w') as fdw:
-        writer = csv.writer (
-            fdw,
-            delimiter = ',',
-            quoting = csv.QUOTE_NONNUMERIC,
-            lineterminator = '\n')
-        writer.writerow ([
-            'folder',
-            'x1',
-            'y1',
-            'x2',
-            'y2',
-            'use',
-            ])
-        writer.writerow ([
-            working_folder,
-            0, 0, 0, 0,
-            1,
-            ])
-        fdw.close ()
+def compute_bees_data (arena_data, config_data, experiment_folder, delta_frame, same_colour_threshold, delta_velocity = 2, debug = False):
+    # delta_velocity was used by assisi-batch-video-processing to compute bee acceleration, which is not a feature used in this analysis
     number_frames = 60 * config_data ['experiment_duration'] * config_data ['video']['frames_per_second']
-    command = [
-        '/home/pedro/cloud/Dropbox/xSearch/ASSISIbf/software/build-assisi-batch-video-processing-Desktop-Debug/assisi-batch-video-processing',
-        '--number-frames', '{:d}'.format (number_frames),
-        '--csv-file', csv_filename,
-        '--number-ROIs', '{:d}'.format (2 * len (arena_data ['arenas'])),
-        '--delta-frame', '{:d}'.format (delta_frame),
-        '--same-colour-threshold', '{:d}'.format (same_colour_threshold),
-        '--delta-velocity', '{:d}'.format (delta_velocity),
-        '--frame-file-type', 'png',
-        '--check-ROIs',
-        '--features-number-bees-AND-bee-speed',
-    ]
     if debug:
-        print ('Full command is:')
-        print (' '.join (command))
-        print
-    process = subprocess.Popen (command)
-    process.wait ()
-    # move the CSV files to the experiment folder
-    for csv_file in [
-            'features-pixel-count-difference_SCT={}_DF={}_histogram-equalization.csv'.format (same_colour_threshold, delta_frame),
-            'histograms-frames_masked-ROIs_bee-speed_histogram-equalisation-normal_DF={}.csv'.format (delta_frame),
-            'histograms-frames_masked-ROIs_number-bees_histogram-equalisation-normal.csv'
-            ]:
-        print ('Moving file {} form {} to {}...'.format (csv_file, working_folder, experiment_folder))
-        os.rename (
-            os.path.join (
-                working_folder,
-                csv_file),
-            os.path.join (
-                experiment_folder,
-                csv_file))
-
-def create_plot (config_data, experiment_folder, same_colour_threshold, delta_frame,
-                 dict_casu_logs, dict_casu_domset_logs, video_data,
-                 video_data_column
-):
+        print ('Computing bee features of experiment {} with SCT={} DF={}...'.format (experiment_folder, same_colour_threshold, delta_frame))
+    background = cv2.imread (os.path.join (experiment_folder, AVERAGE_BACKGROUND_FILENAME))
+    masks = util.mask_stack.read_masks (mask_filenames (arena_data, experiment_folder))
+    frames = util.video.read_frames (
+        os.path.join (experiment_folder, 'video.avi'),
+        background.shape [:2],
+        number_frames = number_frames,
+        frames_per_second = config_data ['video']['frames_per_second'])
+    features, number_bees_histograms, bee_speed_histograms = bee_features.compute_features (
+        frames, background, masks, same_colour_threshold, delta_frame)
+    bee_features.write_features (
+        experiment_folder, same_colour_threshold, delta_frame,
+        features, number_bees_histograms, bee_speed_histograms)
+
+def create_plot (config_data, experiment_folder, same_colour_threshold, delta_frame, logs):
+    """
+    :param logs: the CASU logs and CASU DOMSET logs, see function read_logs
+    """
+    dict_casu_logs, dict_casu_domset_logs = logs
+    video_data = read_video_data (experiment_folder, same_colour_threshold, delta_frame)
+    video_data_column = video_data_columns (config_data)
     number_nodes = len (config_data ['graph']['node_CASUs'])
-    zero_time = numpy.mean ([
-        a_casu_log.led_actuator [2, 0]
-        for a_casu_log in dict_casu_logs.itervalues ()
-    ])
-    xs_video = [
-        zero_time + tt / float (config_data ['video']['frames_per_second'])
-        for tt in range (config_data ['experiment_duration'] * 60 * config_data ['video']['frames_per_second'])]
+    video_aligner = aligner.Aligner (dict_casu_logs.values (), config_data ['video']['frames_per_second'], legacy_index = 2)
+    zero_time = video_aligner.zero_time
+    xs_video = video_aligner.frame_times (numpy.arange (len (video_data)))
     # initialise plot
     figure, axes = create_figure (
         figure_width = 14, figure_height = 3 * number_nodes,
@@ -325,44 +331,118 @@ def create_plot (config_data, experiment_folder, same_colour_threshold, delta_fr
                 video_data [:, 2 * video_data_column [a_casu]],
                 '-')
     figure.suptitle ('interspecies domset\n{}'.format (experiment_folder), fontsize = 9)
-    figure.savefig ('interspecies-domset.png'.format ())
+    figure.savefig (os.path.join (experiment_folder, PLOT_FILENAME))
     matplotlib.pyplot.close (figure)
 
-def create_final_state_graph (
-        graph_name, run_number, config_data, experiment_path,
+def compute_final_state (
+        config_data, experiment_path,
         same_colour_threshold, delta_frame,
-        temperature_threshold,
-        number_bees_threshold,
-        dict_casu_logs,
-                              #, dict_casu_domset_logs
-        video_data,
-        video_data_column,
-        number_bees_sliding_window = 100
+        logs,
+        number_bees_sliding_window = NUMBER_BEES_SLIDING_WINDOW
 ):
-    fs = pygraphviz.AGraph (strict = True, directed = False)
-    list_nodes = [a_node for a_node in config_data ['graph']['node_CASUs']]
-    list_nodes.sort ()
-    for index_node, a_node in enumerate (list_nodes):
+    """
+    Write the final state of each CASU of a run: its node, the last wax temperature of the master CASU of the node
+    and the mean number of bees in the last frames of the video.  The final state graphs for any thresholds are
+    computed from this file, see function create_final_state_graphs.
+    """
+    dict_casu_logs, _ = logs
+    video_data = read_video_data (experiment_path, same_colour_threshold, delta_frame)
+    video_data_column = video_data_columns (config_data)
+    rows = []
+    for a_node in sorted (config_data ['graph']['node_CASUs']):
         node_casus = config_data ['graph']['node_CASUs'][a_node]
         master_casu = max (node_casus)
         node_temperature = dict_casu_logs [master_casu].temperature [-1][1 + assisipy.casu.TEMP_WAX - assisipy.casu.TEMP_F]
-        win1 = node_temperature > temperature_threshold
-        win2 = 0
-        for a_casu in config_data ['graph']['node_CASUs'][a_node]:
+        for a_casu in node_casus:
             value = video_data [-number_bees_sliding_window:-1, 2 * video_data_column [a_casu]].mean ()
             print ('Using number of bees value {} for casu {} that belongs to node {}'.format (value, a_casu, a_node))
-            if value > number_bees_threshold:
-                win2 += 1
-        layer = fs.add_node (
-            a_node,
-            label = chr (index_node + ord ('A')),
-            color = 'red' if win1 else 'blue',
-            penwidth = 1 + ((1 + win2) if win2 > 0 else 0)
-        )
-    for an_edge in config_data ['graph']['edges']:
-        fs.add_edge (an_edge [0], an_edge [1])
-    filename = 'interspecies-domset_final-state-graph_{}-{}-{}-{}.gv'.format (graph_name, run_number, temperature_threshold, number_bees_threshold)
-    fs.write (filename)
+            rows.append ([a_node, a_casu, node_temperature, value])
+    with open (final_state_filename (experiment_path, same_colour_threshold, delta_frame), 'w') as fdw:
+        writer = csv.writer (fdw, delimiter = ';', quoting = csv.QUOTE_NONNUMERIC)
+        writer.writerows (rows)
+
+def final_state_filename (experiment_path, same_colour_threshold, delta_frame):
+    return os.path.join (experiment_path, FINAL_STATE_FILENAME.format (same_colour_threshold, delta_frame))
+
+def read_final_state (experiment_path, config_data, same_colour_threshold, delta_frame):
+    """
+    :return: a tuple with the sorted list of nodes, the node index of each CASU, the node temperatures and the CASU number of bees
+    """
+    _filename = final_state_filename (experiment_path, same_colour_threshold, delta_frame)
+    try:
+        with open (_filename, 'r') as fdr:
+            reader = csv.reader (fdr, delimiter = ';', quoting = csv.QUOTE_NONNUMERIC)
+            rows = [row for row in reader]
+    except IOError:
+        print ('[E] There is no final state file {}'.format (_filename))
+        sys.exit (1)
+    list_nodes = sorted (config_data ['graph']['node_CASUs'])
+    node_index = dict ([(str (a_node), index) for index, a_node in enumerate (list_nodes)])
+    casu_node = numpy.array ([node_index [str (row [0])] for row in rows], dtype = int)
+    node_temperature = numpy.zeros (len (list_nodes))
+    node_temperature [casu_node] = [row [2] for row in rows]
+    casu_number_bees = numpy.array ([row [3] for row in rows])
+    return list_nodes, casu_node, node_temperature, casu_number_bees
+
+def create_final_state_graphs (
+        graph_name, list_run_numbers, base_path,
+        same_colour_threshold, delta_frame,
+        list_temperature_threshold,
+        list_number_bees_threshold,
+):
+    """
+    Create the final state graph of each run for every combination of temperature threshold and number of bees
+    threshold, and a summary table with the state of each node in every graph.
+
+    The final states of all runs are stacked, so that the node states for all thresholds are computed in a single
+    comparison.  A node wins by temperature if the temperature of its master CASU is greater than the temperature
+    threshold.  The node pen width grows with the number of its CASUs that have more bees than the number of bees
+    threshold.
+    """
+    runs = []
+    for run_number in list_run_numbers:
+        experiment_path = run_folder (base_path, run_number)
+        config_data = read_config (experiment_path, graph_name)
+        runs.append ((run_number, config_data) + read_final_state (experiment_path, config_data, same_colour_threshold, delta_frame))
+    # offset of the first node of each run in the stacked arrays
+    node_offsets = numpy.cumsum ([0] + [len (list_nodes) for _, _, list_nodes, _, _, _ in runs])
+    node_temperature = numpy.concatenate ([temperatures for _, _, _, _, temperatures, _ in runs])
+    casu_node = numpy.concatenate ([
+        casu_node + offset
+        for (_, _, _, casu_node, _, _), offset in zip (runs, node_offsets)])
+    casu_number_bees = numpy.concatenate ([number_bees for _, _, _, _, _, number_bees in runs])
+    temperature_thresholds = numpy.array (list_temperature_threshold, dtype = float)
+    number_bees_thresholds = numpy.array (list_number_bees_threshold, dtype = float)
+    # win1 [node, temperature threshold] and win2 [node, number of bees threshold]
+    win1 = node_temperature [:, numpy.newaxis] > temperature_thresholds [numpy.newaxis, :]
+    win2 = numpy.zeros ((len (node_temperature), len (number_bees_thresholds)), dtype = int)
+    numpy.add.at (win2, casu_node, casu_number_bees [:, numpy.newaxis] > number_bees_thresholds [numpy.newaxis, :])
+    summary = []
+    for (run_number, config_data, list_nodes, _, _, _), offset in zip (runs, node_offsets):
+        for index_temperature, temperature_threshold in enumerate (list_temperature_threshold):
+            for index_number_bees, number_bees_threshold in enumerate (list_number_bees_threshold):
+                fs = pygraphviz.AGraph (strict = True, directed = False)
+                for index_node, a_node in enumerate (list_nodes):
+                    node_win1 = win1 [offset + index_node, index_temperature]
+                    node_win2 = win2 [offset + index_node, index_number_bees]
+                    fs.add_node (
+                        a_node,
+                        label = chr (index_node + ord ('A')),
+                        color = 'red' if node_win1 else 'blue',
+                        penwidth = 1 + ((1 + node_win2) if node_win2 > 0 else 0)
+                    )
+                    summary.append ([run_number, temperature_threshold, number_bees_threshold, a_node, chr (index_node + ord ('A')), int (node_win1), node_win2])
+                for an_edge in config_data ['graph']['edges']:
+                    fs.add_edge (an_edge [0], an_edge [1])
+                fs.write (final_state_graph_filename (graph_name, run_number, temperature_threshold, number_bees_threshold))
+    with open (FINAL_STATE_SUMMARY_FILENAME.format (graph_name), 'w') as fdw:
+        writer = csv.writer (fdw, delimiter = ';', quoting = csv.QUOTE_NONNUMERIC)
+        writer.writerow (['run', 'temperature threshold', 'number bees threshold', 'node', 'label', 'temperature win', 'number CASUs with bees'])
+        writer.writerows (summary)
+    print ('[I] Created {} final state graphs'.format (len (runs) * len (list_temperature_threshold) * len (list_number_bees_threshold)))
+
+def final_state_graph_filename (graph_name, run_number, temperature_threshold, number_bees_threshold):
+    return 'interspecies-domset_final-state-graph_{}-{}-{}-{}.gv'.format (graph_name, run_number, temperature_threshold, number_bees_threshold)
 
 
 def create_figure (figure_width, figure_height, number_rows, number_cols,
@@ -401,21 +481,31 @@ def create_figure (figure_width, figure_height, number_rows, number_cols,
         )
     return figure, axes
 
-def read_casu_logs (config_data, experiment_folder):
-    list_casu_numbers = config_data ['controllers']['domset']['casus']
-    result = {
-        a_casu_number : casu_log.CASU_Log (a_casu_number, experiment_folder)
-        for a_casu_number in list_casu_numbers
-    }
-    return result
+def read_logs (config_data, experiment_folder, workers = log_loader.DEFAULT_WORKERS):
+    """
+    Read the CASU logs and the CASU DOMSET logs of an experiment in a single batch.
 
-def read_casu_domset_logs (config_data, experiment_folder):
+    :return: a tuple with a dictionary of CASU logs and a dictionary of CASU DOMSET logs, both indexed by CASU number
+    """
     list_casu_numbers = config_data ['controllers']['domset']['casus']
-    result = {
-        a_casu_number : casu_domset_log.CASU_DOMSET_Log (a_casu_number, experiment_folder)
-        for a_casu_number in list_casu_numbers
-    }
-    return result
+    logs = log_loader.load_logs (
+        [(log_loader.CASU_LOG, a_casu_number, experiment_folder) for a_casu_number in list_casu_numbers] +
+        [(log_loader.DOMSET_LOG, a_casu_number, experiment_folder) for a_casu_number in list_casu_numbers],
+        workers)
+    return (
+        dict (zip (list_casu_numbers, logs [:len (list_casu_numbers)])),
+        dict (zip (list_casu_numbers, logs [len (list_casu_numbers):])),
+    )
+
+def video_data_columns (config_data):
+    """
+    Return a dictionary that maps CASU numbers to their ROI in the features file.
+    """
+    list_casu_numbers = [a_casu for a_casu in config_data ['controllers']['domset']['casus']]
+    list_casu_numbers.sort ()
+    return dict ([
+        (a_casu, index)
+        for index, a_casu in enumerate (list_casu_numbers)])
 
 def read_video_data (experiment_folder, same_colour_threshold, delta_frame):
     _filename = os.path.join (
@@ -476,16 +566,46 @@ def process_arguments ():
     parser.add_argument (
         '--temperature-threshold',
         metavar = 'T',
+        action = 'append',
         type = int,
-        default = 34,
-        help = 'Threshold used when deciding if a node is part of a DOMSET solution (the master casu temperature is high enough)'
+        help = 'Threshold used when deciding if a node is part of a DOMSET solution (the master casu temperature is high enough).  Repeat this option to create the final state graphs of several thresholds.  Default value is {}.'.format (DEFAULT_TEMPERATURE_THRESHOLD)
     )
     parser.add_argument (
         '--number-bees-threshold',
         metavar = 'P',
+        action = 'append',
+        type = int,
+        help = 'Threshold used when deciding if a casu node is part of a DOMSET solution (it has enough bees around it).  Repeat this option to create the final state graphs of several thresholds.  Default value is {}.'.format (DEFAULT_NUMBER_BEES_THRESHOLD)
+    )
+    parser.add_argument (
+        '--workers',
+        metavar = 'N',
+        type = int,
+        default = log_loader.DEFAULT_WORKERS,
+        help = 'Number of processes used to read CASU logs.  Default value is the number of CPUs ({}).'.format (log_loader.DEFAULT_WORKERS)
+    )
+    parser.add_argument (
+        '--jobs', '-j',
+        metavar = 'N',
         type = int,
-        default = 3000,
-        help = 'Threshold used when deciding if a casu node is part of a DOMSET solution (it has enough bees around it)'
+        default = 1,
+        help = 'Number of runs processed concurrently.  If greater than one, each run reads its logs in a single process.'
+    )
+    parser.add_argument (
+        '--force-stage',
+        metavar = 'STAGE',
+        action = 'append',
+        choices = STAGES,
+        default = [],
+        help = 'Run the given analysis stage even if it is up to date.  Stages are: {}.'.format (', '.join (STAGES))
+    )
+    parser.add_argument (
+        '--skip-stage',
+        metavar = 'STAGE',
+        action = 'append',
+        choices = STAGES,
+        default = [],
+        help = 'Do not run the given analysis stage, its current outputs are used by the other stages'
     )
     return parser.parse_args ()
 
@@ -0,0 +1,117 @@
+"""
+Background image of an arena computed from a video without bees.
+
+The background is estimated from a stream of frames, see function
+util.video.read_frames, in a single pass.  The estimator keeps a float32
+running mean of the frames and, optionally, a small reservoir of frames
+sampled uniformly from the stream that is used to compute the median or
+another percentile.
+
+The background image of a video is cached next to the video.  The cache is
+keyed by the MD5 checksum of the video, so a new video with the same name
+produces a new background image.
+"""
+
+import cv2
+import hashlib
+import numpy
+import os
+import os.path
+import random
+
+import util.video
+
+MEAN = 'mean'
+MEDIAN = 'median'
+METHODS = [MEAN, MEDIAN]
+
+DEFAULT_RESERVOIR_SIZE = 32
+
+class BackgroundEstimator (object):
+    """
+    Streaming estimator of the background image.
+    """
+
+    def __init__ (self, reservoir_size = 0, seed = 0):
+        """
+        :param reservoir_size: number of frames kept to compute percentiles, zero to only compute the mean
+        """
+        self.number_frames = 0
+        self.reservoir_size = reservoir_size
+        self.__mean = None
+        self.__reservoir = []
+        self.__random = random.Random (seed)
+
+    def update (self, frame):
+        self.number_frames += 1
+        if self.__mean is None:
+            self.__mean = frame.astype (numpy.float32)
+        else:
+            self.__mean += (frame - self.__mean) / numpy.float32 (self.number_frames)
+        if self.reservoir_size > 0:
+            if len (self.__reservoir) < self.reservoir_size:
+                self.__reservoir.append (numpy.array (frame, dtype = numpy.uint8))
+            else:
+                index = self.__random.randrange (self.number_frames)
+                if index < self.reservoir_size:
+                    self.__reservoir [index] = numpy.array (frame, dtype = numpy.uint8)
+
+    def mean (self):
+        """
+        Return the mean of the frames as an 8 bit image.
+        """
+        return _to_image (self.__mean)
+
+    def percentile (self, q):
+        """
+        Return the given percentile of the frames in the reservoir as an 8 bit image.
+        """
+        if len (self.__reservoir) == 0:
+            raise ValueError ('the background estimator has no reservoir')
+        return _to_image (numpy.percentile (numpy.array (self.__reservoir), q, axis = 0))
+
+    def median (self):
+        return self.percentile (50)
+
+def _to_image (data):
+    return numpy.clip (numpy.round (data), 0, 255).astype (numpy.uint8)
+
+def video_checksum (video_filename, block_size = 1 << 20):
+    md5 = hashlib.md5 ()
+    with open (video_filename, 'rb') as fd:
+        for block in iter (lambda: fd.read (block_size), b''):
+            md5.update (block)
+    return md5.hexdigest ()
+
+def cache_filename (video_filename, checksum, method, number_frames):
+    return os.path.join (
+        os.path.splitext (video_filename) [0] + '.background',
+        '{}_{}_N={}.png'.format (checksum, method, number_frames))
+
+def compute_background (video_filename, frame_size, number_frames, frames_per_second, method = MEAN, reservoir_size = DEFAULT_RESERVOIR_SIZE):
+    """
+    Compute the background image of a video, or read it from the cache.
+
+    :param frame_size: height and width of the video frames
+    :param number_frames: number of frames of the video to use
+    :param method: MEAN or MEDIAN
+    :return: the background image as a BGR image
+    """
+    _filename = cache_filename (video_filename, video_checksum (video_filename), method, number_frames)
+    if os.path.exists (_filename):
+        result = cv2.imread (_filename)
+        if result is not None:
+            return result
+    estimator = BackgroundEstimator (reservoir_size = reservoir_size if method == MEDIAN else 0)
+    for a_frame in util.video.read_frames (video_filename, frame_size, number_frames = number_frames, frames_per_second = frames_per_second):
+        estimator.update (a_frame)
+    if estimator.number_frames == 0:
+        raise IOError ('video {} has no frames'.format (video_filename))
+    result = estimator.median () if method == MEDIAN else estimator.mean ()
+    try:
+        if not os.path.isdir (os.path.dirname (_filename)):
+            os.makedirs (os.path.dirname (_filename))
+        cv2.imwrite (_filename, result)
+    except (IOError, OSError) as error:
+        print ('[W] could not cache background image of video {}: {}'.format (video_filename, error))
+    return result
@@ -0,0 +1,158 @@
+"""
+Bee features computed from the video of an experiment.
+
+The arena is divided in regions of interest (ROI), one per CASU, given by a
+mask stack (see module util.mask_stack).  Frames and the background image
+are converted to grey and their histogram is equalised.  For each frame and
+each ROI two features are computed:
+
+* the number of bee pixels, that is, pixels whose difference to the
+  background is greater than the same colour threshold;
+* the bee speed, that is, the number of pixels whose difference to the frame
+  delta frame frames before is greater than the same colour threshold.  In
+  the first delta frame frames the bee speed is zero.
+
+The features file has one row per frame and two columns per ROI, the number
+of bee pixels followed by the bee speed.  The histograms files have one row
+per ROI with the histogram of the pixel differences used by each feature
+over the whole video.  These are the files that were produced by the
+assisi-batch-video-processing program.
+
+Frames are processed in batches, stacked in three dimensional arrays.
+Several same colour thresholds and delta frames can be evaluated in a single
+pass over the video.
+"""
+
+import csv
+import cv2
+import numpy
+import os.path
+
+FEATURES_FILENAME = 'features-pixel-count-difference_SCT={}_DF={}_histogram-equalization.csv'
+NUMBER_BEES_HISTOGRAMS_FILENAME = 'histograms-frames_masked-ROIs_number-bees_histogram-equalisation-normal.csv'
+BEE_SPEED_HISTOGRAMS_FILENAME = 'histograms-frames_masked-ROIs_bee-speed_histogram-equalisation-normal_DF={}.csv'
+
+DEFAULT_BATCH_SIZE = 8
+
+def features_filename (same_colour_threshold, delta_frame):
+    return FEATURES_FILENAME.format (same_colour_threshold, delta_frame)
+
+def prepare_image (image):
+    """
+    Convert a BGR image to grey and equalise its histogram.
+    """
+    return cv2.equalizeHist (cv2.cvtColor (image, cv2.COLOR_BGR2GRAY))
+
+def compute_features (frames, background, masks, same_colour_threshold, delta_frame, batch_size = DEFAULT_BATCH_SIZE):
+    """
+    Compute the bee features of a video.
+
+    :param frames: an iterable of BGR frames, see function util.video.read_frames
+    :param background: the BGR background image
+    :param masks: the ROIs, see class util.mask_stack.MaskStack
+    :return: a tuple with the features array, the number of bees histograms and the bee speed histograms
+    """
+    features, number_bees_histograms, bee_speed_histograms = compute_features_sweep (
+        frames, background, masks, [same_colour_threshold], [delta_frame], batch_size)
+    return features [(same_colour_threshold, delta_frame)], number_bees_histograms, bee_speed_histograms [delta_frame]
+
+def compute_features_sweep (frames, background, masks, list_same_colour_threshold, list_delta_frame, batch_size = DEFAULT_BATCH_SIZE):
+    """
+    Compute the bee features of a video for all combinations of same colour threshold and delta frame in a single
+    pass over the video.  Only the pixels in the ROIs are kept.  The last frames of each batch, as many as the largest
+    delta frame, are kept for the next batch.
+
+    :return: a tuple with a dictionary that maps (same colour threshold, delta frame) to the features array, the
+    number of bees histograms, and a dictionary that maps delta frames to the bee speed histograms
+    """
+    list_same_colour_threshold = sorted (set (list_same_colour_threshold))
+    list_delta_frame = sorted (set (list_delta_frame))
+    max_delta_frame = max (list_delta_frame)
+    background = masks.select (prepare_image (background))
+    number_ROIs = masks.number_ROIs
+    features = dict ([
+        ((sct, df), [])
+        for sct in list_same_colour_threshold
+        for df in list_delta_frame
+    ])
+    number_bees_histograms = numpy.zeros ((number_ROIs, 256), dtype = numpy.int64)
+    bee_speed_histograms = dict ([
+        (df, numpy.zeros ((number_ROIs, 256), dtype = numpy.int64))
+        for df in list_delta_frame
+    ])
+    # the last max_delta_frame frames of the previous batches
+    history = numpy.zeros ((0, len (masks.pixels)), dtype = numpy.uint8)
+    for batch in _batches (frames, masks, batch_size):
+        stack = numpy.concatenate ((history, batch))
+        results = dict ([
+            (key, numpy.zeros ((len (batch), 2 * number_ROIs), dtype = numpy.int64))
+            for key in features.keys ()
+        ])
+        difference = absolute_difference (batch, background)
+        number_bees_histograms += masks.histograms (difference)
+        for sct in list_same_colour_threshold:
+            number_bees = masks.count (difference > sct)
+            for df in list_delta_frame:
+                results [(sct, df)][:, 0::2] = number_bees
+        for df in list_delta_frame:
+            # frames without a frame df frames before have zero bee speed
+            first = min (len (batch), max (0, df - len (history)))
+            if first == len (batch):
+                continue
+            previous = stack [first + len (history) - df:len (stack) - df]
+            difference = absolute_difference (batch [first:], previous)
+            bee_speed_histograms [df] += masks.histograms (difference)
+            for sct in list_same_colour_threshold:
+                results [(sct, df)][first:, 1::2] = masks.count (difference > sct)
+        for key, result in results.items ():
+            features [key].append (result)
+        history = stack [max (0, len (stack) - max_delta_frame):]
+    features = dict ([
+        (key, numpy.concatenate (list_results) if len (list_results) > 0 else numpy.zeros ((0, 2 * number_ROIs), dtype = numpy.int64))
+        for key, list_results in features.items ()
+    ])
+    return features, number_bees_histograms, bee_speed_histograms
+
+def _batches (frames, masks, batch_size):
+    # stack the ROI pixels of the prepared frames in arrays with one frame per row
+    batch = []
+    for a_frame in frames:
+        batch.append (masks.select (prepare_image (a_frame)))
+        if len (batch) == batch_size:
+            yield numpy.array (batch)
+            batch = []
+    if len (batch) > 0:
+        yield numpy.array (batch)
+
+def absolute_difference (a, b):
+    # computed in uint8 without overflow
+    return numpy.maximum (a, b) - numpy.minimum (a, b)
+
+def write_features (folder, same_colour_threshold, delta_frame, features, number_bees_histograms, bee_speed_histograms):
+    """
+    Write the features file and the histograms files in the given folder.
+    """
+    write_features_sweep (
+        folder,
+        {(same_colour_threshold, delta_frame) : features},
+        number_bees_histograms,
+        {delta_frame : bee_speed_histograms})
+
+def write_features_sweep (folder, features, number_bees_histograms, bee_speed_histograms):
+    """
+    Write the files computed by function compute_features_sweep in the given folder.
+    """
+    for (same_colour_threshold, delta_frame), data in features.items ():
+        _write_csv (os.path.join (folder, features_filename (same_colour_threshold, delta_frame)), data)
+    _write_csv (os.path.join (folder, NUMBER_BEES_HISTOGRAMS_FILENAME), number_bees_histograms)
+    for delta_frame, data in bee_speed_histograms.items ():
+        _write_csv (os.path.join (folder, BEE_SPEED_HISTOGRAMS_FILENAME.format (delta_frame)), data)
+
+def _write_csv (filename, data):
+    with open (filename, 'w') as fdw:
+        writer = csv.writer (
+            fdw,
+            delimiter = ',',
+            quoting = csv.QUOTE_NONE,
+            lineterminator = '\n')
+        writer.writerows (data.tolist ())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Benchmark of the log reader used by CASU_Log and CASU_DOMSET_Log.
+#
+# A synthetic run is created in a temporary folder.  Each CASU has a CASU
+# log and a DOMSET log with the same rows as the ones written during an
+# experiment.  Then the logs are read with the row by row csv parser that was
+# used before module log_reader, and with log_reader.  The time taken by both
+# is printed, and the data read is compared.
+
+from __future__ import print_function
+
+import argparse
+import csv
+import numpy
+import os
+import os.path
+import shutil
+import tempfile
+import time
+
+import casu_domset_log
+import casu_log
+import log_reader
+
+def main ():
+    args = process_arguments ()
+    working_folder = tempfile.mkdtemp (prefix = 'benchmark-log-reader_')
+    try:
+        print ('[I] Creating synthetic run with {} CASUs, {} minutes at {} Hz in folder {}'.format (
+            args.number_casus, args.duration, args.frequency, working_folder))
+        list_casu_logs, list_domset_logs = create_synthetic_run (
+            working_folder,
+            number_casus = args.number_casus,
+            duration = args.duration,
+            frequency = args.frequency)
+        for description, list_filenames, tags, map_booleans in [
+                ('CASU logs', list_casu_logs, casu_log.CHANNELS, False),
+                ('DOMSET logs', list_domset_logs, casu_domset_log.TAGS, True)]:
+            print ('[I] Reading {}...'.format (description))
+            time_csv, data_csv = time_reader (read_with_csv, list_filenames, tags, map_booleans)
+            time_numpy, data_numpy = time_reader (read_with_log_reader, list_filenames, tags, map_booleans)
+            check_data (data_csv, data_numpy)
+            print ('    csv reader: {:8.3f}s'.format (time_csv))
+            print ('    log reader: {:8.3f}s'.format (time_numpy))
+            print ('    speed up:   {:8.1f}x'.format (time_csv / time_numpy))
+    finally:
+        shutil.rmtree (working_folder)
+
+def create_synthetic_run (base_path, number_casus, duration, frequency):
+    number_samples = int (duration * 60 * frequency)
+    times = 1500000000.0 + numpy.arange (number_samples) / float (frequency)
+    list_casu_logs = []
+    list_domset_logs = []
+    for a_casu in range (1, number_casus + 1):
+        casu_folder = os.path.join (base_path, 'casu-{:03d}'.format (a_casu))
+        os.makedirs (casu_folder)
+        prefix = os.path.join (casu_folder, '2018-01-01-00-00-00-casu-{:03d}'.format (a_casu))
+        with open (prefix + '.csv', 'w') as fd:
+            infrared = numpy.random.randint (1000, 30000, size = (number_samples, 6))
+            temperature = 28 + numpy.random.random (size = (number_samples, 8))
+            for index, a_time in enumerate (times):
+                fd.write ('ir_raw;{!r};{}\n'.format (a_time, ';'.join (str (x) for x in infrared [index])))
+                if index % frequency == 0:
+                    fd.write ('temp;{!r};{}\n'.format (a_time, ';'.join ('{:.2f}'.format (x) for x in temperature [index])))
+                    fd.write ('Peltier_temp;{!r};28.0;1\n'.format (a_time))
+                    fd.write ('Airflow;{!r};{}\n'.format (a_time, (index // (20 * frequency)) % 2))
+                    fd.write ('DiagnosticLed;{!r};1;1;0;0\n'.format (a_time))
+                    fd.write ('dled_ref;{!r};1;0;0\n'.format (a_time))
+        list_casu_logs.append (prefix + '.csv')
+        with open (prefix + '-domset.csv', 'w') as fd:
+            active_sensors = numpy.random.random (size = (number_samples, 6)) < 0.5
+            fd.write ('IRT;{!r};25000;25000;25000;25000;25000;25000\n'.format (times [0]))
+            for index, a_time in enumerate (times):
+                fd.write ('CAS;{!r};{}\n'.format (a_time, ';'.join (str (x) for x in active_sensors [index])))
+                if index % (5 * frequency) == 0:
+                    for a_tag in [casu_domset_log.CAC, casu_domset_log.NAC, casu_domset_log.NT, casu_domset_log.TH_HEAT, casu_domset_log.TH_COOL, casu_domset_log.TH_MIN]:
+                        fd.write ('{};{!r};{!r}\n'.format (a_tag, a_time, numpy.random.random ()))
+        list_domset_logs.append (prefix + '-domset.csv')
+    return list_casu_logs, list_domset_logs
+
+def time_reader (reader, list_filenames, tags, map_booleans):
+    start = time.time ()
+    result = [reader (a_filename, tags, map_booleans) for a_filename in list_filenames]
+    return time.time () - start, result
+
+def read_with_csv (filename, tags, map_booleans):
+    """
+    Read a log file row by row, converting each field with the exception driven conversion that
+    CASU_Log and CASU_DOMSET_Log used before module log_reader.
+    """
+    def convert_field (value):
+        if map_booleans and value == 'True':
+            return 1
+        elif map_booleans and value == 'False':
+            return 0
+        try:
+            return int (value)
+        except ValueError:
+            try:
+                return float (value)
+            except ValueError:
+                return value
+    data = dict ([(a_tag, []) for a_tag in tags])
+    with open (filename) as fd:
+        reader = csv.reader (fd, delimiter = ';', quoting = csv.QUOTE_NONE)
+        for row in reader:
+            data [row [0]].append ([convert_field (f) for f in row [1:]])
+    return dict ([(a_tag, numpy.array (rows)) for a_tag, rows in data.items ()])
+
+def read_with_log_reader (filename, tags, map_booleans):
+    data, _unknown = log_reader.read_tagged_log (filename, tags, map_booleans)
+    return data
+
+def check_data (list_data_csv, list_data_numpy):
+    for data_csv, data_numpy in zip (list_data_csv, list_data_numpy):
+        for a_tag in data_csv.keys ():
+            if not numpy.array_equal (data_csv [a_tag], data_numpy [a_tag]):
+                print ('[E] Readers disagree on data {}'.format (a_tag))
+
+def process_arguments ():
+    parser = argparse.ArgumentParser (
+        description = 'Benchmark the log reader on a synthetic run'
+    )
+    parser.add_argument (
+        '--number-casus',
+        metavar = 'N',
+        type = int,
+        default = 20,
+        help = 'number of CASUs in the synthetic run'
+    )
+    parser.add_argument (
+        '--duration',
+        metavar = 'M',
+        type = int,
+        default = 30,
+        help = 'duration of the synthetic run in minutes'
+    )
+    parser.add_argument (
+        '--frequency',
+        metavar = 'F',
+        type = int,
+        default = 10,
+        help = 'sampling frequency of infrared sensors in Hz'
+    )
+    return parser.parse_args ()
+
+if __name__ == '__main__':
+    main ()
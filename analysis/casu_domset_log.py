@@ -3,16 +3,15 @@ if __name__ == '__main__':
     matplotlib.use ('Agg')
 
 import argparse
-import csv
 import matplotlib.pyplot
 import numpy
-import os.path
-import re
 import sys
 
 import assisipy.casu
 
+import log_reader
 import plot_common
+import run_index
 
 CT = 'CT'
 CAF = 'CAF'
@@ -25,64 +24,32 @@ IRT = 'IRT'
 TH_HEAT = 'TH_HEAT'
 TH_COOL = 'TH_COOL'
 TH_MIN = 'TH_MIN'
+OR = 'OR'
 TH = 'TH'
 
+TAGS = [CT, CAF, CAC, NAC, CAS, NT, ZT, IRT, TH_HEAT, TH_COOL, TH_MIN, OR]
+
 class CASU_DOMSET_Log:
     def __init__ (self, number, base_path = '.'):
-        def convert_row (a_row):
-            def convert_field (value):
-                if value == 'True':
-                    return 1
-                elif value == 'False':
-                    return 0
-                else:
-                    try:
-                        return int (value)
-                    except ValueError:
-                        try:
-                            return float (value)
-                        except ValueError:
-                            return value
-            return [convert_field (f) for f in a_row]
         self.number = number
-        self.casu_temperature = []
-        self.casu_airflow_set_point = []
-        self.casu_average_activity = []
-        self.node_average_activity = []
-        self.casu_active_sensors = []
-        self.node_temperature_reference = []
-        self.zero_time = []
-        self.infrared_thresholds = []
-        _temperature_threshold_heat = []
-        _temperature_threshold_cool = []
-        _temperature_threshold_min = []
-        self.__data_dicts = {
-            CT: self.casu_temperature,
-            CAF: self.casu_airflow_set_point,
-            CAC: self.casu_average_activity,
-            NAC: self.node_average_activity,
-            CAS: self.casu_active_sensors,
-            NT: self.node_temperature_reference,
-            ZT: self.zero_time,
-            IRT: self.infrared_thresholds,
-            TH_HEAT: _temperature_threshold_heat,
-            TH_COOL: _temperature_threshold_cool,
-            TH_MIN: _temperature_threshold_min,
-        }
-        with open (filename (number, base_path)) as fd:
-            reader = csv.reader (fd, delimiter=';')
-            for row in reader:
-                try:
-                    self.__data_dicts [row [0]].append (convert_row (row [1:]))
-                except KeyError:
-                    print ('[E] Unknown CASU DOMSET log data: {}'.format (row))
-                    sys.exit (1)
-        self.temperature_threshold_heat = numpy.array (_temperature_threshold_heat)
-        self.temperature_threshold_cool = numpy.array (_temperature_threshold_cool)
-        self.temperature_threshold_min = numpy.array (_temperature_threshold_min)
-        self.__data_dicts [TH_HEAT] = self.temperature_threshold_heat
-        self.__data_dicts [TH_COOL] = self.temperature_threshold_cool
-        self.__data_dicts [TH_MIN] = self.temperature_threshold_min
+        data, unknown = log_reader.read_tagged_log (filename (number, base_path), TAGS, map_booleans = True)
+        if len (unknown) > 0:
+            print ('[E] Unknown CASU DOMSET log data: {}'.format (unknown.values () [0]))
+            sys.exit (1)
+        self.casu_temperature = data [CT]
+        self.casu_airflow_set_point = data [CAF]
+        self.casu_average_activity = data [CAC]
+        self.node_average_activity = data [NAC]
+        self.casu_active_sensors = data [CAS]
+        self.node_temperature_reference = data [NT]
+        self.zero_time = data [ZT]
+        self.infrared_thresholds = data [IRT]
+        self.temperature_threshold_heat = data [TH_HEAT]
+        self.temperature_threshold_cool = data [TH_COOL]
+        self.temperature_threshold_min = data [TH_MIN]
+        # time and seconds skipped by the controller loop when it could not keep its period
+        self.overruns = data [OR]
+        self.__data_dicts = data
 
     def plot (self, index, dict_axes, **args):
         '''
@@ -110,6 +77,9 @@ class CASU_DOMSET_Log:
         To plot casu thresholds use the value `TH`.
         If the argument `plot_all_thresholds` is True, then all thresholds are plotted, otherwise only the heating threshold is plotted.
 
+        Line plots with more samples than the axes have pixels are decimated, see function `plot_common.decimate`.
+        If the argument `decimate` is False, then all samples are plotted.
+
         Usage examples:
 
         `
@@ -123,28 +93,31 @@ class CASU_DOMSET_Log:
         `
         '''
         if CT in dict_axes:
-            self.__plot_casu_temperature (index, dict_axes [CT])
+            self.__plot_casu_temperature (index, dict_axes [CT], **args)
         if CAF in dict_axes:
             self.__plot_casu_airflow_set_point (index, dict_axes [CAF])
         if CAC in dict_axes:
-            self.__plot_casu_average_activity (index, dict_axes [CAC])
+            self.__plot_casu_average_activity (index, dict_axes [CAC], **args)
         if NAC in dict_axes:
             self.__plot_node_average_activity (index, dict_axes [NAC])
         if CAS in dict_axes:
             self.__plot_casu_active_sensors (index, dict_axes [CAS], **args)
         if NT in dict_axes:
-            self.__plot_node_temperature (index, dict_axes [NT])
+            self.__plot_node_temperature (index, dict_axes [NT], **args)
         if TH in dict_axes:
             self.__plot_temperature_thresholds (index, dict_axes [TH], **args)
 
-    def __plot_casu_temperature (self, index, list_axes):
+    def __plot_casu_temperature (self, index, list_axes, **args):
         self.__print_info (list_axes, self.casu_temperature, 'casu temperature')
-        xs = [r [0] for r in self.casu_temperature]
-        ys = [r [1] for r in self.casu_temperature]
+        if len (self.casu_temperature) == 0:
+            return
+        xs = self.casu_temperature [:, 0]
+        ys = self.casu_temperature [:, 1]
         for axa in list_axes:
+            pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
             axa.plot (
-                xs,
-                ys,
+                pxs,
+                pys,
                 '--',
                 label = 'CT{:3d}'.format (self.number),
                 color = plot_common.COLOURS [index]
@@ -161,14 +134,17 @@ class CASU_DOMSET_Log:
                 s = 0.1,
             )
 
-    def __plot_casu_average_activity (self, index, list_axes):
+    def __plot_casu_average_activity (self, index, list_axes, **args):
         self.__print_info (list_axes, self.casu_average_activity, 'casu average activity')
-        xs = [r [0] for r in self.casu_average_activity]
-        ys = [r [1] for r in self.casu_average_activity]
+        if len (self.casu_average_activity) == 0:
+            return
+        xs = self.casu_average_activity [:, 0]
+        ys = self.casu_average_activity [:, 1]
         for axa in list_axes:
+            pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
             axa.plot (
-                xs,
-                ys,
+                pxs,
+                pys,
                 '--',
                 label = 'CAC{:3d}'.format (self.number),
                 color = plot_common.COLOURS [index]
@@ -191,13 +167,15 @@ class CASU_DOMSET_Log:
         list_active_sensors = args.get ('list_active_sensors', [])
         if avg_active_sensors or len (list_active_sensors) > 0:
             self.__print_info (list_axes, self.casu_active_sensors, 'casu active sensors')
-        if avg_active_sensors:
-            xs = [r [0] for r in self.casu_active_sensors]
-            ys = [sum (r [1:]) / float (len (r) - 1) for r in self.casu_active_sensors]
+        if avg_active_sensors and len (self.casu_active_sensors) > 0:
+            # rows with fewer sensors are padded with NaN
+            xs = self.casu_active_sensors [:, 0]
+            ys = numpy.nanmean (self.casu_active_sensors [:, 1:], axis = 1)
             for axa in list_axes:
+                pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
                 axa.plot (
-                    xs,
-                    ys,
+                    pxs,
+                    pys,
                     ':',
                     label = 'CAS{:3d}'.format (self.number),
                     color = plot_common.COLOURS [index]
@@ -213,14 +191,17 @@ class CASU_DOMSET_Log:
                         c = plot_common.COLOURS [index]
                     )
 
-    def __plot_node_temperature (self, index, list_axes):
+    def __plot_node_temperature (self, index, list_axes, **args):
         self.__print_info (list_axes, self.node_temperature_reference, 'node temperature reference')
-        xs = [r [0] for r in self.node_temperature_reference]
-        ys = [r [1] for r in self.node_temperature_reference]
+        if len (self.node_temperature_reference) == 0:
+            return
+        xs = self.node_temperature_reference [:, 0]
+        ys = self.node_temperature_reference [:, 1]
         for axa in list_axes:
+            pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
             axa.plot (
-                xs,
-                ys,
+                pxs,
+                pys,
                 ':',
                 label = 'NT{:3d}'.format (self.number),
                 color = plot_common.COLOURS [index]
@@ -243,9 +224,10 @@ class CASU_DOMSET_Log:
             xs = th [:, 0]
             ys = th [:, 1]
             for axa in list_axes:
+                pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
                 axa.plot (
-                    xs,
-                    ys,
+                    pxs,
+                    pys,
                     st,
                     label = 'TH{}{:3d}'.format (lb, self.number),
                     color = plot_common.COLOURS [index]
@@ -253,20 +235,14 @@ class CASU_DOMSET_Log:
 
     def min_time (self):
         return min ([
-            min ([
-                row [0]
-                for row in data
-            ])
+            data [:, 0].min ()
             for data in self.__data_dicts.values ()
             if len (data) > 0
         ])
 
     def max_time (self):
         return min ([
-            max ([
-                row [0]
-                for row in data
-            ])
+            data [:, 0].max ()
             for data in self.__data_dicts.values ()
             if len (data) > 0
         ])
@@ -276,22 +252,15 @@ class CASU_DOMSET_Log:
             print ('[W] No {} data to plot for casu {}!'.format (description, self.number))
 
 def filename (number, base_path = '.'):
-        filename_pattern = '^[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-casu-' + '{:03d}'.format (number) + '-domset[.]csv$'
-        filename_regular_expression = re.compile (filename_pattern)
-        fsf = os.path.join (base_path, 'casu-{:03d}'.format (number))
-        print ('[II] Searching files in folder {}'.format (fsf))
-        result = None
-        for af in os.listdir (fsf):
-            if filename_regular_expression.match (af):
-                if result is None:
-                    result = af
-                else:
-                    print ('[E] There are multiple CASU DOMSET logs in folder {}'.format (fsf))
-                    sys.exit (1)
-        if result is None:
+        candidates = run_index.get (base_path).domset_logs (number)
+        fsf = run_index.casu_folder (number, base_path)
+        if len (candidates) > 1:
+            print ('[E] There are multiple CASU DOMSET logs in folder {}'.format (fsf))
+            sys.exit (1)
+        if len (candidates) == 0:
             print ('[E] There is no CASU DOMSET log in folder {}'.format (fsf))
             sys.exit (1)
-        return os.path.join (fsf, result)
+        return candidates [0]
 
 def main ():
     parser = argparse.ArgumentParser (
@@ -311,6 +280,11 @@ def main ():
         default = '.',
         help = 'Path where the CASU logs are stored'
     )
+    parser.add_argument (
+        '--no-decimation',
+        action = 'store_true',
+        help = 'plot all samples of long time series'
+    )
     args = parser.parse_args ()
     cl = CASU_DOMSET_Log (args.number, args.base_path)
     figure = matplotlib.pyplot.figure ()
@@ -324,7 +298,7 @@ def main ():
         CAS : [axes [2]],
         NT : [axes [0]],
     }
-    cl.plot (0, dict_axes, avg_active_sensors = True)
+    cl.plot (0, dict_axes, avg_active_sensors = True, decimate = not args.no_decimation)
     figure.savefig ('plot-casu-{:03d}.png'.format (args.number))
 
 if __name__ == '__main__':
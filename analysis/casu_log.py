@@ -3,17 +3,16 @@ if __name__ == '__main__':
     matplotlib.use ('Agg')
 
 import argparse
-import csv
-import matplotlib.patches
 import matplotlib.pyplot
 import numpy
-import os.path
-import re
 import sys
 
 import assisipy.casu
 
+import log_cache
+import log_reader
 import plot_common
+import run_index
 import util.math
 
 IR_RAW = 'ir_raw'
@@ -24,58 +23,71 @@ LED = 'DiagnosticLed'
 ACTIVITY = 'activity'
 LED_ACTUATOR = 'dled_ref'
 
-class CASU_Log:
-    
-    def __init__ (self, number, base_path = '.'):
-        def convert_row (a_row):
-            def convert_field (value):
-                try:
-                    return int (value)
-                except ValueError:
-                    try:
-                        return float (value)
-                    except ValueError:
-                        return value
-            return [convert_field (f) for f in a_row]
+CHANNELS = [IR_RAW, TEMP, PELTIER, AIRFLOW, LED, LED_ACTUATOR]
+
+DEFAULT_CHUNK_SIZE = 100000
+
+class CASU_Log (object):
+    """
+    Data stored in a CASU log.
+
+    The log channels are read when they are first used.  The first time a log is read, its channels are stored in a
+    columnar cache (see module log_cache) that is used in subsequent reads as long as the log file does not change.
+    """
+
+    def __init__ (self, number, base_path = '.', use_cache = True):
         # initialise fields
         self.number = number
-        self.infrared_raw = []
-        self.temperature = []
-        self.peltier = []
-        self.airflow = []
-        _led = []
+        self.base_path = base_path
+        self.filename = filename (number, base_path)
+        self.use_cache = use_cache
         self.activity = None
         self.hits = None
         self.moving_average_hits = None
-        _led_actuator = []
-        self.__data_dicts = {
-            IR_RAW : self.infrared_raw,
-            TEMP : self.temperature,
-            PELTIER : self.peltier,
-            AIRFLOW : self.airflow,
-            LED : _led,
-            LED_ACTUATOR : _led_actuator,
-        }
-        # read CASU log
-        skipped = {}
-        with open (filename (number, base_path)) as fd:
-            reader = csv.reader (fd, delimiter = ';', quoting = csv.QUOTE_NONE)
-            for row in reader:
-                try:
-                    self.__data_dicts [row [0]].append (convert_row (row [1:]))
-                except KeyError:
-                    skipped [row [0]] = True
+        self.activity_times = None
+        self.__channels = {}
+        self.__cache_valid = use_cache and log_cache.is_valid (self.filename)
+
+    def __getstate__ (self):
+        # channels stored in the cache are not pickled, they are loaded again when used
+        state = self.__dict__.copy ()
+        if self.__cache_valid:
+            state ['_CASU_Log__channels'] = {}
+        return state
+
+    infrared_raw = property (lambda self: self.channel (IR_RAW))
+    temperature = property (lambda self: self.channel (TEMP))
+    peltier = property (lambda self: self.channel (PELTIER))
+    airflow = property (lambda self: self.channel (AIRFLOW))
+    led = property (lambda self: self.channel (LED))
+    led_actuator = property (lambda self: self.channel (LED_ACTUATOR))
+
+    def channel (self, name):
+        """
+        Return the data of the given channel as a NumPy array.  Each row contains the timestamp followed by the channel values.
+        """
+        try:
+            return self.__channels [name]
+        except KeyError:
+            if self.__cache_valid:
+                self.__channels [name] = log_cache.load_channel (self.filename, name)
+            else:
+                self.__read_log ()
+            return self.__channels [name]
+
+    def __read_log (self):
+        stamp = log_cache.source_stamp (self.filename)
+        self.__channels, skipped = log_reader.read_tagged_log (self.filename, CHANNELS)
         if len (skipped.keys ()) > 0:
             print ('[I] skipped data {}'.format (skipped.keys ()))
-        # convert to numpy arrays
-        self.infrared_raw = numpy.array (self.infrared_raw)
-        self.led = numpy.array (_led)
-        self.led_actuator = numpy.array (_led_actuator)
-        self.__data_dicts [IR_RAW] = self.infrared_raw
-        self.__data_dicts [LED] = self.led
-        self.__data_dicts [LED_ACTUATOR] = self.led_actuator
+        if self.use_cache:
+            self.__cache_valid = log_cache.save (self.filename, stamp, self.__channels)
 
     def plot (self, index, dict_axes, **args):
+        """
+        Plot CASU log data in the provided axes.  Line plots with more samples than the axes have pixels are
+        decimated, see function plot_common.decimate, unless the argument decimate is False.
+        """
         if IR_RAW in dict_axes:
             self.__plot_sensor_infrared_raw (index, dict_axes [IR_RAW], **args)
         if TEMP in dict_axes:
@@ -87,18 +99,19 @@ class CASU_Log:
         if LED in dict_axes:
             self.__plot_setpoint_led (index, dict_axes [LED], **args)
         if ACTIVITY in dict_axes:
-            self.__plot_moving_average_hits (index, dict_axes [ACTIVITY])
+            self.__plot_moving_average_hits (index, dict_axes [ACTIVITY], **args)
 
     def __plot_sensor_infrared_raw (self, index, list_axes, **args):
         if args.get ('ir_raw_avg', True):
             self.__print_info (list_axes, self.infrared_raw, 'infrared raw')
-        if args.get ('ir_raw_avg', True):
+        if args.get ('ir_raw_avg', True) and len (self.infrared_raw) > 0:
             xs = self.infrared_raw [:,0]
             ys = self.infrared_raw [:,1:].mean (axis = 1)
             for axa in list_axes:
+                pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
                 axa.plot (
-                    xs,
-                    ys,
+                    pxs,
+                    pys,
                     '-',
                     label = 'avg IR{:3d}'.format (self.number),
                     color = plot_common.COLOURS [index]
@@ -117,25 +130,29 @@ class CASU_Log:
     def __plot_sensor_temperature (self, index, list_axes, **args):
         if args.get ('avg_temp', True) or len (args.get ('temp_field', [])) > 0:
             self.__print_info (list_axes, self.temperature, 'temperature')
+        if len (self.temperature) == 0:
+            return
         if args.get ('avg_temp', True):
-            xs = [r [0] for r in self.temperature]
-            ys = [sum (r [1:]) / float (len (r) - 1) for r in self.temperature]
+            xs = self.temperature [:, 0]
+            ys = self.temperature [:, 1:].mean (axis = 1)
             for axa in list_axes:
+                pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
                 axa.plot (
-                    xs,
-                    ys,
+                    pxs,
+                    pys,
                     '-.',
                     label = 'avg temp {}'.format (self.number),
                     color = plot_common.COLOURS [index]
                 )
         for temperature_field in [assisipy.casu.TEMP_F, assisipy.casu.TEMP_L, assisipy.casu.TEMP_B, assisipy.casu.TEMP_R, assisipy.casu.TEMP_TOP, assisipy.casu.TEMP_PCB, assisipy.casu.TEMP_RING, assisipy.casu.TEMP_WAX]:
             if temperature_field in args.get ('temp_field', []):
-                xs = [r [0] for r in self.temperature]
-                ys = [r [1 + assisipy.casu.TEMP_F - temperature_field] for r in self.temperature]
+                xs = self.temperature [:, 0]
+                ys = self.temperature [:, 1 + assisipy.casu.TEMP_F - temperature_field]
                 for axa in list_axes:
+                    pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
                     axa.plot (
-                        xs,
-                        ys,
+                        pxs,
+                        pys,
                         '-',
                         label = 'temp {} {}'.format (CASU_Log.__TEMPERATURE_LABELS [temperature_field], self.number),
                         color = plot_common.COLOURS [index]
@@ -157,63 +174,42 @@ class CASU_Log:
 
     def __plot_setpoint_airflow (self, index, list_axes, **args):
         self.__print_info (list_axes, self.airflow, 'airflow')
-        ith = 0
-        last_time_airflow_on = None
-        while ith < len (self.airflow):
-            row = self.airflow [ith]
-            if row [1] == 0:
-                if last_time_airflow_on is not None:
-                    for axa in list_axes:
-                        ylim = axa.get_ylim ()
-                        rect = matplotlib.patches.Rectangle (
-                            xy = [last_time_airflow_on, ylim [0]],
-                            width = row [0] - last_time_airflow_on,
-                            height = ylim [1] - ylim [0],
-                            color = '#{:02X}DDFF7F'.format (index)
-                        )
-                        axa.add_patch (rect)
-                last_time_airflow_on = None
-            elif row [1] == 1 and last_time_airflow_on is None:
-                last_time_airflow_on = row [0]
-            ith += 1
+        starts, ends = airflow_intervals (self.airflow)
+        if len (starts) == 0:
+            return
+        for axa in list_axes:
+            ylim = axa.get_ylim ()
+            axa.broken_barh (
+                zip (starts, ends - starts),
+                (ylim [0], ylim [1] - ylim [0]),
+                color = '#{:02X}DDFF7F'.format (index)
+            )
 
     def __plot_setpoint_led (self, index, list_axes, **args):
-        def __draw ():
-            for axa in list_axes:
-                ylim = axa.get_ylim ()
-                rect = matplotlib.patches.Rectangle (
-                    xy = [last_time_led_on, ylim [1] - (index + 1) * (ylim [1] - ylim [0]) / 10],
-                    width = row [0] - last_time_led_on,
-                    height = (ylim [1] - ylim [0]) / 10,
-                    color = '#{:02X}{:02X}{:02X}7F'.format (int (255 * last_led_color [0]), int (255 * last_led_color [2]), int (255 * last_led_color [2]))
-                )
-                axa.add_patch (rect)
         self.__print_info (list_axes, self.led, "led")
-        ith = 0
-        last_time_led_on = None
-        last_led_color = None
-        while ith < len (self.led):
-            row = self.led [ith,:]
-            if row [1] == 1 and last_time_led_on is not None and any ([now != then for now, then in zip (row [2:5], last_led_color)]):
-                __draw ()
-                last_time_led_on = row [0]
-                last_led_color = row [2:5]
-            elif row [1] == 0 or (row [2] == 0 and row [3] == 0 and row [4] == 0):
-                if last_time_led_on is not None:
-                    __draw ()
-                last_time_led_on = None
-            elif row [1] == 1 and last_time_led_on is None:
-                last_time_led_on = row [0]
-                last_led_color = row [2:5]
-            ith += 1
-
-    def __plot_moving_average_hits (self, index, list_axes):
-        xs = self.infrared_raw [:, 0]
+        starts, ends, colours = led_intervals (self.led)
+        if len (starts) == 0:
+            return
+        colours = [
+            '#{:02X}{:02X}{:02X}7F'.format (int (255 * red), int (255 * green), int (255 * blue))
+            for red, green, blue in colours
+        ]
+        for axa in list_axes:
+            ylim = axa.get_ylim ()
+            axa.broken_barh (
+                zip (starts, ends - starts),
+                (ylim [1] - (index + 1) * (ylim [1] - ylim [0]) / 10, (ylim [1] - ylim [0]) / 10),
+                color = colours
+            )
+
+    def __plot_moving_average_hits (self, index, list_axes, **args):
+        xs = self.activity_times
         ys = self.moving_average_hits [:]
         for axa in list_axes:
+            pxs, pys = plot_common.decimate (axa, xs, ys, args.get ('decimate'))
             axa.plot (
-                xs,
-                ys,
+                pxs,
+                pys,
                 '-',
                 label = 'mah{:3d}'.format (self.number),
                 color = plot_common.COLOURS [index]
@@ -221,59 +217,158 @@ class CASU_Log:
 
     def min_time (self):
         return min ([
-            min ([
-                row [0]
-                for row in data
-            ])
-            for data in self.__data_dicts.values ()
+            data [:, 0].min ()
+            for data in [self.channel (a_channel) for a_channel in CHANNELS]
+            if len (data) > 0
         ])
 
     def max_time (self):
         return min ([
-            max ([
-                row [0]
-                for row in data
-            ])
-            for data in self.__data_dicts.values ()
+            data [:, 0].max ()
+            for data in [self.channel (a_channel) for a_channel in CHANNELS]
+            if len (data) > 0
         ])
 
-    def compute_activity (self, start_index, end_index, offset, moving_average_length):
+    def compute_activity (self, start_index, end_index, offset, moving_average_length, chunk_size = None, decimation = 1):
         """
         Compute the infrared sensor activity.  This assumes that during the period start_time to end_time there are no bees.
+
+        By default the activity of each sensor is kept in field activity.  If a chunk size or a decimation is given,
+        the log is processed in chunks (see method iter_activity) and only the hits and their moving average are kept.
+        Field activity_times has the timestamps of the values in fields hits and moving_average_hits.
         :param offset:
         :param moving_average_length:
         :param start_index:
         :param end_index:
+        :param chunk_size: number of infrared sensor readings processed at a time
+        :param decimation: only keep one in every decimation values
         :return:
         """
-        thresholds = self.infrared_raw [start_index:end_index, 1:].max (axis = 0)
-        thresholds = thresholds + offset
-        number_sensors = self.infrared_raw.shape [1] - 1
-        self.activity =  self.infrared_raw [:, 1:] > thresholds
-        self.hits = self.activity.sum (axis = 1)
-        self.moving_average_hits = util.math.moving_average (self.hits, moving_average_length) / float (number_sensors)
+        if chunk_size is None and decimation == 1:
+            thresholds = self.__activity_thresholds (start_index, end_index, offset)
+            number_sensors = self.infrared_raw.shape [1] - 1
+            self.activity =  self.infrared_raw [:, 1:] > thresholds
+            self.hits = self.activity.sum (axis = 1)
+            self.moving_average_hits = util.math.moving_average (self.hits, moving_average_length) / float (number_sensors)
+            self.activity_times = self.infrared_raw [:, 0]
+        else:
+            chunks = list (self.iter_activity (
+                start_index, end_index, offset, moving_average_length,
+                chunk_size = DEFAULT_CHUNK_SIZE if chunk_size is None else chunk_size,
+                decimation = decimation))
+            self.activity = None
+            self.activity_times = numpy.concatenate ([times for times, _, _ in chunks] + [[]])
+            self.hits = numpy.concatenate ([hits for _, hits, _ in chunks] + [numpy.array ([], dtype = numpy.int16)])
+            self.moving_average_hits = numpy.concatenate ([averages for _, _, averages in chunks] + [[]])
+
+    def iter_activity (self, start_index, end_index, offset, moving_average_length, chunk_size = None, decimation = 1):
+        """
+        Compute the infrared sensor activity chunk by chunk.  Only one chunk of infrared sensor readings and a
+        moving average window of hits are in memory at any time.
+
+        The thresholds are computed from the readings between start_index and end_index, as in method
+        compute_activity.  The moving average of hits is computed from their cumulative sum and is the same as
+        the one computed by compute_activity.
+
+        :param chunk_size: number of infrared sensor readings processed at a time
+        :param decimation: only yield one in every decimation values
+        :return: a generator of tuples with the timestamps, the hits and the moving average of hits divided by the number of sensors
+        """
+        if chunk_size is None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        thresholds = self.__activity_thresholds (start_index, end_index, offset)
+        data = self.infrared_raw
+        number_rows = len (data)
+        if number_rows == 0:
+            return
+        divisor = float (moving_average_length * (data.shape [1] - 1))
+        # the moving average of index i is the sum of hits from i - left to i + right
+        right = (moving_average_length - 1) // 2
+        left = moving_average_length - 1 - right
+        # hits from index buffer_start onwards that are still needed
+        buffer = numpy.array ([], dtype = numpy.int16)
+        buffer_start = 0
+        next_index = 0
+        for chunk_start in range (0, number_rows, chunk_size):
+            chunk = numpy.asarray (data [chunk_start:chunk_start + chunk_size])
+            hits = (chunk [:, 1:] > thresholds).sum (axis = 1).astype (numpy.int16)
+            buffer = numpy.concatenate ((buffer, hits))
+            available = chunk_start + len (chunk)
+            last_index = available if available == number_rows else max (next_index, available - right)
+            indexes = numpy.arange (next_index, last_index)
+            cumulative_sum = numpy.concatenate (([0], numpy.cumsum (buffer, dtype = numpy.int64)))
+            lower = numpy.maximum (indexes - left, 0) - buffer_start
+            upper = numpy.minimum (indexes + right + 1, available) - buffer_start
+            averages = (cumulative_sum [upper] - cumulative_sum [lower]) / divisor
+            selected = indexes % decimation == 0
+            yield (
+                data [next_index:last_index, 0][selected],
+                buffer [next_index - buffer_start:last_index - buffer_start][selected],
+                averages [selected])
+            next_index = last_index
+            drop = max (0, min (next_index - left, available) - buffer_start)
+            buffer = buffer [drop:]
+            buffer_start += drop
+
+    def __activity_thresholds (self, start_index, end_index, offset):
+        return self.infrared_raw [start_index:end_index, 1:].max (axis = 0) + offset
 
     def __print_info (self, list_axes, data, description):
         if len (list_axes) > 0 and len (data) == 0:
             print ('[W] No {} in log data to plot for casu {}!'.format (description, self.number))
 
+def airflow_intervals (airflow):
+    """
+    Compute the intervals when the airflow was on.
+
+    An interval starts in the first row where the airflow is on and ends in the next row where it is off.  An interval
+    that is still open at the end of the log is discarded.
+
+    :param airflow: airflow data, each row has a timestamp and the airflow state
+    :return: a tuple with the arrays of start and end times
+    """
+    if len (airflow) == 0:
+        return numpy.array ([]), numpy.array ([])
+    airflow = airflow [(airflow [:, 1] == 0) | (airflow [:, 1] == 1)]
+    on = numpy.concatenate (([0], airflow [:, 1] == 1)).astype (numpy.int8)
+    edges = numpy.diff (on)
+    starts = numpy.nonzero (edges == 1) [0]
+    ends = numpy.nonzero (edges == -1) [0]
+    starts = starts [:len (ends)]
+    return airflow [starts, 0], airflow [ends, 0]
+
+def led_intervals (led):
+    """
+    Compute the intervals when the diagnostic LED was lit with the same colour.
+
+    The LED is lit in rows where it is on and has a colour other than black.  An interval ends when the LED is turned
+    off or changes colour.  An interval that is still open at the end of the log is discarded.
+
+    :param led: LED data, each row has a timestamp, the LED state and the red, green and blue components
+    :return: a tuple with the arrays of start times, end times and colours
+    """
+    if len (led) == 0:
+        return numpy.array ([]), numpy.array ([]), numpy.zeros ((0, 3))
+    led = led [(led [:, 1] == 0) | (led [:, 1] == 1)]
+    lit = (led [:, 1] == 1) & numpy.any (led [:, 2:5] != 0, axis = 1)
+    colour_change = numpy.any (led [1:, 2:5] != led [:-1, 2:5], axis = 1) & lit [1:] & lit [:-1]
+    boundaries = numpy.concatenate (([0], 1 + numpy.nonzero ((lit [1:] != lit [:-1]) | colour_change) [0]))
+    # each interval starts in a boundary where the LED is lit and ends in the next boundary
+    is_start = lit [boundaries [:-1]]
+    starts = boundaries [:-1][is_start]
+    ends = boundaries [1:][is_start]
+    return led [starts, 0], led [ends, 0], led [starts, 2:5]
+
 def filename (number, base_path = '.'):
-        filename_pattern = '^[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-casu-' + '{:03d}'.format (number) + '[.]csv$'
-        filename_regular_expression = re.compile (filename_pattern)
-        fsf = os.path.join (base_path, 'casu-{:03d}'.format (number))
-        print ('[II] Searching files in folder {}'.format (fsf))
-        result = None
-        for af in os.listdir (fsf):
-            if filename_regular_expression.match (af):
-                if result is None:
-                    result = af
-                else:
-                    print ('[E] There are multiple CASU logs in folder {}'.format (fsf))
-                    sys.exit (1)
-        if result is None:
+        candidates = run_index.get (base_path).casu_logs (number)
+        fsf = run_index.casu_folder (number, base_path)
+        if len (candidates) > 1:
+            print ('[E] There are multiple CASU logs in folder {}'.format (fsf))
+            sys.exit (1)
+        if len (candidates) == 0:
             print ('[E] There is no CASU log in folder {}'.format (fsf))
             sys.exit (1)
-        return os.path.join (fsf, result)
+        return candidates [0]
 
 def main ():
     parser = argparse.ArgumentParser (
@@ -303,12 +398,18 @@ def main ():
         action = 'store_true',
         help = 'plot estimated wax temperature'
     )
+    parser.add_argument (
+        '--no-decimation',
+        action = 'store_true',
+        help = 'plot all samples of long time series'
+    )
     args = parser.parse_args ()
     cl = CASU_Log (args.number, args.base_path)
     plot_args = {}
     plot_args ['peltier'] = args.plot_peltier
     plot_args ['temp_field'] = []
     if args.plot_temp_wax: plot_args ['temp_field'].append (assisipy.casu.TEMP_WAX)
+    plot_args ['decimate'] = not args.no_decimation
     figure = matplotlib.pyplot.figure ()
     number_axes = 3
     axes_list = [figure.add_axes ([0.05, i / float (number_axes) + 0.05, 0.9, (1.0 / number_axes - 0.05)]) for i in range (number_axes)]
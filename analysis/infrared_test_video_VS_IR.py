@@ -29,8 +29,8 @@ import os.path
 import yaml
 matplotlib.use ('Agg')
 
+import aligner
 import casu_log
-import util
 
 class Experiment:
     def __init__ (self, csv_row, same_colour_threshold, delta_frame):
@@ -182,15 +182,12 @@ class Plot:
         an_axes = self.axes [index_y, index_x]
         experiment_duration = 60 * an_experiment.config_data ['parameters']['experiment_duration']
         a_casu_log = an_experiment.casu_logs [casu_number]
-        zero_time = a_casu_log.led_actuator [0, 0]
-        times_xs = [
-            zero_time + second
-            for second in range (experiment_duration)]
-        indexes = [
-            util.math.find_nearest_index (a_casu_log.infrared_raw [:, 0], a_time)
-            for a_time in times_xs]
-        xs = a_casu_log.moving_average_hits [indexes]
-        ys = an_experiment.video_data [0::int (an_experiment.config_data ['video']['frames_per_second']), 2 * an_experiment.casu_video_data_column [casu_number]]
+        frames_per_second = int (an_experiment.config_data ['video']['frames_per_second'])
+        video_aligner = aligner.Aligner ([a_casu_log], frames_per_second, legacy_index = 0)
+        video_data = an_experiment.video_data [:, 2 * an_experiment.casu_video_data_column [casu_number]]
+        frame_indexes = numpy.arange (0, min (len (video_data), experiment_duration * frames_per_second), frames_per_second)
+        xs = video_aligner.log_to_frames (a_casu_log.activity_times, a_casu_log.moving_average_hits, frame_indexes)
+        ys = video_data [frame_indexes]
         an_axes.scatter (
             xs, ys
             )
@@ -0,0 +1,82 @@
+"""
+Columnar on-disk cache of the data stored in a log file.
+
+The cache of log file `F.csv` is folder `F.cache`.  This folder contains
+one NumPy `.npy` file per channel and a file with the size and modification
+time of `F.csv` when the cache was built.  If the log file changes, the
+cache is no longer valid and has to be rebuilt.
+
+Channels are loaded as read-only memory-mapped arrays, so only the parts of
+a channel that are used are read from disk.
+"""
+
+import csv
+import numpy
+import os
+import os.path
+
+STAMP_FILENAME = 'source.csv'
+
+def cache_folder (log_filename):
+    return os.path.splitext (log_filename) [0] + '.cache'
+
+def source_stamp (log_filename):
+    """
+    Return the size and modification time of the given log file as a list of strings.
+    """
+    st = os.stat (log_filename)
+    return [str (st.st_size), repr (st.st_mtime)]
+
+def is_valid (log_filename):
+    """
+    Check if the cache of the given log file exists and was built from the current contents of the log file.
+    """
+    try:
+        with open (os.path.join (cache_folder (log_filename), STAMP_FILENAME), 'r') as fd:
+            reader = csv.reader (fd, delimiter = ';', quoting = csv.QUOTE_NONE)
+            row = next (reader)
+    except (IOError, OSError, StopIteration):
+        return False
+    return row == source_stamp (log_filename)
+
+def load_channel (log_filename, channel):
+    """
+    Load a channel from the cache of the given log file.  The cache must be valid.
+
+    :return: a read-only memory-mapped array
+    """
+    _filename = os.path.join (cache_folder (log_filename), '{}.npy'.format (channel))
+    try:
+        return numpy.load (_filename, mmap_mode = 'r')
+    except ValueError:
+        # empty arrays cannot be memory-mapped
+        return numpy.load (_filename)
+
+def save (log_filename, stamp, channels):
+    """
+    Save the channels of the given log file in its cache.
+
+    The stamp is written last, so that an interrupted save does not leave a valid cache behind.
+    If the cache cannot be written, for instance the log file is in a read-only folder, a warning is printed.
+
+    :param stamp: the stamp of the log file taken before it was read
+    :param channels: a dictionary that maps channel names to NumPy arrays
+    :return: True if the cache was written
+    """
+    for name, data in channels.items ():
+        if data.dtype.kind not in 'biuf':
+            print ('[I] not caching log {}: channel {} does not contain numeric data'.format (log_filename, name))
+            return False
+    folder = cache_folder (log_filename)
+    try:
+        if not os.path.isdir (folder):
+            os.makedirs (folder)
+        for name, data in channels.items ():
+            numpy.save (os.path.join (folder, '{}.npy'.format (name)), data)
+        with open (os.path.join (folder, STAMP_FILENAME), 'w') as fd:
+            writer = csv.writer (fd, delimiter = ';', quoting = csv.QUOTE_NONE)
+            writer.writerow (stamp)
+    except (IOError, OSError) as error:
+        print ('[W] could not write cache of log {}: {}'.format (log_filename, error))
+        return False
+    return True
@@ -0,0 +1,85 @@
+"""
+Parallel loading of CASU logs and CASU DOMSET logs.
+
+Parsing the logs of a run is embarrassingly parallel: each CASU has its own
+log files.  The functions in this module read logs in a pool of worker
+processes and return the same objects as creating them one by one with
+`casu_log.CASU_Log` and `casu_domset_log.CASU_DOMSET_Log`.
+
+CASU logs are returned without their channels if these are in the log
+cache, as the parent process can memory-map them from the cache when they
+are used.
+"""
+
+import multiprocessing
+import sys
+
+import casu_domset_log
+import casu_log
+
+CASU_LOG = 'casu'
+DOMSET_LOG = 'domset'
+
+DEFAULT_WORKERS = multiprocessing.cpu_count ()
+
+def load_casu_logs (list_casu_numbers, base_path = '.', workers = DEFAULT_WORKERS):
+    """
+    Read the CASU logs of the given CASUs.
+
+    :return: a dictionary that maps CASU numbers to CASU_Log instances
+    """
+    logs = load_logs ([(CASU_LOG, a_casu_number, base_path) for a_casu_number in list_casu_numbers], workers)
+    return dict (zip (list_casu_numbers, logs))
+
+def load_casu_domset_logs (list_casu_numbers, base_path = '.', workers = DEFAULT_WORKERS):
+    """
+    Read the CASU DOMSET logs of the given CASUs.
+
+    :return: a dictionary that maps CASU numbers to CASU_DOMSET_Log instances
+    """
+    logs = load_logs ([(DOMSET_LOG, a_casu_number, base_path) for a_casu_number in list_casu_numbers], workers)
+    return dict (zip (list_casu_numbers, logs))
+
+def load_logs (list_requests, workers = DEFAULT_WORKERS):
+    """
+    Read a batch of logs.  The batch may contain logs of both kinds and from different runs.
+
+    :param list_requests: a list of tuples with the log kind (CASU_LOG or DOMSET_LOG), the CASU number and the base path
+    :param workers: the number of worker processes to use
+    :return: a list with the logs in the same order as the requests
+    """
+    if workers <= 1 or len (list_requests) <= 1:
+        results = [_load_log (a_request) for a_request in list_requests]
+    else:
+        pool = multiprocessing.Pool (min (workers, len (list_requests)))
+        try:
+            results = pool.map (_load_log, list_requests, chunksize = 1)
+        finally:
+            pool.close ()
+            pool.join ()
+    result = []
+    for ok, value in results:
+        if not ok:
+            sys.exit (value)
+        result.append (value)
+    return result
+
+def _load_log (request):
+    """
+    Worker function.  Read a log and return a tuple with a success flag and the log.
+
+    The functions that locate log files call sys.exit if the log file is not found.  A worker process must not exit,
+    so the exit code is returned to the parent process instead.
+    """
+    kind, casu_number, base_path = request
+    try:
+        if kind == CASU_LOG:
+            log = casu_log.CASU_Log (casu_number, base_path)
+            for a_channel in casu_log.CHANNELS:
+                log.channel (a_channel)
+        else:
+            log = casu_domset_log.CASU_DOMSET_Log (casu_number, base_path)
+    except SystemExit as error:
+        return False, error.code
+    sys.stdout.flush ()
+    return True, log
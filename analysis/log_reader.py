@@ -0,0 +1,56 @@
+"""
+Fast reader of the semicolon separated logs written by CASUs and by the DOMSET controllers.
+
+Each row of these logs starts with a tag, followed by a timestamp and the data values.  The reader
+first groups the rows by tag and then converts the rows of each tag to a NumPy array in one go.
+Rows of a tag that have fewer fields than the others are padded with NaN.  Fields that are not
+numbers, such as `None`, are converted to NaN.
+"""
+
+import numpy
+
+def read_tagged_log (filename, tags, map_booleans = False):
+    """
+    Read a log file.
+
+    :param filename: the log file to read
+    :param tags: the tags to read
+    :param map_booleans: if True, values `True` and `False` are converted to 1 and 0
+    :return: a tuple with a dictionary that maps each tag to a NumPy array with one row per log row, and a dictionary that maps unknown tags found in the log to their first row
+    """
+    blocks = dict ([(a_tag, []) for a_tag in tags])
+    unknown = {}
+    with open (filename, 'rb') as fd:
+        for line in fd:
+            tag, _, rest = line.partition (';')
+            try:
+                blocks [tag].append (rest)
+            except KeyError:
+                if line.strip () != '' and tag not in unknown:
+                    unknown [tag] = line.rstrip ('\r\n')
+    result = dict ([
+        (a_tag, convert_block (lines, map_booleans))
+        for a_tag, lines in blocks.items ()])
+    return result, unknown
+
+def convert_block (lines, map_booleans = False):
+    """
+    Convert the rows of a tag, without the tag field, to a two dimensional NumPy array.
+    """
+    if len (lines) == 0:
+        return numpy.array ([])
+    text = ''.join (lines)
+    if map_booleans:
+        text = text.replace ('True', '1').replace ('False', '0')
+    number_fields = [a_line.count (';') + 1 for a_line in lines]
+    width = max (number_fields)
+    if min (number_fields) == width:
+        values = numpy.fromstring (text.replace ('\n', ';'), sep = ';')
+        if values.size == len (lines) * width:
+            return values.reshape (len (lines), width)
+    # slow path: rows with missing or non numeric fields
+    padded_lines = [
+        a_line + ';nan' * (width - a_number_fields)
+        for a_line, a_number_fields in zip (text.splitlines (), number_fields)]
+    values = numpy.genfromtxt (padded_lines, delimiter = ';', dtype = numpy.float64)
+    return values.reshape (len (lines), width)
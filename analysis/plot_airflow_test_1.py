@@ -3,6 +3,9 @@
 
 from __future__ import print_function
 
+import matplotlib
+matplotlib.use ("Agg")
+
 import argparse
 import csv
 import datetime
@@ -14,6 +17,7 @@ import yaml
 import assisipy.casu
 
 import casu_log
+import render_queue
 import util.math
 
 def main ():
@@ -22,16 +26,18 @@ def main ():
     if not args.update_bee_where_abouts_plot:
         fdw = open (filename, 'w')
         bee_where_about_writer = csv.writer (fdw, delimiter = ';', quoting = csv.QUOTE_NONNUMERIC)
-        for run_number in args.run:
-            process_run (
-                run_number = run_number,
-                base_path = os.path.join (args.base_path, args.run_folder_template.format (run_number)),
-                config_filename = args.config,
-                bee_where_about_writer = bee_where_about_writer,
-                moving_average_length = args.moving_average_length,
-                sampling_length = args.sampling_length,
-                sampling_delta = args.sampling_delta,
-            )
+        with render_queue.RenderQueue (args.workers) as queue:
+            for run_number in args.run:
+                process_run (
+                    run_number = run_number,
+                    base_path = os.path.join (args.base_path, args.run_folder_template.format (run_number)),
+                    config_filename = args.config,
+                    bee_where_about_writer = bee_where_about_writer,
+                    moving_average_length = args.moving_average_length,
+                    sampling_length = args.sampling_length,
+                    sampling_delta = args.sampling_delta,
+                    queue = queue,
+                )
         fdw.close ()
     plot_bee_where_abouts (
         filename,
@@ -39,7 +45,7 @@ def main ():
         sampling_delta = args.sampling_delta,
     )
 
-def process_run (run_number, base_path, config_filename, bee_where_about_writer, moving_average_length, sampling_length, sampling_delta):
+def process_run (run_number, base_path, config_filename, bee_where_about_writer, moving_average_length, sampling_length, sampling_delta, queue):
     fn = os.path.join (base_path, config_filename)
     with open (fn) as fd:
         config_data = yaml.safe_load (fd)
@@ -54,10 +60,11 @@ def process_run (run_number, base_path, config_filename, bee_where_about_writer,
             third_period_length = config_data ['parameters'] ['third_period_length'],
             sampling_length = sampling_length,
             sampling_delta = sampling_delta,
-            bee_where_about_writer = bee_where_about_writer
+            bee_where_about_writer = bee_where_about_writer,
+            queue = queue,
         )
 
-def process_arena (run_number, core_casu_number, leaf_casu_number, base_path, moving_average_length, first_period_length, third_period_length, sampling_length, sampling_delta, bee_where_about_writer):
+def process_arena (run_number, core_casu_number, leaf_casu_number, base_path, moving_average_length, first_period_length, third_period_length, sampling_length, sampling_delta, bee_where_about_writer, queue):
     # read logs
     casu_logs = [
         casu_log.CASU_Log (a_casu_number, os.path.join (base_path, 'data_airflow-test/beearena/'))
@@ -69,7 +76,12 @@ def process_arena (run_number, core_casu_number, leaf_casu_number, base_path, mo
             offset = 500,
             moving_average_length = moving_average_length
         )
-    plot_arena (run_number, core_casu_number, leaf_casu_number, casu_logs)
+    queue.submit (
+        plot_arena,
+        run_number = run_number,
+        core_casu_number = core_casu_number,
+        leaf_casu_number = leaf_casu_number,
+        casu_logs = casu_logs)
     core_casu_log, leaf_casu_log = casu_logs
     compute_bee_where_about (run_number, casu_logs, core_casu_log, first_period_length, third_period_length, sampling_length, sampling_delta, bee_where_about_writer)
 
@@ -195,7 +207,7 @@ def compute_bee_where_about (run_number, casu_logs, core_casu_log, first_period_
         sampling_times = [a_start_time + a_length - sampling_delta * ith for ith in range (int (sampling_length / sampling_delta) + 1)]
         sums_activity [a_start_time] = {}
         for index, a_casu_log in enumerate (casu_logs):
-            indexes = [util.math.find_nearest_index (a_casu_log.infrared_raw [:,0], a_time) for a_time in sampling_times]
+            indexes = util.math.find_nearest_indexes (a_casu_log.infrared_raw [:,0], sampling_times)
             print ('[I] Computing for run {} casus {} and {} bee where about between relative timestamps {:.2f}% and {:.2f}% or indexes {} and {}'.format (
                 run_number,
                 casu_logs [0].number,
@@ -206,8 +218,8 @@ def compute_bee_where_about (run_number, casu_logs, core_casu_log, first_period_
                 min (indexes),
                 max (indexes)
             ))
-            data = [a_casu_log.moving_average_hits [ith] for ith in indexes]
-            sums_activity [a_start_time][index] = sum (data) / len (data)
+            data = a_casu_log.moving_average_hits [indexes]
+            sums_activity [a_start_time][index] = data.sum () / len (data)
     row = [run_number]
     row.extend ([a_casu_log.number for a_casu_log in casu_logs])
     row.extend ([
@@ -279,6 +291,13 @@ def process_arguments ():
         action = 'store_true',
         help = 'only update the bee where abouts plot'
     )
+    parser.add_argument (
+        '--workers',
+        metavar = 'N',
+        type = int,
+        default = render_queue.DEFAULT_WORKERS,
+        help = 'Number of processes used to render plots.  Default value is the number of CPUs ({}).'.format (render_queue.DEFAULT_WORKERS)
+    )
     return parser.parse_args ()
 
 if __name__ == '__main__':
@@ -17,7 +17,9 @@ import assisipy.casu
 import bee_where_abouts
 import casu_log
 import casu_domset_log
-import util.math
+import log_loader
+import render_queue
+import run_summary
 
 def main ():
     args = process_arguments ()
@@ -25,16 +27,20 @@ def main ():
     if not args.update_bee_where_abouts_plot or not os.path.exists (filename):
         fdw = open (filename, 'w')
         bee_where_about_writer = csv.writer (fdw, delimiter = ';', quoting = csv.QUOTE_NONNUMERIC)
-        for run_number in args.run:
-            process_run (
-                run_number = run_number,
-                base_path = os.path.join (args.base_path, args.run_folder_template.format (run_number)),
-                config_filename = args.config,
-                moving_average_length = args.moving_average_length,
-                sampling_length = args.sampling_length,
-                sampling_delta = args.sampling_delta,
-                bee_where_about_writer = bee_where_about_writer,
-            )
+        with render_queue.RenderQueue (args.workers) as queue:
+            for run_number in args.run:
+                process_run (
+                    run_number = run_number,
+                    base_path = os.path.join (args.base_path, args.run_folder_template.format (run_number)),
+                    config_filename = args.config,
+                    moving_average_length = args.moving_average_length,
+                    sampling_length = args.sampling_length,
+                    sampling_delta = args.sampling_delta,
+                    bee_where_about_writer = bee_where_about_writer,
+                    queue = queue,
+                    workers = args.workers,
+                    plots = not args.no_plots,
+                )
         fdw.close ()
     bee_where_abouts.plot (
         filename,
@@ -44,64 +50,86 @@ def main ():
 
 def process_run (run_number, base_path, config_filename,
         moving_average_length,
-        sampling_length, sampling_delta, bee_where_about_writer):
+        sampling_length, sampling_delta, bee_where_about_writer,
+        queue, workers = log_loader.DEFAULT_WORKERS, plots = True):
     fn = os.path.join (base_path, config_filename)
     with open (fn) as fd:
         config_data = yaml.safe_load (fd)
+    # read the logs of all arenas in a single batch
+    list_casu_numbers = [
+        a_casu_number
+        for an_arena in config_data ['arenas']
+        for a_casu_number in [an_arena ['core'], an_arena ['leaf']]
+    ]
+    logs_path = os.path.join (base_path, 'data_airflow-test/beearena/')
+    all_casu_logs = None
+    if plots:
+        all_casu_logs = log_loader.load_casu_logs (list_casu_numbers, logs_path, workers)
+        all_casu_domset_logs = log_loader.load_casu_domset_logs (list_casu_numbers, logs_path, workers)
+        for an_arena in config_data ['arenas']:
+            process_arena (
+                run_number = run_number,
+                core_casu_number = an_arena ['core'],
+                leaf_casu_number = an_arena ['leaf'],
+                first_period_length = config_data ['parameters'] ['first_period_length'],
+                airflow_period_length = config_data ['parameters'] ['airflow_duration'],
+                third_period_length = config_data ['parameters'] ['third_period_length'],
+                moving_average_length = moving_average_length,
+                queue = queue,
+                casu_logs = {
+                    a_casu_number : all_casu_logs [a_casu_number]
+                    for a_casu_number in [an_arena ['core'], an_arena ['leaf']]
+                },
+                casu_domset_logs = {
+                    a_casu_number : all_casu_domset_logs [a_casu_number]
+                    for a_casu_number in [an_arena ['core'], an_arena ['leaf']]
+                },
+            )
+    # bee where abouts are computed from the run summary, the logs are only read if it is out of date
+    summary = run_summary.load (
+        list_casu_numbers,
+        logs_path,
+        moving_average_length = moving_average_length,
+        workers = workers,
+        casu_logs = all_casu_logs)
     for an_arena in config_data ['arenas']:
-        process_arena (
-            run_number = run_number,
-            core_casu_number = an_arena ['core'],
-            leaf_casu_number = an_arena ['leaf'],
-            base_path = base_path,
+        compute_bee_where_about (
+            run_number,
+            summary,
+            [an_arena ['core'], an_arena ['leaf']],
             first_period_length = config_data ['parameters'] ['first_period_length'],
             airflow_period_length = config_data ['parameters'] ['airflow_duration'],
             third_period_length = config_data ['parameters'] ['third_period_length'],
-            moving_average_length = moving_average_length,
             sampling_length = sampling_length,
             sampling_delta = sampling_delta,
-            bee_where_about_writer = bee_where_about_writer,
-        )
+            writer = bee_where_about_writer)
 
 def process_arena (
-        run_number, base_path,
+        run_number,
         core_casu_number, leaf_casu_number,
         first_period_length, airflow_period_length, third_period_length,
         moving_average_length,
-        sampling_length, sampling_delta, bee_where_about_writer):
-    # read logs
-    casu_logs = {
-        a_casu_number : casu_log.CASU_Log (a_casu_number, os.path.join (base_path, 'data_airflow-test/beearena/'))
-        for a_casu_number in [core_casu_number, leaf_casu_number]
-    }
-    casu_domset_logs = {
-        a_casu_number : casu_domset_log.CASU_DOMSET_Log (a_casu_number, os.path.join (base_path, 'data_airflow-test/beearena/'))
-        for a_casu_number in [core_casu_number, leaf_casu_number]
-    }
-    # compute activity (needed by bee where about)
+        queue, casu_logs, casu_domset_logs):
+    # compute activity (plotted and used by the run summary)
     for a_casu_log in casu_logs.values ():
         a_casu_log.compute_activity (
-            start_index = 0,
-            end_index = 50,
-            offset = 500,
+            start_index = run_summary.ACTIVITY_START_INDEX,
+            end_index = run_summary.ACTIVITY_END_INDEX,
+            offset = run_summary.ACTIVITY_OFFSET,
             moving_average_length = moving_average_length
         )
     # create plot
-    plot_arena (
-        run_number, core_casu_number, leaf_casu_number,
-        first_period_length, airflow_period_length, third_period_length,
-        casu_logs, casu_domset_logs
+    queue.submit (
+        plot_arena,
+        run_number = run_number,
+        core_casu_number = core_casu_number,
+        leaf_casu_number = leaf_casu_number,
+        first_period_length = first_period_length,
+        airflow_period_length = airflow_period_length,
+        third_period_length = third_period_length,
+        casu_logs = casu_logs,
+        casu_domset_logs = casu_domset_logs,
     )
-    #
-    compute_bee_where_about (
-        run_number,
-        casu_logs,
-        first_period_length,
-        airflow_period_length,
-        third_period_length,
-        sampling_length = sampling_length,
-        sampling_delta = sampling_delta,
-        writer = bee_where_about_writer)
 
 def plot_arena (run_number, core_casu_number, leaf_casu_number,
         first_period_length, airflow_period_length, third_period_length, casu_logs, casu_domset_logs):
@@ -186,44 +214,41 @@ def plot_arena (run_number, core_casu_number, leaf_casu_number,
     figure.savefig ('casu-log_R{}-C{}-L{}.png'.format (run_number, core_casu_number, leaf_casu_number))
     matplotlib.pyplot.close (figure)
 
-def compute_bee_where_about (run_number, casu_logs, first_period_length, airflow_period_length, third_period_length, sampling_length, sampling_delta, writer):
+def compute_bee_where_about (run_number, summary, casu_numbers, first_period_length, airflow_period_length, third_period_length, sampling_length, sampling_delta, writer):
     """
-    Compute where the majority of bees are based on sensor activity
-    :param sampling_delta:
-    :type casu_logs: list(casu_log.CASU_Log)
+    Compute where the majority of bees are based on sensor activity.  The activity is sampled every sampling delta
+    seconds in the last sampling length seconds of the first and third period.
+    :param summary: the run summary, see class run_summary.RunSummary
+    :param casu_numbers: the core and leaf CASU numbers
     """
-    first_period_start_time = numpy.mean ([a_casu_log.led_actuator [2, 0] for a_casu_log in casu_logs.values ()])
-    second_period_start_time = numpy.mean ([a_casu_log.led_actuator [4, 0] for a_casu_log in casu_logs.values ()])
+    first_period_start_time = numpy.mean ([summary.led_actuator (a_casu_number) [2, 0] for a_casu_number in casu_numbers])
+    second_period_start_time = numpy.mean ([summary.led_actuator (a_casu_number) [4, 0] for a_casu_number in casu_numbers])
     third_period_start_time = second_period_start_time + airflow_period_length
 
-    sums_activity = {}
+    sums_activity = []
     for a_start_time, a_length in zip ([first_period_start_time, third_period_start_time], [first_period_length, third_period_length]):
         sampling_times = [a_start_time + a_length - sampling_delta * ith for ith in range (int (sampling_length / sampling_delta) + 1)]
-        sums_activity [a_start_time] = {}
-        for index, a_casu_log in enumerate (casu_logs.values ()):
-            indexes = [util.math.find_nearest_index (a_casu_log.infrared_raw [:,0], a_time) for a_time in sampling_times]
-            print ('[I] Computing for run {} casus {} and {} bee where about between relative timestamps {:.2f}% and {:.2f}% or indexes {} and {}'.format (
+        sums_activity.append ([])
+        for a_casu_number in casu_numbers:
+            times = summary.times (a_casu_number)
+            print ('[I] Computing for run {} casus {} and {} bee where about between relative timestamps {:.2f}% and {:.2f}%'.format (
                 run_number,
-                casu_logs.values () [0].number,
-                casu_logs.values () [1].number,
-                100 * (min (sampling_times) - a_casu_log.infrared_raw [:, 0].min ()) / (
-                    a_casu_log.infrared_raw [:, 0].max () - a_casu_log.infrared_raw [:, 0].min ()),
-                100 * (max (sampling_times) - a_casu_log.infrared_raw [:, 0].min ()) / (
-                            a_casu_log.infrared_raw [:, 0].max () - a_casu_log.infrared_raw [:, 0].min ()),
-                min (indexes),
-                max (indexes)
+                casu_numbers [0],
+                casu_numbers [1],
+                100 * (min (sampling_times) - times [0]) / (times [-1] - times [0]),
+                100 * (max (sampling_times) - times [0]) / (times [-1] - times [0]),
             ))
-            data = [a_casu_log.moving_average_hits [ith] for ith in indexes]
-            sums_activity [a_start_time][index] = sum (data) / len (data)
+            data = summary.sample (a_casu_number, run_summary.ACTIVITY, sampling_times)
+            sums_activity [-1].append (data.sum () / len (data))
     row = [run_number]
-    row.extend ([a_casu_log.number for a_casu_log in casu_logs.values ()])
+    row.extend (casu_numbers)
     row.extend ([
-        sums_activity [at][ai]
-        for at in sums_activity.keys ()
-        for ai in sums_activity [at].keys ()])
+        a_sum
+        for period_sums in sums_activity
+        for a_sum in period_sums])
     row.extend ([
-        sums_activity [at][1] - sums_activity [at][0]
-        for at in sums_activity.keys ()
+        period_sums [1] - period_sums [0]
+        for period_sums in sums_activity
     ])
     writer.writerow (row)
 
@@ -293,12 +318,24 @@ def process_arguments ():
         action = 'store_true',
         help = 'only update the bee where abouts plot'
     )
+    parser.add_argument (
+        '--no-plots',
+        action = 'store_true',
+        help = 'do not plot the CASU logs of each arena, bee where abouts are computed from the run summaries'
+    )
     parser.add_argument (
         '--output',
         metavar = 'PATH',
         default = '.',
         help = 'Output where plots and csv files are saved.  Default is current directory.'
     )
+    parser.add_argument (
+        '--workers',
+        metavar = 'N',
+        type = int,
+        default = log_loader.DEFAULT_WORKERS,
+        help = 'Number of processes used to read CASU logs and to render plots.  Default value is the number of CPUs ({}).'.format (log_loader.DEFAULT_WORKERS)
+    )
     return parser.parse_args ()
 
 if __name__ == '__main__':
@@ -1,2 +1,32 @@
 
+import matplotlib
+
+import util.math
+
 COLOURS = ['#FF0000', '#007FFF', '#0000FF', '#FF00FF']
+
+# time series with more samples than pixels are decimated before being plotted, see function decimate
+DECIMATE = True
+
+def axes_width_pixels (axa):
+    """
+    Return the width of the given axes in pixels of the saved figure.
+    """
+    figure = axa.get_figure ()
+    dpi = figure.get_dpi ()
+    if matplotlib.rcParams ['savefig.dpi'] != 'figure':
+        dpi = max (dpi, matplotlib.rcParams ['savefig.dpi'])
+    return axa.get_position ().width * figure.get_figwidth () * dpi
+
+def decimate (axa, xs, ys, enabled = None):
+    """
+    Decimate a time series to the width of the given axes with function util.math.envelope_decimation.  The plotted
+    trace looks the same as the one with all samples.
+
+    :param enabled: if False return the given time series, if None use the value of DECIMATE
+    """
+    if enabled is None:
+        enabled = DECIMATE
+    if not enabled:
+        return xs, ys
+    return util.math.envelope_decimation (xs, ys, axes_width_pixels (axa))
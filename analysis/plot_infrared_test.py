@@ -29,6 +29,7 @@ import yaml
 import assisipy.casu
 
 import casu_log
+import render_queue
 import util.math
 
 def main ():
@@ -46,18 +47,20 @@ def main ():
                 'bee_activity_B',
                 ]
             bee_visitation_writer.writerow (header_row)
-            for config_filename in args.config:
-                process_run (
-                    base_path = args.base_path,
-                    output_path = args.output,
-                    config_filename = config_filename,
-                    bee_visitation_writer = bee_visitation_writer,
-                )
+            with render_queue.RenderQueue (args.workers) as queue:
+                for config_filename in args.config:
+                    process_run (
+                        base_path = args.base_path,
+                        output_path = args.output,
+                        config_filename = config_filename,
+                        bee_visitation_writer = bee_visitation_writer,
+                        queue = queue,
+                    )
     plot_bee_visitation (
         output_path = args.output,
     )
 
-def process_run (base_path, output_path, config_filename, bee_visitation_writer):
+def process_run (base_path, output_path, config_filename, bee_visitation_writer, queue):
     fn = os.path.join (base_path, config_filename)
     with open (fn) as fd:
         config_data = yaml.safe_load (fd)
@@ -69,9 +72,10 @@ def process_run (base_path, output_path, config_filename, bee_visitation_writer)
             experiment_duration = config_data ['parameters']['experiment_duration'],
             casu_A_number = an_arena ['A'],
             casu_B_number = an_arena ['B'],
+            queue = queue,
         )
 
-def process_arena (output_path, config_filename, bee_visitation_writer, experiment_duration, casu_A_number, casu_B_number):
+def process_arena (output_path, config_filename, bee_visitation_writer, experiment_duration, casu_A_number, casu_B_number, queue):
     casu_numbers = [min (casu_A_number, casu_B_number), max (casu_A_number, casu_B_number)]
     base_path = os.path.dirname (config_filename)
     # read logs
@@ -95,7 +99,8 @@ def process_arena (output_path, config_filename, bee_visitation_writer, experime
         zero_time = zero_time,
     )
     # create plot
-    plot_arena (
+    queue.submit (
+        plot_arena,
         output_path = output_path,
         config_filename = config_filename,
         experiment_duration = experiment_duration,
@@ -183,12 +188,9 @@ def build_bee_visitation_CSV_file (bee_visitation_writer, experiment_duration, c
             offset = 500,
             moving_average_length = 61,
         )
-        indexes [a_casu_number] = [
-            util.math.find_nearest_index (
-                a_casu_log.infrared_raw [:, 0],
-                a_time)
-            for a_time in sampling_times
-        ]
+        indexes [a_casu_number] = util.math.find_nearest_indexes (
+            a_casu_log.infrared_raw [:, 0],
+            sampling_times)
     for a_time, index_A, index_B in zip (
         sampling_times,
         indexes [casu_numbers [0]], indexes [casu_numbers [1]]):
@@ -289,6 +291,13 @@ def process_arguments ():
         default = '.',
         help = 'Output where plot files are saved.  Default is current directory.'
     )
+    parser.add_argument (
+        '--workers',
+        metavar = 'N',
+        type = int,
+        default = render_queue.DEFAULT_WORKERS,
+        help = 'Number of processes used to render plots.  Default value is the number of CPUs ({}).'.format (render_queue.DEFAULT_WORKERS)
+    )
     return parser.parse_args ()
 
 if __name__ == '__main__':
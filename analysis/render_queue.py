@@ -0,0 +1,84 @@
+"""
+Parallel rendering of matplotlib figures.
+
+A figure job is a module level function, that creates and saves a figure,
+and its keyword arguments.  Jobs are rendered in a pool of worker processes
+with the Agg backend, in any order.  The arguments of a job are pickled to
+the worker processes, so they should be NumPy arrays or objects made of
+them.  CASU logs are fine: they are pickled without the channels that are in
+the log cache, and workers memory-map them from the cache.
+
+With one worker, jobs are rendered when they are submitted.
+"""
+
+import matplotlib
+matplotlib.use ("Agg")
+
+import multiprocessing
+import sys
+
+import log_loader
+
+DEFAULT_WORKERS = log_loader.DEFAULT_WORKERS
+
+class RenderQueue (object):
+    """
+    Queue of figure jobs.  Use it in a with statement, or call method wait, to wait for all jobs to finish.
+    """
+
+    def __init__ (self, workers = DEFAULT_WORKERS):
+        self.workers = workers
+        self.__pool = None
+        self.__results = []
+
+    def submit (self, function, **arguments):
+        if self.workers <= 1:
+            self.__check (_render ((function, arguments)))
+            return
+        if self.__pool is None:
+            self.__pool = multiprocessing.Pool (self.workers)
+        self.__results.append (self.__pool.apply_async (_render, ((function, arguments),)))
+
+    def wait (self):
+        """
+        Wait for all submitted jobs.  If a job called sys.exit, exit with the same code.
+        """
+        if self.__pool is None:
+            return
+        try:
+            for a_result in self.__results:
+                self.__check (a_result.get ())
+        finally:
+            self.__pool.close ()
+            self.__pool.join ()
+            self.__pool = None
+            self.__results = []
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.wait ()
+        elif self.__pool is not None:
+            self.__pool.terminate ()
+            self.__pool.join ()
+            self.__pool = None
+        return False
+
+    def __check (self, result):
+        ok, value = result
+        if not ok:
+            sys.exit (value)
+
+def _render (job):
+    """
+    Worker function.  Render a figure and return a tuple with a success flag and the exit code, as in module log_loader.
+    """
+    function, arguments = job
+    try:
+        function (**arguments)
+    except SystemExit as error:
+        return False, error.code
+    sys.stdout.flush ()
+    return True, None
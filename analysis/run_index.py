@@ -0,0 +1,175 @@
+"""
+Index of the CASU logs and CASU DOMSET logs stored in a run folder.
+
+The logs of CASU N are stored in folder `casu-NNN` of the run folder.  Their
+names start with the date and time the log was created.  Finding them
+requires listing the CASU folder and matching every entry, which is slow on
+network file systems.  The index does this once per CASU folder and saves the
+result in a manifest file in the run folder, together with the size and
+modification time of the logs and the modification time of the CASU folder.
+A CASU folder is listed again only if its modification time changes.
+
+Indexes are also kept in memory, so each run folder is indexed at most once
+per process.
+
+The manifest also stores values computed from the logs of the run, such as
+the video synchronisation offset, so that they are computed once.
+
+Several processes, such as the workers of module log_loader, may index the
+same run folder.  Before saving, the manifest is read again under a lock and
+the entries and values changed by this process are merged into it, so that
+no process discards the entries of the others.
+"""
+
+import fcntl
+import os
+import os.path
+import re
+import tempfile
+import yaml
+
+MANIFEST_FILENAME = 'casu-logs-index.yaml'
+LOCK_FILENAME = '.casu-logs-index.lock'
+
+CASU_LOG = 'casu_log'
+DOMSET_LOG = 'domset_log'
+
+_TIMESTAMP_PATTERN = '[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}'
+_LOG_PATTERNS = {
+    CASU_LOG : '^({})-casu-{:03d}[.]csv$',
+    DOMSET_LOG : '^({})-casu-{:03d}-domset[.]csv$',
+}
+
+_INDEXES = {}
+
+def get (base_path = '.'):
+    """
+    Return the index of the given run folder.
+    """
+    key = os.path.abspath (base_path)
+    try:
+        return _INDEXES [key]
+    except KeyError:
+        result = RunIndex (base_path)
+        _INDEXES [key] = result
+        return result
+
+def casu_folder (number, base_path = '.'):
+    return os.path.join (base_path, 'casu-{:03d}'.format (number))
+
+class RunIndex (object):
+    """
+    Maps CASU numbers to the logs found in their folder.
+
+    Each entry of the index has the modification time of the CASU folder and, for each kind of log, a list with the
+    name, size, modification time and creation timestamp of the matching files.  Usually there is one file of each
+    kind, it is up to the caller to decide what to do if there are none or several.
+    """
+
+    def __init__ (self, base_path = '.'):
+        self.base_path = base_path
+        self.manifest_filename = os.path.join (base_path, MANIFEST_FILENAME)
+        self.lock_filename = os.path.join (base_path, LOCK_FILENAME)
+        self.__entries, self.__values = self.__load ()
+        # keys changed by this process, they take precedence over the manifest when saving
+        self.__changed_entries = set ()
+        self.__changed_values = set ()
+        self.__warned = False
+
+    def casu_logs (self, number):
+        """
+        Return the paths of the CASU logs of the given CASU.
+        """
+        return self.__paths (number, CASU_LOG)
+
+    def domset_logs (self, number):
+        """
+        Return the paths of the CASU DOMSET logs of the given CASU.
+        """
+        return self.__paths (number, DOMSET_LOG)
+
+    def entry (self, number):
+        """
+        Return the index entry of the given CASU, listing its folder if the entry is missing or out of date.
+        """
+        folder = casu_folder (number, self.base_path)
+        folder_mtime = os.stat (folder).st_mtime
+        result = self.__entries.get (number)
+        if result is None or result ['folder_mtime'] != folder_mtime:
+            result = self.__scan (number, folder, folder_mtime)
+            self.__entries [number] = result
+            self.__changed_entries.add (number)
+            self.__save ()
+        return result
+
+    def get_value (self, key, default = None):
+        """
+        Return a value stored in the manifest.
+        """
+        return self.__values.get (key, default)
+
+    def set_value (self, key, value):
+        """
+        Store a value in the manifest.  The value must be representable in YAML.
+        """
+        self.__values [key] = value
+        self.__changed_values.add (key)
+        self.__save ()
+
+    def __paths (self, number, kind):
+        folder = casu_folder (number, self.base_path)
+        return [
+            os.path.join (folder, a_log ['name'])
+            for a_log in self.entry (number) [kind]
+        ]
+
+    def __scan (self, number, folder, folder_mtime):
+        print ('[II] Searching files in folder {}'.format (folder))
+        result = {
+            'folder_mtime' : folder_mtime,
+            CASU_LOG : [],
+            DOMSET_LOG : [],
+        }
+        regular_expressions = [
+            (kind, re.compile (pattern.format (_TIMESTAMP_PATTERN, number)))
+            for kind, pattern in _LOG_PATTERNS.items ()
+        ]
+        for af in sorted (os.listdir (folder)):
+            for kind, regular_expression in regular_expressions:
+                match = regular_expression.match (af)
+                if match:
+                    st = os.stat (os.path.join (folder, af))
+                    result [kind].append ({
+                        'name' : af,
+                        'timestamp' : match.group (1),
+                        'size' : st.st_size,
+                        'mtime' : st.st_mtime,
+                    })
+        return result
+
+    def __load (self):
+        try:
+            with open (self.manifest_filename, 'r') as fd:
+                contents = yaml.safe_load (fd)
+            return contents ['casus'], contents.get ('values', {})
+        except (IOError, OSError, KeyError, TypeError, AttributeError, yaml.YAMLError):
+            return {}, {}
+
+    def __save (self):
+        # the manifest is written to a temporary file and renamed, so that concurrent readers never see a partial file
+        try:
+            with open (self.lock_filename, 'a') as fd_lock:
+                fcntl.flock (fd_lock, fcntl.LOCK_EX)
+                entries, values = self.__load ()
+                entries.update ([(key, self.__entries [key]) for key in self.__changed_entries])
+                values.update ([(key, self.__values [key]) for key in self.__changed_values])
+                self.__entries, self.__values = entries, values
+                fd, temporary_filename = tempfile.mkstemp (dir = self.base_path, prefix = '.' + MANIFEST_FILENAME)
+                with os.fdopen (fd, 'w') as fdw:
+                    yaml.safe_dump ({'casus' : self.__entries, 'values' : self.__values}, fdw, default_flow_style = False)
+                os.chmod (temporary_filename, 0o644)
+                os.rename (temporary_filename, self.manifest_filename)
+        except (IOError, OSError) as error:
+            if not self.__warned:
+                print ('[W] could not write index of run folder {}: {}'.format (self.base_path, error))
+                self.__warned = True
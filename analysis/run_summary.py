@@ -0,0 +1,177 @@
+"""
+Per second summary of the CASU logs of a run.
+
+The summary of a run has, for each CASU, the mean infrared sensor activity,
+the mean of each temperature sensor and the airflow state in each second of
+the log.  Window statistics, such as the bee where abouts computed in the
+last seconds of an experiment period, are slices of the summary, so they can
+be computed for any window length and sampling delta without reading the
+logs again.
+
+The summary is stored in a NumPy `.npz` file in the folder of the run logs.
+The file depends on the moving average length used to compute the activity
+and is rebuilt when a CASU log changes, using the size and modification time
+of the logs as in module log_cache.
+
+The second of index i of a CASU starts at the start time of that CASU plus i
+seconds.  Seconds without samples have NaN values.
+"""
+
+import numpy
+import os
+import os.path
+import tempfile
+
+import casu_log
+import log_cache
+import log_loader
+
+SUMMARY_FILENAME = 'run-summary_MA={}.npz'
+
+ACTIVITY = 'activity'
+TEMPERATURE = 'temperature'
+AIRFLOW = 'airflow'
+FIELDS = [ACTIVITY, TEMPERATURE, AIRFLOW]
+
+# parameters of method casu_log.CASU_Log.compute_activity
+ACTIVITY_START_INDEX = 0
+ACTIVITY_END_INDEX = 50
+ACTIVITY_OFFSET = 500
+
+class RunSummary (object):
+    def __init__ (self, arrays):
+        """
+        :param arrays: a dictionary that maps array names to arrays, as stored in the summary file
+        """
+        self.__arrays = arrays
+        self.casu_numbers = [int (n) for n in arrays ['casu_numbers']]
+
+    def start_time (self, casu_number):
+        return float (self.__arrays [_key (casu_number, 'start')])
+
+    def times (self, casu_number):
+        """
+        Return the start time of each second of the given CASU.
+        """
+        return self.start_time (casu_number) + numpy.arange (len (self.field (casu_number, ACTIVITY)))
+
+    def field (self, casu_number, name):
+        return self.__arrays [_key (casu_number, name)]
+
+    def led_actuator (self, casu_number):
+        return self.__arrays [_key (casu_number, 'led_actuator')]
+
+    def window (self, casu_number, name, start_time, end_time):
+        """
+        Return the values of the given field in the seconds between start_time and end_time.
+        """
+        data = self.field (casu_number, name)
+        first, last = numpy.clip (self.__seconds (casu_number, [start_time, end_time]), 0, len (data))
+        return data [first:last]
+
+    def sample (self, casu_number, name, times):
+        """
+        Return the values of the given field in the seconds that contain the given times.  Times outside the log use
+        the first or last second.
+        """
+        data = self.field (casu_number, name)
+        return data [numpy.clip (self.__seconds (casu_number, times), 0, len (data) - 1)]
+
+    def __seconds (self, casu_number, times):
+        return numpy.floor (numpy.asarray (times) - self.start_time (casu_number)).astype (int)
+
+def summary_filename (base_path, moving_average_length):
+    return os.path.join (base_path, SUMMARY_FILENAME.format (moving_average_length))
+
+def load (list_casu_numbers, base_path = '.', moving_average_length = 61, workers = log_loader.DEFAULT_WORKERS, casu_logs = None, debug = True):
+    """
+    Return the summary of the given CASUs of a run, building it if the summary file is missing or out of date.
+
+    :param casu_logs: a dictionary that maps CASU numbers to CASU logs already read, used to build the summary
+    :return: a RunSummary instance
+    """
+    _filename = summary_filename (base_path, moving_average_length)
+    stamps = _source_stamps (list_casu_numbers, base_path)
+    try:
+        with numpy.load (_filename) as fd:
+            arrays = dict (fd.items ())
+        if arrays ['source'].tolist () == stamps:
+            return RunSummary (arrays)
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+    if debug:
+        print ('[I] building summary of run logs in {}'.format (base_path))
+    if casu_logs is None:
+        casu_logs = log_loader.load_casu_logs (list_casu_numbers, base_path, workers)
+    arrays = {
+        'casu_numbers' : numpy.array (list_casu_numbers),
+        'source' : numpy.array (stamps),
+    }
+    for a_casu_number in list_casu_numbers:
+        a_casu_log = casu_logs [a_casu_number]
+        if a_casu_log.moving_average_hits is None:
+            a_casu_log.compute_activity (
+                start_index = ACTIVITY_START_INDEX,
+                end_index = ACTIVITY_END_INDEX,
+                offset = ACTIVITY_OFFSET,
+                moving_average_length = moving_average_length)
+        for name, data in summarise (a_casu_log).items ():
+            arrays [_key (a_casu_number, name)] = data
+    _save (_filename, arrays)
+    return RunSummary (arrays)
+
+def summarise (a_casu_log):
+    """
+    Compute the per second summary of a CASU log whose activity has been computed.
+
+    :return: a dictionary with the start time, the summary fields and the LED actuator data
+    """
+    temperature = a_casu_log.temperature
+    times = [a_casu_log.activity_times, temperature [:, 0] if len (temperature) > 0 else []]
+    times = numpy.concatenate (times)
+    start_time = numpy.floor (times.min ()) if len (times) > 0 else 0.0
+    number_seconds = int (numpy.floor (times.max () - start_time)) + 1 if len (times) > 0 else 0
+    if len (temperature) > 0:
+        temperature = numpy.column_stack ([
+            _per_second_mean (temperature [:, 0], temperature [:, column], start_time, number_seconds)
+            for column in range (1, temperature.shape [1])
+        ])
+    else:
+        temperature = numpy.zeros ((number_seconds, 0))
+    starts, ends = casu_log.airflow_intervals (a_casu_log.airflow)
+    seconds = start_time + numpy.arange (number_seconds)
+    airflow = (numpy.searchsorted (starts, seconds, side = 'right') - numpy.searchsorted (ends, seconds, side = 'right')).astype (numpy.int8)
+    return {
+        'start' : numpy.array (start_time),
+        ACTIVITY : _per_second_mean (a_casu_log.activity_times, a_casu_log.moving_average_hits, start_time, number_seconds),
+        TEMPERATURE : temperature,
+        AIRFLOW : airflow,
+        'led_actuator' : numpy.array (a_casu_log.led_actuator),
+    }
+
+def _per_second_mean (times, values, start_time, number_seconds):
+    seconds = numpy.floor (numpy.asarray (times) - start_time).astype (int)
+    sums = numpy.bincount (seconds, weights = values, minlength = number_seconds)
+    counts = numpy.bincount (seconds, minlength = number_seconds)
+    with numpy.errstate (invalid = 'ignore', divide = 'ignore'):
+        return sums / counts
+
+def _key (casu_number, name):
+    return 'C{}_{}'.format (casu_number, name)
+
+def _source_stamps (list_casu_numbers, base_path):
+    return [
+        ';'.join ([str (a_casu_number)] + log_cache.source_stamp (casu_log.filename (a_casu_number, base_path)))
+        for a_casu_number in list_casu_numbers
+    ]
+
+def _save (filename, arrays):
+    # written to a temporary file and renamed, as in module run_index
+    try:
+        fd, temporary_filename = tempfile.mkstemp (dir = os.path.dirname (os.path.abspath (filename)), prefix = '.run-summary', suffix = '.npz')
+        with os.fdopen (fd, 'wb') as fdw:
+            numpy.savez (fdw, **arrays)
+        os.chmod (temporary_filename, 0o644)
+        os.rename (temporary_filename, filename)
+    except (IOError, OSError) as error:
+        print ('[W] could not write run summary {}: {}'.format (filename, error))
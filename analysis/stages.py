@@ -0,0 +1,221 @@
+"""
+Stages of the analysis of a run folder, skipped when their outputs are up to date.
+
+A stage is a function with its arguments, input files and output files.
+Stages are added to a pipeline after the stages they depend on.  Running
+the pipeline runs the stages in that order.
+
+The hash of a stage combines the contents of its input files, its arguments,
+the source code of its function and of the functions, classes and modules
+listed in its code dependencies, and the hash of each stage it depends on.
+Helpers that a stage calls must be listed, otherwise editing them does not
+run the stage again.
+After a stage runs, its hash is saved as a stamp in a file in the run
+folder.  A stage runs again only if its hash differs from the stamp or one
+of its outputs is missing.  Changing the code of a plot function therefore
+only redoes that plot.
+
+Outputs that exist when a stage has no stamp, such as features files
+computed by the external program, are adopted: the stage is stamped without
+running.  Force the stage to compute them again.
+
+A stage without outputs is transient: its result is kept in memory and it
+runs only when a stage that uses its result runs.  The hash of a stage that
+has outputs is the hash of the contents of its outputs.  Arguments of a stage
+may refer to the result of a transient stage with class Result.
+
+Content hashes of files are kept in the stamps file together with the size
+and modification time of each file, so large videos are read only when they
+change.
+"""
+
+import hashlib
+import inspect
+import os
+import os.path
+import tempfile
+import yaml
+
+STAMPS_FILENAME = 'analysis-stages.yaml'
+
+class Result (object):
+    """
+    Placeholder for the result of a transient stage in the arguments of another stage.
+    """
+    def __init__ (self, name):
+        self.name = name
+
+class Stage (object):
+    def __init__ (self, name, function, arguments = None, inputs = None, outputs = None, depends = None, options = None, code = None):
+        """
+        :param arguments: keyword arguments of the function, part of the stage hash
+        :param inputs: filenames read by the function
+        :param outputs: filenames written by the function, none if the stage is transient
+        :param depends: names of the stages whose outputs are used by the function, stages referred by Result arguments are added automatically
+        :param options: keyword arguments of the function that do not change its outputs, such as the number of worker processes
+        :param code: functions, classes or modules used by the function, their source code is part of the stage hash
+        """
+        self.name = name
+        self.function = function
+        self.arguments = arguments if arguments is not None else {}
+        self.inputs = inputs if inputs is not None else []
+        self.outputs = outputs if outputs is not None else []
+        self.options = options if options is not None else {}
+        self.code = list (code) if code is not None else []
+        self.depends = list (depends) if depends is not None else []
+        for value in self.arguments.values ():
+            if isinstance (value, Result) and value.name not in self.depends:
+                self.depends.append (value.name)
+
+    def is_transient (self):
+        return len (self.outputs) == 0
+
+class Pipeline (object):
+    def __init__ (self, folder, debug = True):
+        """
+        :param folder: the run folder where the stamps file is stored
+        """
+        self.folder = folder
+        self.debug = debug
+        self.stamps_filename = os.path.join (folder, STAMPS_FILENAME)
+        self.__stages = []
+        self.__stages_by_name = {}
+        self.__results = {}
+        self.__hashes = {}
+        self.__warned = False
+        self.__stamps = {}
+        self.__files = {}
+        try:
+            with open (self.stamps_filename, 'r') as fd:
+                contents = yaml.safe_load (fd)
+            self.__stamps = contents ['stages']
+            self.__files = contents ['files']
+        except (IOError, OSError, KeyError, TypeError, yaml.YAMLError):
+            pass
+
+    def add (self, stage):
+        for a_name in stage.depends:
+            if a_name not in self.__stages_by_name:
+                raise ValueError ('stage {} depends on stage {} that was not added before'.format (stage.name, a_name))
+        self.__stages.append (stage)
+        self.__stages_by_name [stage.name] = stage
+
+    def run (self, force = None, skip = None):
+        """
+        Run the stages that are not up to date.
+
+        :param force: names of stages to run even if they are up to date
+        :param skip: names of stages not to run, their current outputs are used by the other stages
+        """
+        force = force if force is not None else []
+        skip = skip if skip is not None else []
+        for a_stage in self.__stages:
+            if a_stage.is_transient () or a_stage.name in skip:
+                continue
+            stage_hash = self.stage_hash (a_stage)
+            up_to_date = (
+                self.__stamps.get (a_stage.name) == stage_hash and
+                all (os.path.exists (a_filename) for a_filename in a_stage.outputs))
+            if up_to_date and a_stage.name not in force:
+                if self.debug:
+                    print ('[I] stage {} of {} is up to date'.format (a_stage.name, self.folder))
+                continue
+            adopt = (
+                a_stage.name not in self.__stamps and
+                a_stage.name not in force and
+                all (os.path.exists (a_filename) for a_filename in a_stage.outputs))
+            if adopt:
+                print ('[W] adopting the existing outputs of stage {} of {}, force the stage to compute them again'.format (a_stage.name, self.folder))
+                self.__stamps [a_stage.name] = stage_hash
+                self.__save ()
+                continue
+            self.__call (a_stage)
+            self.__stamps [a_stage.name] = stage_hash
+            self.__save ()
+
+    def result (self, name):
+        """
+        Return the result of the given transient stage, running it if needed.
+        """
+        if name not in self.__results:
+            self.__results [name] = self.__call (self.__stages_by_name [name])
+        return self.__results [name]
+
+    def stage_hash (self, stage):
+        """
+        Return the hash of the given stage.  The hash of a stage with outputs is computed when the stage is run.
+        """
+        if stage.name in self.__hashes:
+            return self.__hashes [stage.name]
+        md5 = hashlib.md5 ()
+        for an_object in [stage.function] + stage.code:
+            try:
+                md5.update (inspect.getsource (an_object))
+            except (IOError, TypeError):
+                md5.update (an_object.__name__)
+        arguments = dict ([
+            (key, 'result of stage {}'.format (value.name) if isinstance (value, Result) else value)
+            for key, value in stage.arguments.items ()
+        ])
+        md5.update (yaml.safe_dump (arguments))
+        for a_filename in stage.inputs:
+            md5.update (a_filename)
+            md5.update (self.file_hash (a_filename))
+        for a_name in stage.depends:
+            a_stage = self.__stages_by_name [a_name]
+            md5.update (a_name)
+            if a_stage.is_transient ():
+                md5.update (self.stage_hash (a_stage))
+            else:
+                for a_filename in a_stage.outputs:
+                    md5.update (self.file_hash (a_filename))
+        result = md5.hexdigest ()
+        if stage.is_transient ():
+            self.__hashes [stage.name] = result
+        return result
+
+    def file_hash (self, filename, block_size = 1 << 20):
+        """
+        Return the hash of the contents of the given file, or an empty string if the file does not exist.
+        """
+        try:
+            st = os.stat (filename)
+        except OSError:
+            return ''
+        key = os.path.abspath (filename)
+        entry = self.__files.get (key)
+        if entry is not None and entry ['size'] == st.st_size and entry ['mtime'] == st.st_mtime:
+            return entry ['md5']
+        md5 = hashlib.md5 ()
+        with open (filename, 'rb') as fd:
+            for block in iter (lambda: fd.read (block_size), b''):
+                md5.update (block)
+        self.__files [key] = {
+            'size' : st.st_size,
+            'mtime' : st.st_mtime,
+            'md5' : md5.hexdigest (),
+        }
+        return self.__files [key]['md5']
+
+    def __call (self, stage):
+        if self.debug:
+            print ('[I] running stage {} of {}'.format (stage.name, self.folder))
+        arguments = dict ([
+            (key, self.result (value.name) if isinstance (value, Result) else value)
+            for key, value in stage.arguments.items ()
+        ])
+        arguments.update (stage.options)
+        return stage.function (**arguments)
+
+    def __save (self):
+        # written to a temporary file and renamed, as in module run_index
+        try:
+            fd, temporary_filename = tempfile.mkstemp (dir = self.folder, prefix = '.' + STAMPS_FILENAME)
+            with os.fdopen (fd, 'w') as fdw:
+                yaml.safe_dump ({'stages' : self.__stamps, 'files' : self.__files}, fdw, default_flow_style = False)
+            os.chmod (temporary_filename, 0o644)
+            os.rename (temporary_filename, self.stamps_filename)
+        except (IOError, OSError) as error:
+            if not self.__warned:
+                print ('[W] could not write analysis stamps of folder {}: {}'.format (self.folder, error))
+                self.__warned = True
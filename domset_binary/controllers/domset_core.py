@@ -0,0 +1,711 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Engine shared by the DOMSET controllers.
+
+Class DomsetCore runs the 10 Hz loop of a CASU: it samples the infrared
+sensors, and every temperature control period it exchanges the sensor
+activity with the CASU group and updates the temperature reference.  The
+CASU with the lowest number in a group is the group master, it computes the
+temperature reference of the group and sends it to the other CASUs.
+
+Controllers are subclasses of DomsetCore that override its hook methods,
+for instance to filter the neighbours that belong to the CASU group or to
+add data to the messages of the group.  Two strategies are provided as
+mixin classes:
+
+* InterfaceMixin handles messages from an interface with another species,
+  such as the fish CATS interface or the ISI;
+* AirflowMixin adds the airflow policy: the group master decides when to
+  blow and sends the blow duration with the temperature reference.
+
+This module is deployed next to the controllers, which import it as a top
+level module.
+"""
+
+from assisipy import casu
+
+import time
+from threading import Thread, Event, Lock
+from datetime import datetime
+import json
+from math import exp
+import ctypes
+import ctypes.util
+import os
+
+try:
+    from ring_buffer import RingBuffer
+    from domset_log import DomsetLog
+except ImportError:
+    from domset_binary.util.ring_buffer import RingBuffer
+    from domset_binary.util.domset_log import DomsetLog
+
+CLOCK_MONOTONIC = 1
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+def _find_clock_gettime():
+    for name in [ctypes.util.find_library('rt'), ctypes.util.find_library('c')]:
+        if name is None:
+            continue
+        try:
+            function = ctypes.CDLL(name, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        function.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+        return function
+    return None
+
+_clock_gettime = _find_clock_gettime()
+
+def monotonic_time():
+    """
+    Return the time in seconds of a clock that is not affected by changes of the system time, or the system time if
+    there is no such clock.
+    """
+    if _clock_gettime is None:
+        return time.time()
+    t = _timespec()
+    if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return t.tv_sec + t.tv_nsec * 1e-9
+
+class FixedRateSchedule(object):
+    """
+    Deadlines of a periodic task.  Deadline n is n periods after the creation of the schedule, so the time spent in
+    the task does not delay the following deadlines.  If the task takes longer than a period, the deadlines that
+    have passed are skipped and counted as overruns.  The schedule can be shifted to follow the task of another
+    process, see method anchor.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.start = monotonic_time()
+        self.tick = 0
+        # number of deadlines skipped before the current one
+        self.missed = 0
+
+    def anchor(self, deadline):
+        """
+        Shift the schedule so that the current deadline is the given monotonic time.
+        """
+        self.start = deadline - self.tick * self.period
+
+    def deadline(self):
+        """
+        Return the monotonic time of the current deadline.
+        """
+        return self.start + self.tick * self.period
+
+    def sleep(self, event):
+        """
+        Wait on the given event until the next deadline.
+
+        :return: True if the event was set
+        """
+        self.tick += 1
+        late = monotonic_time() - (self.start + self.tick * self.period)
+        if late >= self.period:
+            self.missed = int(late / self.period)
+            self.tick += self.missed
+        else:
+            self.missed = 0
+        delay = self.start + self.tick * self.period - monotonic_time()
+        return event.wait(max(0.0, delay))
+
+class DomsetCore(Thread):
+
+    # if true, the sensor data, activity and temperature references are written to the log file
+    LOG_DATA = False
+
+    START_TEMPERATURE = 28.0
+    MIN_TEMPERATURE = 26
+    MAX_TEMPERATURE = 36
+
+    # seconds between reads of the CASU messages while waiting for the group
+    MESSAGE_POLL_PERIOD = 0.02
+
+    def __init__(self, rtc_file, log=False):
+
+        Thread.__init__(self)
+        self.stop = False
+
+        self.casu = casu.Casu(rtc_file,log=True)
+        # Parse rtc file name to get CASU id
+        # assumes casu-xxx.rtc file name format
+        self.casu_id = int(rtc_file[-7:-4])
+        self.group_neighbours = [name for name in self.casu._Casu__neighbors if self.is_group_neighbour(name)]
+        self.nbg_data_buffer = {}
+        self._is_master = 1 # master in CASU group calculates new temp ref
+        self.group_size = 1 # only counts the neighbours; have to add myself
+
+        for nb in [int(name[-3:]) for name in self.group_neighbours]:
+            self.group_size += 1
+            self.nbg_data_buffer[nb] = []
+            if nb < self.casu_id:
+                self._is_master = 0
+
+        print("CASU: " + str(self.casu_id) + ", group size: " + str(self.group_size))
+
+        # the group master does not change, so it is found once
+        if self._is_master == 0:
+            self.group_master_id, self.group_master = min([(int(name[-3:]), name) for name in self.group_neighbours])
+
+        # messages from the interface with another species
+        self.fish_info = []
+        self.turn_off_LED = False
+
+        self._Td = 0.1 # Sample time for sensor readings is 0.1 second
+        Ttemp = 5.0 # discretisation period
+        self._temp_control_freq = 1.0 / Ttemp # Sample frequency for temperature control in seconds is once in 5 seconds
+        # number of sensor readings in a temperature control period
+        self._samples_per_update = int(round(1 / (self._Td * self._temp_control_freq)))
+        self.time_start = time.time()
+        self.time_start_cool = self.time_start
+        self.time_start_heat = self.time_start
+        self._time_length = 1500.0 #1500.0
+        self._time_length_cool = self._time_length * 0.5
+        self._time_length_heat = self._time_length * 0.3333
+        self.t_prev = time.time()
+        self.stop_flag = Event()
+        # after this many seconds without group messages the update proceeds with the neighbours that did report,
+        # well below the control period so that a lost message or a dead CASU does not use up the round
+        self.message_timeout = Ttemp / 4
+        # slaves wait longer, as the group master may wait message_timeout for another slave before replying
+        self.reference_timeout = 2 * self.message_timeout
+        self.temp_ref = self.START_TEMPERATURE
+        self.temp_ref_old = self.START_TEMPERATURE
+
+        # sensor activity variables - denote bee presence
+        self._sensors_buf_len = 10 * Ttemp # last 2 sec? should be Ttemp/Td
+        self.activeSensors = RingBuffer(self._sensors_buf_len)
+        self.activeSensors.append(0)
+        self.ir_thresholds = [25000, 25000, 25000, 25000, 25000, 25000]
+        self.integrate_activity = 0.0
+        self.average_activity = 0.0
+        self.maximum_activity = 0.0
+        self.minimum_activity = 1.0
+        self.temp_ctrl = 0
+        self.initial_heating = 0
+        self.heat_float = 0.0
+        self.cool_float = 0.0
+        self.thres_cool = None
+        self.thres_heat = None
+
+        # constants for temperature control
+        self._integration_limit = 100.0
+        self._integrate_limit_lower = 10.0 / Ttemp
+        self._integrate_limit_upper = 20.0 / Ttemp
+        self._stop_initial_heating = 10
+        self._inflection_heat = 0.17
+        self._inflection_cool = 0.85
+        self._start_heat = 0.1
+        self._stop_heat = 0.7
+        self._start_cool = 0.2
+        self._stop_cool = 0.5
+        self._rho = 0.85
+        self._step_heat = 0.05
+        self._step_cool = 0.03
+        self._epsilon = 0.3
+
+        # Set up zeta logging
+        now_str = datetime.now().__str__().split('.')[0]
+        now_str = now_str.replace(' ','-').replace(':','-')
+        # rows are buffered in a binary log that is converted to the text log when the controller stops
+        self.logger = DomsetLog(now_str + '-' + self.casu.name() + '-domset.csv')
+
+        # if true, the infrared sensors are sampled in a separate thread so that the group messages do not delay them
+        self.sensing_thread = True
+        # monotonic time of the deadline of the current update, set by method run
+        self.round_deadline = None
+        # monotonic time the schedule of the group is anchored on after the current update, None to keep the schedule
+        self.reference_time = None
+        self._sensors_lock = Lock()
+        self._log_lock = Lock()
+        self.overruns = 0
+
+    # hooks
+
+    def is_group_neighbour(self, name):
+        """
+        Return True if the given neighbour is a CASU of the group.
+        """
+        return True
+
+    def is_interface_message(self, sender):
+        """
+        Return True if the given message sender is the interface with another species.
+        """
+        return False
+
+    def poll_interface(self):
+        """
+        Called every temperature control period when the CASU has no group.
+        """
+        pass
+
+    def interface_message(self, data):
+        """
+        Called with the data of each interface message received while waiting for the group messages.
+        """
+        self.fish_info.append(data)
+
+    def before_temperature_control(self):
+        """
+        Called by the group master before computing the temperature reference.
+        """
+        pass
+
+    def after_temperature_control(self):
+        """
+        Called by the group master after computing the temperature reference and before sending it.
+        """
+        pass
+
+    def encode_reference(self):
+        """
+        Return the message sent by the group master to the other CASUs.  Method update appends the timing of the master.
+        """
+        return json.dumps(self.temp_ref)
+
+    def decode_reference(self, data):
+        """
+        Process the message sent by the group master, without the timing of the master, and return the temperature reference.
+        """
+        return float(json.loads(data.split(';')[0]))
+
+    def pop_neighbour_data(self, nbg):
+        """
+        Remove and return a message of the given neighbour.  By default the most recent message is used.
+        """
+        return self.nbg_data_buffer[nbg].pop()
+
+    def cooling_step(self):
+        return self._step_cool
+
+    def on_start(self):
+        """
+        Called when the main loop starts.
+        """
+        pass
+
+    def on_update(self):
+        """
+        Called every temperature control period after method update.
+        """
+        pass
+
+    def on_stop(self):
+        """
+        Called when the main loop ends.
+        """
+        pass
+
+    def log(self, tag, *values):
+        if self.LOG_DATA:
+            with self._log_lock:
+                self.logger.writerow([tag, time.time()] + list(values))
+
+    # engine
+
+    def calibrate_ir_thresholds(self, margin = 500, duration = 10):
+        self.casu.set_diagnostic_led_rgb(r=1)
+
+        t_start = time.time()
+        ir_raw_buffers = [[0],[0],[0],[0],[0],[0]]
+        while time.time() - t_start < duration:
+            ir_raw = self.casu.get_ir_raw_value(casu.ARRAY)
+            for (val, buff) in zip(ir_raw, ir_raw_buffers):
+                buff.append(val)
+            time.sleep(0.1)
+
+        self.ir_thresholds = [max(buff)+margin for buff in ir_raw_buffers]
+        print(self.casu.name(), self.ir_thresholds)
+        self.log('IRT', *self.ir_thresholds)
+
+        self.casu.diagnostic_led_standby()
+
+    def initial_wait(self, duration = 60):
+        self.casu.set_diagnostic_led_rgb(r = 1, g = 1, b = 1)
+
+        t_start = time.time()
+
+        while time.time() - t_start < duration:
+            time.sleep(0.1)
+
+        self.casu.diagnostic_led_standby()
+
+    def initialize_temperature(self):
+
+        self.casu.set_temp(self.temp_ref)
+
+    def update(self):
+
+        self.t_prev = time.time()
+
+        # calculate local ir sensor activity over time
+        self.calculate_self_average_activity()
+        if self.group_size == 1:
+            self.poll_interface()
+        if self._is_master:
+            if self.group_size > 1:
+                # receive group ir readings, until we have at least one message from each neighbour
+                if self.wait_messages(lambda: all(self.nbg_data_buffer.values())):
+                    self.reference_time = monotonic_time()
+                else:
+                    # the timeout does not shift the schedule of the group
+                    self.reference_time = self.round_deadline
+                    missing = [nbg for nbg in self.nbg_data_buffer if not self.nbg_data_buffer[nbg]]
+                    print("[W] casu-{:03} no activity from casus {} after {}s, updating without them".format(self.casu_id, missing, self.message_timeout))
+            # calculate cumulative sensor activity of a group --> temperature control
+            self.before_temperature_control()
+            self.calculate_sensor_activity()
+            self.calculate_temp_ref()
+            self.after_temperature_control()
+            if self.group_size > 1:
+                # the slaves anchor their schedule on the time of the master, sent as its age as the clocks differ
+                age = 0.0 if self.reference_time is None else monotonic_time() - self.reference_time
+                message = '{};{:.4f}'.format(self.encode_reference(), age)
+                for nbg in self.group_neighbours:
+                    self.casu.send_message(nbg, message)
+
+        else:
+            # a reference that arrived after the previous wait timed out belongs to a round of the master that this
+            # CASU missed, so it is out of phase and waits for the next round of the master to anchor on it
+            self.read_messages()
+            timeout = self.reference_timeout
+            if self.nbg_data_buffer[self.group_master_id]:
+                del self.nbg_data_buffer[self.group_master_id][:]
+                timeout += self._Td * self._samples_per_update
+            # send self ir readings to group master
+            self.casu.send_message(self.group_master,json.dumps(self.average_activity))
+            # wait for new temp reference from group master
+            if self.wait_messages(lambda: len(self.nbg_data_buffer[self.group_master_id]) > 0, timeout):
+                data, age = self.pop_neighbour_data(self.group_master_id).rsplit(';', 1)
+                t_ref = self.decode_reference(data)
+                self.reference_time = monotonic_time() - float(age)
+            else:
+                # keep the current reference
+                print("[W] casu-{:03} no temperature reference from casu-{:03} after {}s, keeping {}".format(self.casu_id, self.group_master_id, timeout, self.temp_ref))
+                t_ref = self.temp_ref
+            self.temp_ref_old = self.temp_ref
+            self.temp_ref = t_ref
+
+        # Set temperature reference
+        if not (self.temp_ref_old == self.temp_ref):
+            self.log('CT', self.temp_ref)
+            self.casu.set_temp(self.temp_ref)
+
+    def wait_messages(self, done, timeout=None):
+        """
+        Read and dispatch messages until function done returns true or the timeout expires.
+        The CASU API has no blocking read, so while there are no messages the thread sleeps on the stop flag.
+
+        :param timeout: seconds to wait, by default attribute message_timeout
+        :return: the value of done
+        """
+        deadline = monotonic_time() + (self.message_timeout if timeout is None else timeout)
+        while not done():
+            msg = self.casu.read_message()
+            if msg:
+                self.dispatch_message(msg)
+            elif self.stop_flag.wait(self.MESSAGE_POLL_PERIOD) or self.stop:
+                return done()
+            if monotonic_time() >= deadline:
+                return done()
+        return True
+
+    def read_messages(self):
+        """
+        Dispatch the messages that have arrived, without waiting.  Reading stops after MESSAGE_POLL_PERIOD seconds
+        if messages keep arriving.
+        """
+        deadline = monotonic_time() + self.MESSAGE_POLL_PERIOD
+        msg = self.casu.read_message()
+        while msg:
+            self.dispatch_message(msg)
+            if monotonic_time() >= deadline:
+                return
+            msg = self.casu.read_message()
+
+    def dispatch_message(self, msg):
+        if self.is_interface_message(msg['sender']):
+            self.interface_message(msg['data'])
+        else:
+            nbg_id = int(msg['sender'][-3:])
+            self.nbg_data_buffer[nbg_id].append(msg['data'])
+
+    def run(self):
+        # sample the sensors every Td and call update every temperature control period, on a fixed rate schedule.
+        # The master shifts its schedule to the end of the group exchange when the activity of all slaves has arrived,
+        # and keeps it if the exchange timed out.  The slaves shift their schedule to the one of the master, sent with
+        # the reference.  So the group stays aligned and the master does not wait for the activity of the slaves.
+        self.time_start = time.time()
+        self.time_start_cool = self.time_start
+        self.time_start_heat = self.time_start
+        self.on_start()
+        self.time_index = 1
+        if self.sensing_thread:
+            sensing = Thread(target=self.sense)
+            sensing.daemon = True
+            sensing.start()
+            period = self._Td * self._samples_per_update
+            samples_per_update = 1
+        else:
+            period = self._Td
+            samples_per_update = self._samples_per_update
+        schedule = FixedRateSchedule(period)
+        schedule_start = schedule.start
+        next_update = samples_per_update
+        while monotonic_time() - schedule_start < self._time_length and not self.stop:
+            if schedule.sleep(self.stop_flag) or self.stop:
+                break
+            self.record_overruns(schedule)
+            if monotonic_time() - schedule_start >= self.time_index * 100:
+                print("[casu-{:03}] {}s elapsed".format(self.casu_id, self.time_index * 100))
+                self.time_index += 1
+            if not self.sensing_thread:
+                self.update_activeSensors_estimate()
+            if schedule.tick >= next_update:
+                self.round_deadline = schedule.deadline()
+                self.reference_time = None
+                self.update()
+                self.on_update()
+                if self.reference_time is not None:
+                    schedule.anchor(self.reference_time)
+                next_update = (schedule.tick // samples_per_update + 1) * samples_per_update
+        if self.sensing_thread:
+            self.stop = True
+            sensing.join()
+        self.on_stop()
+        self.logger.close()
+        print("Done, {} overruns".format(self.overruns))
+
+    def sense(self):
+        """
+        Sample the sensors every Td until the controller stops.  Runs in a separate thread if attribute sensing_thread is true.
+        """
+        schedule = FixedRateSchedule(self._Td)
+        while not self.stop and not schedule.sleep(self.stop_flag):
+            self.record_overruns(schedule)
+            self.update_activeSensors_estimate()
+
+    def record_overruns(self, schedule):
+        if schedule.missed > 0:
+            self.overruns += schedule.missed
+            self.log('OR', schedule.missed * schedule.period)
+
+    def update_activeSensors_estimate(self):
+        """
+        Bee density estimator.
+        """
+        activeSensors_current = [x>t for (x,t) in zip(self.casu.get_ir_raw_value(casu.ARRAY), self.ir_thresholds) if x < 65535]
+        if len(activeSensors_current) > 0:
+            activeSensors_current_percentage = sum(activeSensors_current) / float(len(activeSensors_current))
+        else:
+            activeSensors_current_percentage = -1
+        with self._sensors_lock:
+            self.activeSensors.append(activeSensors_current_percentage)
+        self.log('CAS', *activeSensors_current)
+
+    def calculate_self_average_activity(self):
+        with self._sensors_lock:
+            mean = self.activeSensors.mean()
+        if mean is not None:
+            self.average_activity = mean
+            self.maximum_activity = self.average_activity
+            self.minimum_activity = self.average_activity
+        else:
+            self.average_activity = -1
+            self.maximum_activity = 0
+            self.minimum_activity = 1
+        self.log('CAC', self.average_activity)
+
+    def calculate_sensor_activity(self):
+        group_functional = self.group_size
+
+        if self.average_activity == -1:
+            self.average_activity = 0
+            self.maximum_activity = 0
+            self.minimum_activity = 1
+            group_functional -= 1
+
+        for nbg in self.nbg_data_buffer:
+            try:
+                data = self.pop_neighbour_data(nbg)
+            except IndexError:
+                print('casu ' + str(self.casu_id) + ' EMPTY LIST')
+                data = '-1'
+            tmp = json.loads(data.split(';')[0])
+            if not (tmp == -1):
+                self.average_activity += tmp
+                if self.maximum_activity < tmp:
+                    self.maximum_activity = tmp
+                if self.minimum_activity > tmp:
+                    self.minimum_activity = tmp
+            else:
+                group_functional -= 1
+
+        if self.integrate_activity < self._integration_limit:
+            self.integrate_activity += self.average_activity
+        if group_functional > 0:
+            self.average_activity /= group_functional
+        self.log('NAC', self.average_activity)
+
+    def calculate_temp_ref(self):
+        """
+        Dominating set temperature control based on sensor activity of CASU group
+        """
+        # directly from matlab. Should rewrite clearer
+        if (self.integrate_activity > self._integrate_limit_lower) and (self.temp_ctrl < self._stop_initial_heating):
+            self.temp_ctrl += 1
+        self.initial_heating = 1
+        if (self.integrate_activity < self._integrate_limit_lower) or (self.integrate_activity > self._integrate_limit_upper) or (self.temp_ctrl >= self._stop_initial_heating) :
+            self.initial_heating = 0
+
+        i_n_cool = ((self.t_prev - self.time_start_cool) / self._time_length_cool)
+        i_n_heat = ((self.t_prev - self.time_start_heat) / self._time_length_heat)
+        if i_n_cool >= 1:
+            i_n_cool = 0.99
+        if i_n_heat >= 1:
+            i_n_heat = 0.99
+        progress = 1.0 - 1.0 / (1.0 - i_n_heat)
+        progress_heat = 1 - exp(self._inflection_heat * progress)
+        progress = 1.0 - 1.0 / (1.0 - i_n_cool)
+        progress_cool = 1 - exp(self._inflection_cool * progress)
+        scaling_heat = (1.0 - progress_heat) * self._start_heat + progress_heat * self._stop_heat
+        scaling_cool = (1.0 - progress_cool) * self._start_cool + progress_cool * self._stop_cool
+
+        self.cool_float = (1.0 - self._rho) * self.cool_float
+        if (self.maximum_activity < scaling_cool) and (self.temp_ctrl > 0):
+            self.cool_float += self._rho * 1.0
+        if self.cool_float > 0.5:
+            cool = 1.0
+        else:
+            cool = 0.0
+
+        self.heat_float = (1 - self._rho) * self.heat_float
+        if (self.average_activity > scaling_heat) and (self.temp_ctrl > 0) and (cool == 0.0):
+             self.heat_float += self._rho * 1.0
+        if (self.heat_float > 0.5) and (cool == 0.0):
+            heat = 1.0
+        else:
+            heat = 0.0
+
+        d_t_ref = 0.0
+        if heat == 1.0:
+            d_t_ref = self._step_heat * self.group_size
+        if cool == 1.0:
+            d_t_ref = - self.cooling_step()
+        if d_t_ref > 0.5:
+            d_t_ref = 0.5
+
+        self.temp_ref_old = self.temp_ref
+        self.temp_ref = self.temp_ref + d_t_ref
+        if self.temp_ref > self.MAX_TEMPERATURE:
+            self.temp_ref = self.MAX_TEMPERATURE
+        if self.temp_ref < self.MIN_TEMPERATURE:
+            self.temp_ref = self.MIN_TEMPERATURE
+        self.log('NT', self.temp_ref)
+
+        # thresholds used in this period, reported to the interface by some controllers
+        self.thres_cool = scaling_cool
+        self.thres_heat = scaling_heat
+
+class InterfaceMixin(object):
+    """
+    Interface with another species.  The group master reports the group activity and the temperature reference to
+    the interface every temperature control period.
+    """
+
+    INTERFACE_ADDRESS = 'cats'
+
+    def poll_interface(self):
+        msg = self.casu.read_message()
+        if msg:
+            if self.is_interface_message(msg['sender']):
+                self.interface_message(msg['data'])
+
+    def interface_payload(self):
+        return json.dumps({'max':self.maximum_activity,
+            'avg':self.average_activity, 'min':self.minimum_activity, 'tref':self.temp_ref} )
+
+    def communicate(self):
+        if self._is_master:
+            self.casu.send_message(self.INTERFACE_ADDRESS, self.interface_payload())
+
+class AirflowMixin(object):
+    """
+    Airflow policy.  The group master starts blowing when the minimum activity of the group has been low for some
+    temperature control periods, or when the interface asks for it, and sends the blow duration to the other CASUs
+    of the group with the temperature reference.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AirflowMixin, self).__init__(*args, **kwargs)
+        self.blow = 0.0
+        self.blow_prev = 0.0
+        self.start_blow = None
+        self.integrate_minimum_activity = 0.0
+
+        self._blow_allowed_start = 5 * 60.0 # no blow first 5 min
+        self._blow_allowed_stop = 1500.0 - 10 * 60.0 # no blowing in last n minutes
+        self._scaling_blow = 0.2 # 1 sensor active (0.16.) is not enough to stay in the domset
+        self._integrate_min_windup = 100
+        self._blow_start_condition = 12 # n x Td seconds minimum activity below threshold before we start blowing
+        self._default_blow_duration = 180.0
+
+    def encode_reference(self):
+        return json.dumps({'t_ref':self.temp_ref, 'blow':self.blow})
+
+    def decode_reference(self, data):
+        tmp = json.loads(data)
+        self.blow = float(tmp['blow'])
+        return float(tmp['t_ref'])
+
+    def on_stop(self):
+        self.casu.airflow_standby()
+
+    def airflow_control(self):
+        if self.blow > 0.0:
+            if self.blow_prev == 0.0:
+                self.start_blow = time.time()
+                self.log('CAF', 1)
+                self.casu.set_airflow_intensity(1)
+                if self.casu_id == 20:
+                    print("Actually starts blowing")
+            else:
+                time_now = time.time()
+                if (time_now - self.start_blow) > self.blow:
+                    self.log('CAF', 0)
+                    self.casu.airflow_standby()
+                    self.blow = 0.0
+                    self.integrate_minimum_activity = 0
+                    if self.casu_id == 20:
+                        print("Stop blowing, timeout!")
+        else:
+            if not (self.blow_prev == 0.0):
+                self.log('CAF', 0)
+                self.casu.airflow_standby()
+                self.integrate_minimum_activity = 0
+        self.blow_prev = self.blow
+
+    def calculate_blow_ref(self):
+        time_now = time.time()
+        if (time_now - self.time_start > self._blow_allowed_start) and (time_now - self.time_start < self._blow_allowed_stop):
+            if self.blow == 0.0:
+                if self.integrate_minimum_activity < self._integrate_min_windup:
+                    if self.minimum_activity < self._scaling_blow:
+                        self.integrate_minimum_activity += 1
+                        if self.casu_id == 20:
+                            print("Integrating activity " + str(self.integrate_minimum_activity))
+                    else:
+                        self.integrate_minimum_activity = 0
+                if self.integrate_minimum_activity >= self._blow_start_condition:
+                    self.blow = self._default_blow_duration
+                    if self.casu_id == 20:
+                        print("Integration over, setpoint blowing " + str(self.integrate_minimum_activity))
@@ -44,7 +44,8 @@ def create_background_video (args, run_folder):
         cfg ['video']['crop_left'],
         cfg ['video']['crop_right'],
         cfg ['video']['crop_top'],
-        cfg ['video']['crop_bottom'])
+        cfg ['video']['crop_bottom'],
+        **util.recording_options (cfg ['video']))
     process_recording.wait ()
 
 
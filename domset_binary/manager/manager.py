@@ -113,7 +113,8 @@ def main_operations (args, cfg, lwsg):
         cfg ['video']['crop_left'],
         cfg ['video']['crop_right'],
         cfg ['video']['crop_top'],
-        cfg ['video']['crop_bottom'])
+        cfg ['video']['crop_bottom'],
+        **util.recording_options (cfg ['video']))
     reply_start_command_from_workers (dws)
     try:
         process_recording.wait ()
@@ -242,7 +243,8 @@ def create_background_video (cfg, run_folder):
         cfg ['video']['crop_left'],
         cfg ['video']['crop_right'],
         cfg ['video']['crop_top'],
-        cfg ['video']['crop_bottom'])
+        cfg ['video']['crop_bottom'],
+        **util.recording_options (cfg ['video']))
     process_recording.wait ()
 
 def run_command_deploy (config, workers):
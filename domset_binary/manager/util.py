@@ -1,3 +1,4 @@
+import os.path
 import subprocess
 
 def find_app (app):
@@ -16,7 +17,45 @@ XTERM = find_app ('xterm')
 CAMERA_RESOLUTION_X = 2048
 CAMERA_RESOLUTION_Y = 2048
 
-def record_video_gstreamer (video_filename, number_frames, frames_per_second, crop_left, crop_right, crop_top, crop_bottom, debug = True):
+# recording profiles, the same as in module util.video of the repository root
+PROFILE_FULL = 'full'
+PROFILE_PREVIEW = 'preview'
+PROFILE_REDUCED = 'reduced'
+RECORDING_PROFILES = [PROFILE_FULL, PROFILE_PREVIEW, PROFILE_REDUCED]
+
+DEFAULT_SCALE = 0.5
+
+def recording_options (video_config):
+    """
+    Return the recording profile options given in the video section of the configuration file, as keyword arguments
+    of function record_video_gstreamer.
+    """
+    return {
+        'profile' : video_config.get ('profile', PROFILE_FULL),
+        'scale' : video_config.get ('scale', DEFAULT_SCALE),
+        'greyscale' : video_config.get ('greyscale', True),
+    }
+
+def preview_filename (video_filename):
+    base, extension = os.path.splitext (video_filename)
+    return base + '-preview' + extension
+
+def record_video_gstreamer (video_filename, number_frames, frames_per_second, crop_left, crop_right, crop_top, crop_bottom, debug = True, profile = PROFILE_FULL, scale = DEFAULT_SCALE, greyscale = True):
+    if profile not in RECORDING_PROFILES:
+        raise ValueError ('unknown recording profile {}'.format (profile))
+    width = CAMERA_RESOLUTION_X - crop_right - crop_left
+    height = CAMERA_RESOLUTION_Y - crop_top - crop_bottom
+    scaled_width = max (2, 2 * int (round (width * scale / 2.0)))
+    scaled_height = max (2, 2 * int (round (height * scale / 2.0)))
+    scaler = [
+        'videoscale', '!',
+        'video/x-raw-yuv,', 'width=%d,' % (scaled_width), 'height=%d' % (scaled_height), '!',
+        ] + (['videobalance', 'saturation=0.0', '!'] if greyscale else [])
+    encoder = [
+        'jpegenc', '!',
+        'avimux', 'name=mux', '!',
+        'filesink', 'location=%s' % (video_filename)
+        ]
     command =  [
         GST_LAUNCH,
         '--gst-plugin-path=/usr/local/lib/gstreamer-0.10/',
@@ -27,14 +66,22 @@ def record_video_gstreamer (video_filename, number_frames, frames_per_second, cr
         #'video/x-raw-yuv,width=2048,height=2048,framerate=%d/1' % (frames_per_second), '!',
         'video/x-raw-yuv,', 'width=2048,', 'height=2048,', 'framerate=%d/1' % (frames_per_second), '!',
         'videocrop', 'left=%d' % (crop_left), 'right=%d' % (crop_right), 'top=%d' % (crop_top), 'bottom=%d' % (crop_bottom), '!',
-        'jpegenc', '!',
-        'avimux', 'name=mux', '!',
-        'filesink', 'location=%s' % (video_filename)
         ]
+    if profile == PROFILE_FULL:
+        command += encoder
+    elif profile == PROFILE_PREVIEW:
+        command += ['tee', 'name=t', '!', 'queue', '!'] + encoder + ['t.', '!', 'queue', '!'] + scaler + [
+            'jpegenc', '!',
+            'avimux', 'name=preview', '!',
+            'filesink', 'location=%s' % (preview_filename (video_filename))
+            ]
+    elif profile == PROFILE_REDUCED:
+        command += scaler + encoder
     if debug:
         print
         print ('Recording a video with %d frames at %d frames per second.' % (number_frames, frames_per_second))
-        print ('Frame resolution is %dx%d.' % (CAMERA_RESOLUTION_X - crop_right - crop_left, CAMERA_RESOLUTION_Y - crop_top - crop_bottom))
+        print ('Frame resolution is %dx%d.' % (width, height))
+        print ('Recording profile is %s.' % (profile))
         print ('Full command is:')
         print (' '.join (command))
         print
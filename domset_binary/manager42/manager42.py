@@ -11,10 +11,14 @@ import zmq
 
 import assisipy_utils.darc.manager
 
+import domset_binary.controllers.domset_core
 import domset_binary.controllers.domset_fish_airflow
+import domset_binary.util.domset_log
+import domset_binary.util.ring_buffer
 import domset_binary.util.video_sync
 import domset_binary.util.zmq_sock_utils
 import util.app
+import util.live_count
 import util.video
 
 TEST_DURATION = 5 # duration of a test run in minutes
@@ -92,7 +96,8 @@ class InterSpecies_DOMSET_Manager (assisipy_utils.darc.manager.DARC_Manager):
             self.isdm_config ['video'] ['crop_left'],
             self.isdm_config ['video'] ['crop_right'],
             self.isdm_config ['video'] ['crop_top'],
-            self.isdm_config ['video'] ['crop_bottom'])
+            self.isdm_config ['video'] ['crop_bottom'],
+            **util.video.recording_options (self.isdm_config ['video']))
 
     def IR_calibration_step (self):
         """
@@ -119,6 +124,8 @@ class InterSpecies_DOMSET_Manager (assisipy_utils.darc.manager.DARC_Manager):
             experiment_duration = TEST_DURATION
         else:
             experiment_duration = self.isdm_config ['experiment_duration'] + domset_binary.util.video_sync.LENGTH
+        # prepared before the start command so that recording starts with the synchronisation flashes
+        live_stage = util.live_count.create_live_stage (self.isdm_config ['video'], self.experiment_folder)
         self.process_ISI = self.run_ISI ()
         self._send_message_domset_casus (
             message = [domset_binary.controllers.domset_fish_airflow.START],
@@ -133,7 +140,9 @@ class InterSpecies_DOMSET_Manager (assisipy_utils.darc.manager.DARC_Manager):
             self.isdm_config ['video'] ['crop_left'],
             self.isdm_config ['video'] ['crop_right'],
             self.isdm_config ['video'] ['crop_top'],
-            self.isdm_config ['video'] ['crop_bottom']
+            self.isdm_config ['video'] ['crop_bottom'],
+            live_stage = live_stage,
+            **util.video.recording_options (self.isdm_config ['video'])
         )
         self._recv_message_domset_casus ()
 
@@ -160,7 +169,8 @@ class InterSpecies_DOMSET_Manager (assisipy_utils.darc.manager.DARC_Manager):
             print ('Full ISI command is:')
             print (' '.join (command))
             print ()
-        return subprocess.Popen (command)
+        # the ISI must not inherit the pipes of the recording process
+        return subprocess.Popen (command, close_fds = True)
 
     def terminate_processes (self):
         print ('\n* ** Termination step ** *')
@@ -191,7 +201,10 @@ def create_DARC_config_file (experiment_folder, project_name, list_casus, node_C
             'domset': {
                 'main': check_file (domset_binary.controllers.domset_fish_airflow.__file__),
                 'extra': [
-                    check_file (domset_binary.util.zmq_sock_utils.__file__)
+                    check_file (domset_binary.util.zmq_sock_utils.__file__),
+                    check_file (domset_binary.util.ring_buffer.__file__),
+                    check_file (domset_binary.util.domset_log.__file__),
+                    check_file (domset_binary.controllers.domset_core.__file__)
                 ],
                 'args': [],
                 'results': [],
@@ -258,7 +271,8 @@ def create_background_video (cfg, run_folder):
         cfg ['video']['crop_left'],
         cfg ['video']['crop_right'],
         cfg ['video']['crop_top'],
-        cfg ['video']['crop_bottom'])
+        cfg ['video']['crop_bottom'],
+        **util.video.recording_options (cfg ['video']))
 
 def process_arguments ():
     parser = argparse.ArgumentParser (
@@ -7,6 +7,7 @@ import zmq
 import assisipy_utils.darc.manager
 
 import airflow_test_4_worker
+from domset_binary.util import ring_buffer
 from domset_binary.util import zmq_sock_utils
 import domset_binary.manager.util
 import util.video
@@ -103,7 +104,8 @@ def create_DARC_config_file (list_casus):
             'domset': {
                 'main': check_file (airflow_test_4_worker.__file__),
                 'extra': [
-                    check_file (zmq_sock_utils.__file__)
+                    check_file (zmq_sock_utils.__file__),
+                    check_file (ring_buffer.__file__)
                 ],
                 'args': [],
                 'results': [],
@@ -13,6 +13,11 @@ import zmq
 import csv
 from math import exp
 
+try:
+    from ring_buffer import RingBuffer
+except ImportError:
+    from domset_binary.util.ring_buffer import RingBuffer
+
 START_LEAF = 1
 START_CORE = 2
 INITIALIZE = 3
@@ -85,8 +90,9 @@ class DomsetController:
         self.blow_prev = 0.0
 
         # sensor activity variables - denote bee presence
-        self.activeSensors = [0.0]
         self._sensors_buf_len = 10 * Ttemp # last 2 sec? should be Ttemp/Td
+        self.activeSensors = RingBuffer(self._sensors_buf_len)
+        self.activeSensors.append(0)
         self.ir_thresholds = [25000, 25000, 25000, 25000, 25000, 25000]
         self.integrate_activity = 0.0
         self.average_activity = 0.0
@@ -392,22 +398,14 @@ class DomsetController:
             self.activeSensors.append(activeSensors_current_percentage)
         else:
             self.activeSensors.append(-1)
-        if len(self.activeSensors) > self._sensors_buf_len:
-            self.activeSensors.pop(0)
         self.logger.writerow (["CAS", time.time ()] + activeSensors_current)
 
     def calculate_self_average_activity(self):
-        activeSensors = [x for x in self.activeSensors if x >= 0]
-        try:
-            if len(activeSensors) > 0:
-                self.average_activity = sum(activeSensors) / float(len(activeSensors))
-                self.maximum_activity = self.average_activity
-                self.minimum_activity = self.average_activity
-            else:
-                self.average_activity = -1
-                self.maximum_activity = 0
-                self.minimum_activity = 1
-        except:
+        if self.activeSensors.count > 0:
+            self.average_activity = self.activeSensors.mean()
+            self.maximum_activity = self.average_activity
+            self.minimum_activity = self.average_activity
+        else:
             self.average_activity = -1
             self.maximum_activity = 0
             self.minimum_activity = 1
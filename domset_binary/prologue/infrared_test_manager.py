@@ -53,7 +53,8 @@ class Infrared_Test_Manager (assisipy_utils.darc.manager.DARC_Manager):
             self.atm_config ['video']['crop_left'],
             self.atm_config ['video']['crop_right'],
             self.atm_config ['video']['crop_top'],
-            self.atm_config ['video']['crop_bottom'])
+            self.atm_config ['video']['crop_bottom'],
+            **util.video.recording_options (self.atm_config ['video']))
         # tell the user to put bees
         print ('Put bees in the arena and press ENTER')
         raw_input ('> ')
@@ -68,7 +69,8 @@ class Infrared_Test_Manager (assisipy_utils.darc.manager.DARC_Manager):
             self.atm_config ['video']['crop_right'],
             self.atm_config ['video']['crop_top'],
             self.atm_config ['video']['crop_bottom'],
-            async = True)
+            async = True,
+            **util.video.recording_options (self.atm_config ['video']))
         # tell each arena to do the temperature profile
         self.atm_config ['parameters'][0] = infrared_test_worker.START
         for a in self.atm_config ['arenas']:
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Buffered binary log of the DOMSET controllers.
+
+The controllers write a log row every 0.1 seconds.  Formatting the rows as
+text and writing them to the SD card of the BeagleBone in the control loop
+delays the loop.  Instead, rows are packed in fixed size binary records in a
+preallocated buffer.  Full buffers, and the current buffer every flush
+period, are written to the binary log file by a background thread.
+
+When the log is closed, the binary log is converted to the `;` separated
+text log read by module analysis/casu_domset_log.py and deleted.  The conversion can
+also be done by running this module with the names of the binary logs, for
+instance if a controller did not stop properly.
+
+A record has a tag, the time, and up to six values.  Each value is stored as
+a double together with its kind, so that integers, booleans and None are
+written back as csv.writer writes them.
+
+This module is deployed next to the controllers, which import it as a top
+level module.
+"""
+
+import argparse
+import csv
+import os
+import os.path
+import Queue
+import struct
+import threading
+import time
+
+# tags of the DOMSET log, in the same order as in module casu_domset_log
+TAGS = ['CT', 'CAF', 'CAC', 'NAC', 'CAS', 'NT', 'ZT', 'IRT', 'TH_HEAT', 'TH_COOL', 'TH_MIN', 'OR']
+
+MAX_VALUES = 6
+
+# kinds of values
+FLOAT = 0
+INT = 1
+BOOL = 2
+NONE = 3
+
+# tag index, number of values, kinds of values, time and values
+RECORD = struct.Struct('<BB{0}Bd{0}d'.format(MAX_VALUES))
+
+BINARY_EXTENSION = '.bin'
+TEXT_EXTENSION = '.csv'
+
+_TAG_INDEXES = dict([(tag, index) for index, tag in enumerate(TAGS)])
+_PADDING = [0.0] * MAX_VALUES
+
+class DomsetLog(object):
+    """
+    Binary log with the interface of a csv.writer.  Method writerow is not thread safe, callers must serialise it.
+    """
+
+    def __init__(self, filename, records_per_buffer = 1024, flush_period = 10.0):
+        """
+        :param filename: the name of the text log, the binary log has the same name with extension .bin
+        :param flush_period: maximum time in seconds a row stays in memory
+        """
+        self.filename = filename
+        self.binary_filename = os.path.splitext(filename)[0] + BINARY_EXTENSION
+        self.records_per_buffer = records_per_buffer
+        self.flush_period = flush_period
+        self.__fd = open(self.binary_filename, 'wb')
+        self.__free = Queue.Queue()
+        self.__full = Queue.Queue()
+        for _ in range(2):
+            self.__free.put(bytearray(RECORD.size * records_per_buffer))
+        self.__buffer = self.__free.get()
+        self.__count = 0
+        self.__flush_time = time.time() + flush_period
+        self.__writer = threading.Thread(target=self.__write_buffers)
+        self.__writer.daemon = True
+        self.__writer.start()
+
+    def writerow(self, row):
+        """
+        Append a row with a tag, the time and at most six values.
+        """
+        tag, timestamp = row[0], row[1]
+        values = row[2:]
+        if len(values) > MAX_VALUES:
+            raise ValueError('DOMSET log row with more than {} values: {}'.format(MAX_VALUES, row))
+        if tag not in _TAG_INDEXES:
+            raise ValueError('unknown DOMSET log tag: {}'.format(row))
+        kinds = [_kind(value) for value in values]
+        numbers = [0.0 if value is None else float(value) for value in values]
+        RECORD.pack_into(
+            self.__buffer, self.__count * RECORD.size,
+            _TAG_INDEXES[tag], len(values),
+            *(kinds + _PADDING[len(kinds):] + [timestamp] + numbers + _PADDING[len(numbers):]))
+        self.__count += 1
+        if self.__count == self.records_per_buffer or timestamp >= self.__flush_time:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the current buffer to the background thread.
+        """
+        if self.__count > 0:
+            self.__full.put((self.__buffer, self.__count))
+            try:
+                self.__buffer = self.__free.get_nowait()
+            except Queue.Empty:
+                # the background thread is behind, do not wait for it
+                self.__buffer = bytearray(RECORD.size * self.records_per_buffer)
+            self.__count = 0
+        self.__flush_time = time.time() + self.flush_period
+
+    def close(self, convert_log = True):
+        """
+        Write the remaining rows and, by default, convert the binary log to the text log and delete the binary log.
+        """
+        self.flush()
+        self.__full.put((None, 0))
+        self.__writer.join()
+        self.__fd.close()
+        if convert_log:
+            convert(self.binary_filename, self.filename)
+            os.remove(self.binary_filename)
+
+    def __write_buffers(self):
+        while True:
+            data, count = self.__full.get()
+            if data is None:
+                return
+            self.__fd.write(buffer(data, 0, count * RECORD.size))
+            self.__fd.flush()
+            self.__free.put(data)
+
+def _kind(value):
+    if value is None:
+        return NONE
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, (int, long)):
+        return INT
+    return FLOAT
+
+_DECODERS = {
+    FLOAT : float,
+    INT : int,
+    BOOL : bool,
+    NONE : lambda number: None,
+}
+
+def read(binary_filename):
+    """
+    Iterate over the rows of a binary log.  Rows have the values given to method DomsetLog.writerow.
+    """
+    with open(binary_filename, 'rb') as fd:
+        while True:
+            data = fd.read(RECORD.size * 1024)
+            # an incomplete record at the end of the file was being written when the controller stopped
+            for offset in range(0, len(data) - RECORD.size + 1, RECORD.size):
+                fields = RECORD.unpack_from(data, offset)
+                count = fields[1]
+                kinds = fields[2:2 + count]
+                numbers = fields[3 + MAX_VALUES:3 + MAX_VALUES + count]
+                yield [TAGS[fields[0]], fields[2 + MAX_VALUES]] + [_DECODERS[k](n) for (k, n) in zip(kinds, numbers)]
+            if len(data) < RECORD.size * 1024:
+                return
+
+def convert(binary_filename, filename = None):
+    """
+    Convert a binary log to the text log.  By default the text log has the name of the binary log with extension .csv.
+    """
+    if filename is None:
+        filename = os.path.splitext(binary_filename)[0] + TEXT_EXTENSION
+    with open(filename, 'wb') as fd:
+        writer = csv.writer(fd, delimiter=';')
+        for row in read(binary_filename):
+            writer.writerow(row)
+    return filename
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser (
+        description = 'Convert binary DOMSET logs to the text logs read by the analysis scripts.'
+    )
+    parser.add_argument (
+        'binary_logs',
+        metavar = 'FILE',
+        nargs = '+',
+        help = 'binary DOMSET log'
+    )
+    args = parser.parse_args ()
+    for a_filename in args.binary_logs:
+        print ('[I] converted {} to {}'.format (a_filename, convert (a_filename)))
@@ -176,7 +176,10 @@ class AbstractGenerator:
                     'casus': self.__used_casus (),
                     'extra': [
                         '/home/assisi/assisi/pedro/assisi-domset-experiments/controllers/domset_interspecies.py',
-                        '/home/assisi/assisi/pedro/assisi-domset-experiments/manager/zmq_sock_utils.py'
+                        '/home/assisi/assisi/pedro/assisi-domset-experiments/manager/zmq_sock_utils.py',
+                        '/home/assisi/assisi/pedro/assisi-domset-experiments/util/ring_buffer.py',
+                        '/home/assisi/assisi/pedro/assisi-domset-experiments/util/domset_log.py',
+                        '/home/assisi/assisi/pedro/assisi-domset-experiments/controllers/domset_core.py'
                         ],
                     'main': '/home/assisi/assisi/pedro/assisi-domset-experiments/manager/workers.py',
                     'results': []
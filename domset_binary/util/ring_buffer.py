@@ -0,0 +1,84 @@
+"""
+Fixed size history of the active sensors estimate of a CASU controller.
+
+The controllers sample the percentage of active infrared sensors every 0.1
+seconds and use the mean of the last samples every temperature control
+period.  A sample is invalid, for instance when all sensors are saturated,
+if it is negative.  Invalid samples take a place in the history but are
+ignored by the statistics.
+
+Samples are stored in a preallocated array.  The sum and the number of valid
+samples are updated when a sample is added, and two monotonic queues keep
+the minimum and the maximum, so every operation takes constant amortised
+time.
+
+This module is deployed next to the controllers, which import it as a top
+level module.
+"""
+
+import array
+import collections
+
+class RingBuffer (object):
+    def __init__ (self, size):
+        """
+        :param size: number of samples kept
+        """
+        self.size = int (size)
+        self.count = 0
+        self.__samples = array.array ('d', [0.0] * self.size)
+        self.__number_samples = 0
+        self.__sum = 0.0
+        # indexes of the valid samples that may still be the minimum or the maximum
+        self.__minimum = collections.deque ()
+        self.__maximum = collections.deque ()
+
+    def __len__ (self):
+        return min (self.__number_samples, self.size)
+
+    def append (self, value):
+        """
+        Add a sample, discarding the oldest one if the buffer is full.
+        """
+        index = self.__number_samples
+        position = index % self.size
+        if index >= self.size:
+            oldest = self.__samples [position]
+            if oldest >= 0:
+                self.__sum -= oldest
+                self.count -= 1
+            for queue in (self.__minimum, self.__maximum):
+                if len (queue) > 0 and queue [0] == index - self.size:
+                    queue.popleft ()
+        self.__samples [position] = value
+        self.__number_samples += 1
+        if value >= 0:
+            self.__sum += value
+            self.count += 1
+            while len (self.__minimum) > 0 and self.__samples [self.__minimum [-1] % self.size] >= value:
+                self.__minimum.pop ()
+            self.__minimum.append (index)
+            while len (self.__maximum) > 0 and self.__samples [self.__maximum [-1] % self.size] <= value:
+                self.__maximum.pop ()
+            self.__maximum.append (index)
+        # the running sum is recomputed once per buffer length to avoid accumulating rounding errors
+        if self.__number_samples % self.size == 0:
+            self.__sum = sum (x for x in self.__samples if x >= 0)
+
+    def mean (self):
+        """
+        Return the mean of the valid samples, or None if there are none.
+        """
+        if self.count == 0:
+            return None
+        return self.__sum / self.count
+
+    def minimum (self):
+        if self.count == 0:
+            return None
+        return self.__samples [self.__minimum [0] % self.size]
+
+    def maximum (self):
+        if self.count == 0:
+            return None
+        return self.__samples [self.__maximum [0] % self.size]
@@ -0,0 +1,196 @@
+"""
+Live bee counts computed while a video is recorded.
+
+The live stage is an extra branch of the gstreamer recording pipeline, see
+function util.video.record_video_gstreamer.  The branch starts with a leaky
+queue, so the camera and the recorded video never wait for the live stage,
+and reduces the frame rate and frame size before writing grey frames to a
+pipe.  A thread reads the frames from the pipe, counts the bee pixels of each
+region of interest (ROI), that is, pixels whose difference to the background
+is greater than the same colour threshold, and appends the counts to a ring
+buffer and to a CSV file in the experiment folder.
+
+The live stage is enabled by section live_count in the video section of the
+experiment configuration, for instance:
+
+    video:
+       live_count:
+          masks: [masks/Stadium-Ring-1-1.png, masks/Stadium-Ring-1-2.png]
+          frames_per_second: 2
+          scale: 0.25
+          same_colour_threshold: 50
+
+Mask filenames are relative to the experiment folder.
+"""
+
+import collections
+import cv2
+import fcntl
+import numpy
+import os
+import os.path
+import threading
+import time
+
+import util.mask_stack
+import util.video
+
+LIVE_COUNT_FILENAME = 'live-bee-count.csv'
+BACKGROUND_VIDEO_FILENAME = 'background-video.avi'
+
+DEFAULT_FRAMES_PER_SECOND = 2
+DEFAULT_SCALE = 0.25
+DEFAULT_SAME_COLOUR_THRESHOLD = 50
+# number of samples kept in the ring buffer
+DEFAULT_HISTORY = 600
+
+# maximum number of frames waiting in the live branch before old ones are dropped
+QUEUE_SIZE = 2
+
+class LiveStage (object):
+    """
+    Branch of the recording pipeline that computes live bee counts.
+    """
+
+    def __init__ (self, frame_size, background, masks, output_filename,
+                  frames_per_second = DEFAULT_FRAMES_PER_SECOND,
+                  same_colour_threshold = DEFAULT_SAME_COLOUR_THRESHOLD,
+                  history = DEFAULT_HISTORY):
+        """
+        :param frame_size: height and width of the frames of the live branch
+        :param background: grey background image with the frame size
+        :param masks: a mask stack with the frame size, see class util.mask_stack.MaskStack
+        :param output_filename: the CSV file with the time and the bee counts of each ROI
+        """
+        self.frame_size = frame_size
+        self.frames_per_second = frames_per_second
+        self.same_colour_threshold = same_colour_threshold
+        self.output_filename = output_filename
+        self.masks = masks
+        self.__background = masks.select (cv2.equalizeHist (background))
+        self.__samples = collections.deque (maxlen = history)
+        self.__lock = threading.Lock ()
+        self.__thread = None
+        self.__read_fd = None
+        self.__write_fd = None
+
+    def pipeline (self, source):
+        """
+        Return the gstreamer elements of the live branch.  The branch reads from the given tee element.
+
+        This method creates the pipe of the live branch, so it must be called just before the recording process is
+        created, and method start right after.  Otherwise other processes, such as the ISI, inherit the write end of
+        the pipe and the live stage never sees the end of the recording.
+        """
+        self.__read_fd, self.__write_fd = os.pipe ()
+        # only the recording process needs the pipe
+        flags = fcntl.fcntl (self.__read_fd, fcntl.F_GETFD)
+        fcntl.fcntl (self.__read_fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+        return [
+            '%s.' % (source), '!',
+            'queue', 'leaky=2', 'max-size-buffers=%d' % (QUEUE_SIZE), '!',
+            'videorate', '!',
+            'video/x-raw-yuv,', 'framerate=%d/1' % (self.frames_per_second), '!',
+            'videoscale', '!',
+            'video/x-raw-yuv,', 'width=%d,' % (self.frame_size [1]), 'height=%d' % (self.frame_size [0]), '!',
+            'ffmpegcolorspace', '!',
+            'video/x-raw-gray,', 'bpp=8,', 'depth=8', '!',
+            'fdsink', 'fd=%d' % (self.__write_fd), 'sync=false',
+        ]
+
+    def start (self):
+        """
+        Start reading frames.  This method must be called right after the recording process has been created, as the
+        process inherits the write end of the pipe, which is closed here.
+        """
+        os.close (self.__write_fd)
+        self.__write_fd = None
+        self.__thread = threading.Thread (target = self.__run, name = 'live-bee-count')
+        self.__thread.daemon = True
+        self.__thread.start ()
+
+    def join (self):
+        """
+        Wait for the end of the recording.
+        """
+        if self.__thread is not None:
+            self.__thread.join ()
+
+    def samples (self):
+        """
+        Return a list with the most recent samples, each one a tuple with the time and the bee counts of each ROI.
+        """
+        with self.__lock:
+            return list (self.__samples)
+
+    def __run (self):
+        frame_bytes = self.frame_size [0] * self.frame_size [1]
+        with os.fdopen (self.__read_fd, 'rb') as fdr, open (self.output_filename, 'w') as fdw:
+            while True:
+                data = fdr.read (frame_bytes)
+                if len (data) < frame_bytes:
+                    break
+                frame = numpy.frombuffer (data, dtype = numpy.uint8).reshape (self.frame_size)
+                pixels = self.masks.select (cv2.equalizeHist (frame))
+                difference = numpy.maximum (pixels, self.__background) - numpy.minimum (pixels, self.__background)
+                counts = self.masks.count (difference > self.same_colour_threshold)
+                sample = (time.time (), counts)
+                with self.__lock:
+                    self.__samples.append (sample)
+                fdw.write ('{:f},{}\n'.format (sample [0], ','.join (str (c) for c in counts)))
+                fdw.flush ()
+
+def create_live_stage (video_config, experiment_folder, debug = True):
+    """
+    Create the live stage given by the video section of an experiment configuration.  The background image is the
+    mean of the background video in the experiment folder.
+
+    :return: the live stage or None if it is not enabled or its data is not available
+    """
+    options = video_config.get ('live_count')
+    if options is None:
+        return None
+    cropped_size = util.video.cropped_frame_size (
+        video_config ['crop_left'],
+        video_config ['crop_right'],
+        video_config ['crop_top'],
+        video_config ['crop_bottom'])
+    frame_size = util.video.scaled_frame_size (cropped_size, options.get ('scale', DEFAULT_SCALE))
+    background_filename = os.path.join (experiment_folder, BACKGROUND_VIDEO_FILENAME)
+    try:
+        background = None
+        number_frames = 0
+        for a_frame in util.video.read_frames (
+                background_filename,
+                util.video.recorded_frame_size (video_config),
+                grey = True):
+            background = a_frame.astype (numpy.float32) if background is None else background + a_frame
+            number_frames += 1
+        if background is None:
+            raise IOError ('video {} has no frames'.format (background_filename))
+        background = numpy.round (background / number_frames).astype (numpy.uint8)
+        masks = util.mask_stack.MaskStack ([
+            _read_mask (os.path.join (experiment_folder, a_filename), frame_size)
+            for a_filename in options ['masks']
+        ])
+    except (IOError, KeyError, ValueError) as error:
+        print ('[W] live bee counts disabled: {}'.format (error))
+        return None
+    result = LiveStage (
+        frame_size = frame_size,
+        background = cv2.resize (background, (frame_size [1], frame_size [0]), interpolation = cv2.INTER_AREA),
+        masks = masks,
+        output_filename = os.path.join (experiment_folder, LIVE_COUNT_FILENAME),
+        frames_per_second = options.get ('frames_per_second', DEFAULT_FRAMES_PER_SECOND),
+        same_colour_threshold = options.get ('same_colour_threshold', DEFAULT_SAME_COLOUR_THRESHOLD),
+        history = options.get ('history', DEFAULT_HISTORY))
+    if debug:
+        print ('[I] live bee counts of {} ROIs at {} frames per second in file {}'.format (
+            masks.number_ROIs, result.frames_per_second, result.output_filename))
+    return result
+
+def _read_mask (filename, frame_size):
+    mask = cv2.imread (filename, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise IOError ('could not read mask {}'.format (filename))
+    return cv2.resize (mask, (frame_size [1], frame_size [0]), interpolation = cv2.INTER_NEAREST)
@@ -0,0 +1,128 @@
+"""
+Regions of interest (ROI) of an arena given by mask images.
+
+All the masks of an arena are loaded once in a single mask stack.  The pixels
+of a ROI are the non black pixels of its mask.  The mask stack keeps the flat
+indexes of the pixels that belong to some ROI and the label of each of these
+pixels, so that per ROI pixel counts and histograms of a frame, or of a
+batch of frames, are computed with a single numpy.bincount call.
+
+If the masks overlap, a pixel has no single label.  In this case the mask
+stack keeps the pixels of each ROI and counts are computed one ROI at a time.
+"""
+
+import cv2
+import numpy
+
+class MaskStack (object):
+    """
+    The ROIs of an arena.
+
+    Data given to the methods of a mask stack is restricted to the pixels in the ROIs, see method select.  The last
+    axis of the data has one element per pixel in attribute pixels.
+    """
+
+    def __init__ (self, list_masks):
+        """
+        :param list_masks: the mask images of the ROIs, all with the same size
+        """
+        if len (list_masks) == 0:
+            raise ValueError ('a mask stack needs at least one mask')
+        self.shape = list_masks [0].shape [:2]
+        self.number_ROIs = len (list_masks)
+        members = numpy.array ([
+            numpy.asarray (a_mask).reshape (self.shape [0] * self.shape [1], -1).any (axis = 1)
+            for a_mask in list_masks
+        ])
+        number_members = members.sum (axis = 0)
+        self.overlapping = bool ((number_members > 1).any ())
+        self.pixels = numpy.flatnonzero (number_members)
+        if self.overlapping:
+            self.__labels = None
+            self.__positions = [
+                numpy.flatnonzero (a_member [self.pixels])
+                for a_member in members
+            ]
+        else:
+            self.__labels = members [:, self.pixels].argmax (axis = 0)
+            self.__positions = None
+
+    def label_image (self):
+        """
+        Return an image where each pixel has the number of its ROI, starting at one, or zero if the pixel is not in any ROI.
+        If the masks overlap, a pixel has the number of the first ROI it belongs to.
+        """
+        result = numpy.zeros (self.shape [0] * self.shape [1], dtype = numpy.int32)
+        if self.overlapping:
+            for index_ROI in reversed (range (self.number_ROIs)):
+                result [self.pixels [self.__positions [index_ROI]]] = index_ROI + 1
+        else:
+            result [self.pixels] = self.__labels + 1
+        return result.reshape (self.shape)
+
+    def select (self, images):
+        """
+        Select the pixels in the ROIs of the given images.
+
+        :param images: an image or an array of images, either with two dimensions or flattened
+        :return: an array with the leading axes of images and one element per pixel in the ROIs
+        """
+        images = numpy.asarray (images)
+        if images.shape [-2:] == tuple (self.shape):
+            images = images.reshape (images.shape [:-2] + (-1,))
+        return images [..., self.pixels]
+
+    def count (self, selected):
+        """
+        Count the selected pixels of each ROI.
+
+        :param selected: a boolean array whose last axis has one element per pixel in the ROIs
+        :return: an array with the leading axes of selected and one count per ROI
+        """
+        selected = numpy.asarray (selected)
+        leading_shape = selected.shape [:-1]
+        selected = selected.reshape (-1, len (self.pixels))
+        if self.overlapping:
+            result = numpy.column_stack ([
+                selected [:, positions].sum (axis = 1)
+                for positions in self.__positions
+            ])
+        else:
+            rows = numpy.arange (len (selected)) [:, numpy.newaxis] * self.number_ROIs
+            result = numpy.bincount (
+                (rows + self.__labels) [selected],
+                minlength = len (selected) * self.number_ROIs
+            ).reshape (len (selected), self.number_ROIs)
+        return result.reshape (leading_shape + (self.number_ROIs,))
+
+    def histograms (self, values, bins = 256):
+        """
+        Compute the histogram of the values of each ROI, over all the leading axes of values.
+
+        :param values: a non negative integer array, less than bins, whose last axis has one element per pixel in the ROIs
+        :return: an array with one row per ROI and one column per bin
+        """
+        values = numpy.asarray (values).reshape (-1, len (self.pixels)).astype (numpy.intp)
+        if self.overlapping:
+            return numpy.array ([
+                numpy.bincount (values [:, positions].ravel (), minlength = bins)
+                for positions in self.__positions
+            ])
+        return numpy.bincount (
+            (values + self.__labels * bins).ravel (),
+            minlength = self.number_ROIs * bins
+        ).reshape (self.number_ROIs, bins)
+
+def read_masks (list_filenames):
+    """
+    Read the mask images of the ROIs in the given order.
+
+    :return: a mask stack
+    """
+    list_masks = []
+    for a_filename in list_filenames:
+        mask = cv2.imread (a_filename, cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            raise IOError ('could not read mask {}'.format (a_filename))
+        list_masks.append (mask)
+    return MaskStack (list_masks)
@@ -1,10 +1,109 @@
-
+import collections
 import numpy
 
 def moving_average (data, window_size):
-    ''' from http://stackoverflow.com/a/11352216'''
-    window = numpy.ones (int (window_size)) / float (window_size)
-    return numpy.convolve (data, window, 'same')
+    '''
+    Moving average with the same result as numpy.convolve (data, window, 'same'), where window has window_size
+    elements equal to 1/window_size, computed in linear time with a cumulative sum.
+    At the borders the missing samples count as zeros.
+    '''
+    data = numpy.asarray (data)
+    window_size = int (window_size)
+    if window_size > len (data):
+        # numpy.convolve returns an array with window_size elements in this case
+        window = numpy.ones (window_size) / float (window_size)
+        return numpy.convolve (data, window, 'same')
+    lower, upper = window_bounds (len (data), window_size)
+    cumulative_sum = numpy.concatenate (([0], numpy.cumsum (data, dtype = numpy.float64)))
+    return (cumulative_sum [upper] - cumulative_sum [lower]) / float (window_size)
+
+def moving_variance (data, window_size):
+    '''
+    Moving variance over the same windows as moving_average.  At the borders only the available samples are used.
+    '''
+    data = numpy.asarray (data, dtype = numpy.float64)
+    if len (data) == 0:
+        return numpy.array ([])
+    # centring the data reduces the cancellation error of the sum of squares
+    data = data - data.mean ()
+    lower, upper = window_bounds (len (data), window_size)
+    cumulative_sum = numpy.concatenate (([0], numpy.cumsum (data)))
+    cumulative_sum_squares = numpy.concatenate (([0], numpy.cumsum (data * data)))
+    count = (upper - lower).astype (numpy.float64)
+    mean = (cumulative_sum [upper] - cumulative_sum [lower]) / count
+    result = (cumulative_sum_squares [upper] - cumulative_sum_squares [lower]) / count - mean * mean
+    return numpy.maximum (result, 0)
+
+def moving_minimum (data, window_size):
+    '''
+    Moving minimum over the same windows as moving_average.  At the borders only the available samples are used.
+    '''
+    return _moving_extreme (data, window_size, lambda new, old: new <= old)
+
+def moving_maximum (data, window_size):
+    '''
+    Moving maximum over the same windows as moving_average.  At the borders only the available samples are used.
+    '''
+    return _moving_extreme (data, window_size, lambda new, old: new >= old)
+
+def window_bounds (length, window_size):
+    '''
+    Return the lower (inclusive) and upper (exclusive) indexes of the windows used by the moving functions.
+    The window of index i has window_size elements and is centred as in numpy.convolve with mode 'same'.
+    '''
+    right = (int (window_size) - 1) // 2
+    left = int (window_size) - 1 - right
+    indexes = numpy.arange (length)
+    return numpy.maximum (indexes - left, 0), numpy.minimum (indexes + right + 1, length)
+
+def _moving_extreme (data, window_size, dominates):
+    # monotonic deque with the indexes of the candidate extremes of the current window
+    data = numpy.asarray (data)
+    lower, upper = window_bounds (len (data), window_size)
+    result = numpy.empty (len (data), dtype = data.dtype)
+    candidates = collections.deque ()
+    added = 0
+    for index in range (len (data)):
+        while added < upper [index]:
+            while candidates and dominates (data [added], data [candidates [-1]]):
+                candidates.pop ()
+            candidates.append (added)
+            added += 1
+        while candidates [0] < lower [index]:
+            candidates.popleft ()
+        result [index] = data [candidates [0]]
+    return result
+
+def envelope_decimation (xs, ys, number_buckets):
+    '''
+    Reduce a time series for plotting.  The x range is divided in number_buckets buckets of equal width and, from the
+    samples in each bucket, only the first, the last, the minimum and the maximum are kept, in their original order.
+    A line through the kept samples covers the same pixels as a line through all samples if each bucket is at most
+    one pixel wide.  NaN values are ignored when looking for the minimum and maximum.  The samples must be sorted by x.
+
+    :return: a tuple with the kept xs and ys, or the given ones if they have no more than four samples per bucket
+    '''
+    xs = numpy.asarray (xs)
+    ys = numpy.asarray (ys)
+    number_buckets = int (number_buckets)
+    if len (xs) <= 4 * number_buckets or number_buckets < 1:
+        return xs, ys
+    x_min, x_max = xs [0], xs [-1]
+    if not x_max > x_min:
+        return xs, ys
+    buckets = numpy.minimum (
+        ((xs - x_min) * (number_buckets / float (x_max - x_min))).astype (numpy.int64),
+        number_buckets - 1)
+    indexes = numpy.arange (len (xs))
+    first = numpy.flatnonzero (numpy.concatenate (([True], buckets [1:] != buckets [:-1])))
+    last = numpy.concatenate ((first [1:] - 1, [len (xs) - 1]))
+    # sorting by bucket and value puts the minimum at the first position of each bucket and the maximum at the last
+    order = numpy.lexsort ((numpy.where (numpy.isnan (ys), numpy.inf, ys), buckets))
+    minimum = order [first]
+    order = numpy.lexsort ((numpy.where (numpy.isnan (ys), -numpy.inf, ys), buckets))
+    maximum = order [last]
+    kept = numpy.unique (numpy.concatenate ((indexes [first], indexes [last], minimum, maximum)))
+    return xs [kept], ys [kept]
 
 import numpy as np
 def find_nearest(array, value):
@@ -13,3 +112,19 @@ def find_nearest(array, value):
 
 def find_nearest_index (array, value):
     return (np.abs(array - value)).argmin()
+
+def find_nearest_indexes (array, values):
+    '''
+    Return the index of the nearest element in the sorted array for each value.  The result is the same as calling
+    find_nearest_index for each value, but it takes logarithmic time per value.
+    '''
+    array = numpy.asarray (array)
+    values = numpy.asarray (values)
+    if len (array) == 1:
+        return numpy.zeros (values.shape, dtype = int)
+    right = numpy.clip (numpy.searchsorted (array, values), 1, len (array) - 1)
+    left = right - 1
+    # ties go to the first element, as argmin does
+    use_left = (values - array [left]) <= (array [right] - values)
+    result = numpy.where (use_left, left, right)
+    return numpy.searchsorted (array, array [result])
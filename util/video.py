@@ -1,3 +1,5 @@
+import numpy
+import os.path
 import subprocess
 
 import app
@@ -5,6 +7,14 @@ import app
 CAMERA_RESOLUTION_X = 2048
 CAMERA_RESOLUTION_Y = 2048
 
+# recording profiles, selected by key profile in the video section of the experiment configuration
+PROFILE_FULL = 'full'
+PROFILE_PREVIEW = 'preview'
+PROFILE_REDUCED = 'reduced'
+RECORDING_PROFILES = [PROFILE_FULL, PROFILE_PREVIEW, PROFILE_REDUCED]
+
+DEFAULT_SCALE = 0.5
+
 def split_video (video_filename, number_frames, frames_per_second, output_template, debug = False):
     # type: (str, int, float, str) -> int
     """
@@ -33,11 +43,143 @@ def split_video (video_filename, number_frames, frames_per_second, output_templa
     process.wait ()
     return process.returncode
 
-def record_video_gstreamer (video_filename, number_frames, frames_per_second, crop_left, crop_right, crop_top, crop_bottom, async = False, debug = True):
+def cropped_frame_size (crop_left, crop_right, crop_top, crop_bottom):
+    """
+    Return the height and width of the frames recorded by function record_video_gstreamer with the given crop values.
+    """
+    return (
+        CAMERA_RESOLUTION_Y - crop_top - crop_bottom,
+        CAMERA_RESOLUTION_X - crop_left - crop_right,
+    )
+
+def scaled_frame_size (frame_size, scale):
+    """
+    Return the height and width of frames scaled by the given factor.  Both are rounded to even values.
+    """
+    return tuple (
+        max (2, 2 * int (round (value * scale / 2.0)))
+        for value in frame_size)
+
+def recording_options (video_config):
+    """
+    Return the recording profile options given in the video section of an experiment configuration, as keyword
+    arguments of function record_video_gstreamer.  Profile full is used if the section does not specify one.
+    """
+    return {
+        'profile' : video_config.get ('profile', PROFILE_FULL),
+        'scale' : video_config.get ('scale', DEFAULT_SCALE),
+        'greyscale' : video_config.get ('greyscale', True),
+    }
+
+def recorded_frame_size (video_config):
+    """
+    Return the height and width of the frames of the main video recorded with the given video section of an
+    experiment configuration.
     """
+    result = cropped_frame_size (
+        video_config ['crop_left'],
+        video_config ['crop_right'],
+        video_config ['crop_top'],
+        video_config ['crop_bottom'])
+    options = recording_options (video_config)
+    if options ['profile'] == PROFILE_REDUCED:
+        result = scaled_frame_size (result, options ['scale'])
+    return result
+
+def preview_filename (video_filename):
+    """
+    Return the filename of the low resolution video recorded with profile preview.
+    """
+    base, extension = os.path.splitext (video_filename)
+    return base + '-preview' + extension
+
+def read_frames (video_filename, frame_size, number_frames = None, frames_per_second = None, roi = None, stride = 1, grey = False, debug = False):
+    """
+    Decode a video and yield its frames as NumPy arrays.  The frames are decoded by ffmpeg and read from a pipe, so
+    they are never written to disk.
+
+    Frames have the same layout as the images read by cv2.imread, that is, BGR colour frames have shape
+    (height, width, 3) and grey frames have shape (height, width).  The arrays are read-only.
+
+    :param video_filename: filename of the video to read
+    :param frame_size: height and width of the video frames, see function cropped_frame_size
+    :param number_frames: number of frames to decode, or None to decode the whole video
+    :param frames_per_second: frame rate of the video, or None to use the rate stored in the video
+    :param roi: a tuple (x, y, width, height) with the region of interest to crop, or None to use the full frame
+    :param stride: only yield one in every stride frames
+    :param grey: if True yield grey frames
+    :raise IOError: if ffmpeg fails
+    """
+    height, width = frame_size
+    filters = []
+    if roi is not None:
+        x, y, width, height = roi
+        filters.append ('crop={:d}:{:d}:{:d}:{:d}'.format (width, height, x, y))
+    if stride > 1:
+        filters.append ('select=not(mod(n\\,{:d}))'.format (stride))
+    command = [
+        app.FFMPEG,
+        '-i', video_filename,
+        '-loglevel', 'error',
+    ]
+    if frames_per_second is not None:
+        command.extend (['-r', '{:f}'.format (frames_per_second)])
+    if len (filters) > 0:
+        command.extend (['-vf', ','.join (filters), '-vsync', '0'])
+    if number_frames is not None:
+        command.extend (['-frames', '{:d}'.format ((number_frames + stride - 1) // stride)])
+    command.extend ([
+        '-f', 'rawvideo',
+        '-pix_fmt', 'gray' if grey else 'bgr24',
+        '-'
+    ])
+    if debug:
+        print ('Full command is:')
+        print (' '.join (command))
+        print
+    shape = (height, width) if grey else (height, width, 3)
+    frame_bytes = height * width * (1 if grey else 3)
+    process = subprocess.Popen (command, stdout = subprocess.PIPE, bufsize = frame_bytes)
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read (frame_bytes)
+            if len (data) < frame_bytes:
+                break
+            yield numpy.frombuffer (data, dtype = numpy.uint8).reshape (shape)
+        finished = True
+    finally:
+        process.stdout.close ()
+        if not finished:
+            # the consumer stopped reading frames
+            process.terminate ()
+        process.wait ()
+    if process.returncode != 0:
+        raise IOError ('ffmpeg exited with code {} while decoding video {}'.format (process.returncode, video_filename))
+
+def record_video_gstreamer (video_filename, number_frames, frames_per_second, crop_left, crop_right, crop_top, crop_bottom, async = False, debug = True, profile = PROFILE_FULL, scale = DEFAULT_SCALE, greyscale = True, live_stage = None):
+    """
+    Record a video with the camera.  The recording profile selects what is stored:
+
+    full
+      the cropped frames in video_filename;
+    preview
+      the cropped frames in video_filename and, through a tee, scaled frames in the file given by function
+      preview_filename, for online analysis;
+    reduced
+      only scaled frames in video_filename.
+
+    Scaled frames are greyscale if parameter greyscale is True.  See function recording_options.
+
+    If a live stage is given, see module util.live_count, its branch is added to the pipeline.  If the recording is
+    asynchronous, the caller should join the live stage after the process terminates.
 
     :rtype: Union[int,subprocess.Process]
     """
+    if profile not in RECORDING_PROFILES:
+        raise ValueError ('unknown recording profile {}'.format (profile))
+    frame_size = cropped_frame_size (crop_left, crop_right, crop_top, crop_bottom)
+    scaled_size = scaled_frame_size (frame_size, scale)
     command =  [
         app.GST_LAUNCH,
         '--gst-plugin-path=/usr/local/lib/gstreamer-0.10/',
@@ -47,20 +189,56 @@ def record_video_gstreamer (video_filename, number_frames, frames_per_second, cr
         'aravissrc', 'num-buffers=%d' % (number_frames), '!',
         'video/x-raw-yuv,', 'width=2048,', 'height=2048,', 'framerate=%d/1' % (frames_per_second), '!',
         'videocrop', 'left=%d' % (crop_left), 'right=%d' % (crop_right), 'top=%d' % (crop_top), 'bottom=%d' % (crop_bottom), '!',
-        'jpegenc', '!',
-        'avimux', 'name=mux', '!',
-        'filesink', 'location=%s' % (video_filename)
         ]
+    if profile == PROFILE_REDUCED:
+        main_branch = _scaler_pipeline (scaled_size, greyscale) + _encoder_pipeline (video_filename)
+    else:
+        main_branch = _encoder_pipeline (video_filename)
+    other_branches = []
+    if profile == PROFILE_PREVIEW:
+        other_branches.extend (['t.', '!', 'queue', '!'])
+        other_branches.extend (_scaler_pipeline (scaled_size, greyscale))
+        other_branches.extend (_encoder_pipeline (preview_filename (video_filename), 'preview'))
+    if live_stage is not None:
+        other_branches.extend (live_stage.pipeline ('t'))
+    if len (other_branches) > 0:
+        command.extend (['tee', 'name=t', '!', 'queue', '!'])
+    command.extend (main_branch)
+    command.extend (other_branches)
     if debug:
         print
         print ('Recording a video with %d frames at %d frames per second.' % (number_frames, frames_per_second))
-        print ('Frame resolution is %dx%d.' % (CAMERA_RESOLUTION_X - crop_right - crop_left, CAMERA_RESOLUTION_Y - crop_top - crop_bottom))
+        print ('Frame resolution is %dx%d.' % (frame_size [1], frame_size [0]))
+        print ('Recording profile is %s.' % (profile))
+        if profile != PROFILE_FULL:
+            print ('Scaled frame resolution is %dx%d%s.' % (scaled_size [1], scaled_size [0], ' greyscale' if greyscale else ''))
         print ('Full command is:')
         print (' '.join (command))
         print
-    process = subprocess.Popen (command)
+    # the recording process inherits the pipe of the live stage
+    process = subprocess.Popen (command, close_fds = False)
+    if live_stage is not None:
+        live_stage.start ()
     if async:
         return process
     else:
         process.wait ()
+        if live_stage is not None:
+            live_stage.join ()
         return process.returncode
+
+def _scaler_pipeline (frame_size, greyscale):
+    result = [
+        'videoscale', '!',
+        'video/x-raw-yuv,', 'width=%d,' % (frame_size [1]), 'height=%d' % (frame_size [0]), '!',
+    ]
+    if greyscale:
+        result.extend (['videobalance', 'saturation=0.0', '!'])
+    return result
+
+def _encoder_pipeline (video_filename, name = 'mux'):
+    return [
+        'jpegenc', '!',
+        'avimux', 'name=%s' % (name), '!',
+        'filesink', 'location=%s' % (video_filename)
+    ]